@@ -1,7 +1,18 @@
 """
 应用包初始化
+
+TopicStrategyWorkflow 依赖 autogen / openai 等重量级模块，按需加载，
+保证 `python -m app` 能先打印横幅，再承担导入开销
 """
-from .workflow import TopicStrategyWorkflow
-from .config import Config
 
 __all__ = ["TopicStrategyWorkflow", "Config"]
+
+
+def __getattr__(name):
+    if name == "TopicStrategyWorkflow":
+        from .workflow import TopicStrategyWorkflow
+        return TopicStrategyWorkflow
+    if name == "Config":
+        from .config import Config
+        return Config
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -11,8 +11,6 @@ if sys.platform == "win32":
     sys.stdout.reconfigure(encoding='utf-8')
     sys.stderr.reconfigure(encoding='utf-8')
 
-from app import TopicStrategyWorkflow
-
 
 def print_banner():
     """打印欢迎横幅"""
@@ -48,6 +46,9 @@ async def main():
         # 打印欢迎信息
         print_banner()
 
+        # 横幅打印后再导入工作流（autogen 等依赖较重）
+        from app import TopicStrategyWorkflow
+
         # 创建工作流
         workflow = TopicStrategyWorkflow()
 
@@ -5,7 +5,7 @@
 from autogen_agentchat.agents import AssistantAgent
 
 from ..prompts import ANALYST_SYSTEM_MESSAGE
-from ..tools import get_current_date, web_search, calculate
+from ..tools import get_current_date, web_search, calculate, calculate_batch
 
 
 def create_analyst(model_client) -> AssistantAgent:
@@ -14,5 +14,5 @@ def create_analyst(model_client) -> AssistantAgent:
         name="Analyst",
         model_client=model_client,
         system_message=ANALYST_SYSTEM_MESSAGE,
-        tools=[get_current_date, web_search, calculate],
+        tools=[get_current_date, web_search, calculate, calculate_batch],
     )
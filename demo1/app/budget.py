@@ -0,0 +1,136 @@
+"""
+运行预算模块
+为单次工作流运行设定 token / 搜索次数 / 耗时上限：
+- 接近上限时由工作流触发降级策略（跳过第二轮大纲、限制质检搜索、压缩撰写提示词）
+- 超出上限时拒绝继续调用模型或搜索；工作流跳过剩余阶段，用最后一次模型调用生成精简文档
+"""
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .config import Config
+
+
+class BudgetExceeded(RuntimeError):
+    """运行预算已耗尽"""
+
+
+@dataclass
+class RunBudget:
+    """单次运行的资源预算（上限为 0 表示不限制）"""
+    max_tokens: int = 0
+    max_searches: int = 0
+    max_seconds: float = 0
+    # 任一资源使用比例达到该值即视为“接近上限”
+    degrade_ratio: float = 0.8
+
+    tokens_used: int = 0
+    searches_used: int = 0
+    # 阶段级搜索上限（None 表示仅受总上限约束）
+    phase_search_cap: Optional[int] = None
+    phase_searches_used: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    # 第一次超出上限时的异常（AutoGen 会吞掉智能体内部的异常，工作流据此判断预算是否已用尽）
+    exceeded: Optional["BudgetExceeded"] = None
+    # 为收尾的撰写调用放行（超出上限后仍允许调用模型）
+    _final_call: bool = field(default=False, init=False, repr=False)
+
+    @classmethod
+    def from_config(cls) -> "RunBudget":
+        return cls(
+            max_tokens=Config.RUN_MAX_TOKENS,
+            max_searches=Config.RUN_MAX_SEARCHES,
+            max_seconds=Config.RUN_MAX_SECONDS,
+            degrade_ratio=Config.BUDGET_DEGRADE_RATIO,
+        )
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def usage_ratio(self) -> float:
+        """各项资源中使用比例最高的一项"""
+        ratios = [0.0]
+        if self.max_tokens:
+            ratios.append(self.tokens_used / self.max_tokens)
+        if self.max_searches:
+            ratios.append(self.searches_used / self.max_searches)
+        if self.max_seconds:
+            ratios.append(self.elapsed / self.max_seconds)
+        return max(ratios)
+
+    def near_limit(self) -> bool:
+        return self.usage_ratio() >= self.degrade_ratio
+
+    def check_model_call(self):
+        """模型调用前检查 token 与耗时上限"""
+        if self._final_call:
+            return
+        error = None
+        if self.max_tokens and self.tokens_used >= self.max_tokens:
+            error = BudgetExceeded(f"token 预算已用尽（{self.tokens_used}/{self.max_tokens}）")
+        elif self.max_seconds and self.elapsed >= self.max_seconds:
+            error = BudgetExceeded(f"运行时间预算已用尽（{self.elapsed:.0f}s/{self.max_seconds:.0f}s）")
+        if error is not None:
+            self.exceeded = self.exceeded or error
+            raise error
+
+    @contextmanager
+    def final_call(self):
+        """收尾阶段：预算用尽后仍放行模型调用，保证能产出一份（精简的）文档"""
+        previous = self._final_call
+        self._final_call = True
+        try:
+            yield self
+        finally:
+            self._final_call = previous
+
+    def add_tokens(self, count: int):
+        self.tokens_used += count
+
+    def try_consume_search(self) -> bool:
+        """尝试占用一次搜索额度，超出总上限或阶段上限时返回 False"""
+        if self.max_searches and self.searches_used >= self.max_searches:
+            return False
+        if self.phase_search_cap is not None and self.phase_searches_used >= self.phase_search_cap:
+            return False
+        self.searches_used += 1
+        self.phase_searches_used += 1
+        return True
+
+    def set_phase_search_cap(self, cap: Optional[int]):
+        """设置当前阶段的搜索上限（None 取消限制）"""
+        self.phase_search_cap = cap
+        self.phase_searches_used = 0
+
+    def format_usage(self) -> str:
+        def fmt(used, limit):
+            return f"{used}/{limit}" if limit else f"{used}"
+
+        return (
+            f"token {fmt(self.tokens_used, self.max_tokens)}，"
+            f"搜索 {fmt(self.searches_used, self.max_searches)} 次，"
+            f"耗时 {fmt(round(self.elapsed), round(self.max_seconds))} 秒"
+        )
+
+
+_active_budget: Optional[RunBudget] = None
+
+
+def activate_budget(budget: Optional[RunBudget]):
+    """设置当前运行的预算（None 表示不限制）"""
+    global _active_budget
+    _active_budget = budget
+
+
+def get_active_budget() -> Optional[RunBudget]:
+    return _active_budget
+
+
+__all__ = [
+    "BudgetExceeded",
+    "RunBudget",
+    "activate_budget",
+    "get_active_budget",
+]
@@ -0,0 +1,312 @@
+"""
+安全表达式计算模块
+用白名单 AST 解释器替代 eval，支持：
+- 四则运算、乘方、取模、括号
+- 变量引用（批量计算时引用同一批中的其他定义，如 TAM -> SAM -> SOM）
+- 少量数学函数，以及基于 NumPy 的逐年增长向量（未安装 NumPy 时不可用）
+"""
+import ast
+import math
+import operator
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+class CalcError(ValueError):
+    """表达式不合法或计算失败"""
+
+
+# 表达式中允许出现的最大乘方指数，防止 9**9**9 之类的表达式卡死进程
+_MAX_EXPONENT = 1000
+# 整数结果的最大位数（与 float 的表示范围一致）；只限制指数挡不住 (9**999)**999 这样的嵌套
+_MAX_INT_BITS = 1024
+# 表达式最大长度，过长 / 嵌套过深的表达式在解析阶段就会耗尽内存或递归深度
+_MAX_EXPRESSION_LENGTH = 2000
+# years / grow 的最大年数，避免 grow(1, 0.1, 10**9) 这样一次分配数 GB 的向量
+_MAX_YEARS = 1000
+
+
+def _check_int(value):
+    """整数超出 float 范围即视为溢出，避免巨大整数拖慢计算或无法格式化"""
+    if isinstance(value, int) and value.bit_length() > _MAX_INT_BITS:
+        raise CalcError("结果超出可表示的范围")
+    return value
+
+
+def _power(left, right):
+    """乘方：整数乘方先按 right * log2(|left|) 估算结果位数，超出上限时不做计算"""
+    if isinstance(left, int) and isinstance(right, int) and right > 0 and abs(left) > 1:
+        if right * math.log2(abs(left)) > _MAX_INT_BITS:
+            raise CalcError("结果超出可表示的范围")
+    result = left ** right
+    # 负数的分数次幂得到复数，如 (-8)**(1/3)
+    if isinstance(result, complex):
+        raise CalcError("结果不是实数")
+    return result
+
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _power,
+}
+
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+def _require_numpy(name: str):
+    if not NUMPY_AVAILABLE:
+        raise CalcError(f"{name} 需要安装 numpy")
+
+
+def _year_count(name: str, n) -> int:
+    n = int(n)
+    if not 0 <= n <= _MAX_YEARS:
+        raise CalcError(f"{name} 的年数应在 0 到 {_MAX_YEARS} 之间")
+    return n
+
+
+def _years(n):
+    """0, 1, ..., n-1（用作逐年序号）"""
+    _require_numpy("years")
+    return np.arange(_year_count("years", n), dtype=float)
+
+
+def _grow(base, rate, n):
+    """从 base 开始按 rate 逐年复合增长 n 年：base * (1 + rate) ** [0..n-1]"""
+    _require_numpy("grow")
+    return base * (1 + rate) ** np.arange(_year_count("grow", n), dtype=float)
+
+
+def _cagr(start, end, n):
+    """年复合增长率"""
+    if start <= 0 or n <= 0:
+        raise CalcError("cagr 要求 start > 0 且 n > 0")
+    return (end / start) ** (1 / n) - 1
+
+
+def _cumsum(values):
+    _require_numpy("cumsum")
+    return np.cumsum(values)
+
+
+def _total(values):
+    return float(np.sum(values)) if NUMPY_AVAILABLE else sum(values)
+
+
+def _mean(values):
+    if NUMPY_AVAILABLE:
+        return float(np.mean(values))
+    return sum(values) / len(values)
+
+
+def _vector(values):
+    _require_numpy("[...]")
+    return np.asarray(values, dtype=float)
+
+
+_FUNCTIONS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "log": math.log,
+    "log10": math.log10,
+    "exp": math.exp,
+    "sum": _total,
+    "mean": _mean,
+    "cagr": _cagr,
+    "years": _years,
+    "grow": _grow,
+    "cumsum": _cumsum,
+}
+
+
+def _validate(node: ast.AST):
+    """只允许白名单中的语法节点"""
+    for child in ast.walk(node):
+        if isinstance(child, (ast.Expression, ast.Load, ast.Name, ast.List, ast.Tuple)):
+            continue
+        if isinstance(child, ast.Constant):
+            if not isinstance(child.value, (int, float)) or isinstance(child.value, bool):
+                raise CalcError(f"不支持的常量：{child.value!r}")
+        elif isinstance(child, ast.BinOp):
+            if type(child.op) not in _BIN_OPS:
+                raise CalcError(f"不支持的运算符：{type(child.op).__name__}")
+        elif isinstance(child, ast.UnaryOp):
+            if type(child.op) not in _UNARY_OPS:
+                raise CalcError(f"不支持的运算符：{type(child.op).__name__}")
+        elif isinstance(child, ast.Call):
+            if not isinstance(child.func, ast.Name) or child.func.id not in _FUNCTIONS:
+                raise CalcError("只能调用内置的数学函数：" + ", ".join(sorted(_FUNCTIONS)))
+            if child.keywords:
+                raise CalcError("函数调用不支持关键字参数")
+        elif not isinstance(child, (ast.operator, ast.unaryop)):
+            raise CalcError(f"不支持的语法：{type(child).__name__}")
+
+
+@lru_cache(maxsize=512)
+def _compile(expression: str) -> Tuple[ast.Expression, frozenset]:
+    """
+    解析并校验表达式（带缓存）
+
+    Returns:
+        (语法树, 引用到的变量名)
+    """
+    expression = expression.strip()
+    if len(expression) > _MAX_EXPRESSION_LENGTH:
+        raise CalcError(f"表达式过长（最多 {_MAX_EXPRESSION_LENGTH} 个字符）")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise CalcError(f"语法错误：{e.msg}") from None
+    except (RecursionError, MemoryError, ValueError):
+        # 嵌套过深 / 含空字符等解析器拒绝的输入
+        raise CalcError("表达式过于复杂或包含非法字符") from None
+    _validate(tree)
+    names = frozenset(
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and node.id not in _FUNCTIONS
+    )
+    return tree, names
+
+
+def _eval_node(node: ast.AST, variables: Dict[str, object]):
+    if isinstance(node, ast.Expression):
+        return _eval_node(node.body, variables)
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id not in variables:
+            raise CalcError(f"未定义的变量：{node.id}")
+        return variables[node.id]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return _vector([_eval_node(item, variables) for item in node.elts])
+    if isinstance(node, ast.UnaryOp):
+        return _check_int(_UNARY_OPS[type(node.op)](_eval_node(node.operand, variables)))
+    if isinstance(node, ast.BinOp):
+        left = _eval_node(node.left, variables)
+        right = _eval_node(node.right, variables)
+        if isinstance(node.op, ast.Pow) and NUMPY_AVAILABLE and np.any(np.abs(right) > _MAX_EXPONENT):
+            raise CalcError("指数过大")
+        if isinstance(node.op, ast.Pow) and not NUMPY_AVAILABLE and abs(right) > _MAX_EXPONENT:
+            raise CalcError("指数过大")
+        return _check_int(_BIN_OPS[type(node.op)](left, right))
+    if isinstance(node, ast.Call):
+        args = [_eval_node(arg, variables) for arg in node.args]
+        return _check_int(_FUNCTIONS[node.func.id](*args))
+    raise CalcError(f"不支持的语法：{type(node).__name__}")
+
+
+def evaluate(expression: str, variables: Dict[str, object] = None):
+    """计算单个表达式"""
+    tree, _ = _compile(expression)
+    try:
+        return _eval_node(tree, variables or {})
+    except CalcError:
+        raise
+    except OverflowError:
+        raise CalcError("结果超出可表示的范围") from None
+    except RecursionError:
+        raise CalcError("表达式嵌套过深") from None
+    except (ArithmeticError, TypeError, ValueError) as e:
+        raise CalcError(str(e)) from None
+
+
+def parse_definitions(text: str) -> List[Tuple[str, str]]:
+    """
+    解析批量定义：每行（或用分号分隔）一条 `名称 = 表达式`
+
+    Returns:
+        [(名称, 表达式), ...]，保持书写顺序
+    """
+    definitions = []
+    for raw in text.replace(";", "\n").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        name, sep, expression = line.partition("=")
+        name = name.strip()
+        if not sep or not name.isidentifier() or not expression.strip():
+            raise CalcError(f"无法解析：{line}（格式应为 名称 = 表达式）")
+        if name in _FUNCTIONS:
+            raise CalcError(f"名称与内置函数重名：{name}")
+        definitions.append((name, expression.strip()))
+    return definitions
+
+
+def evaluate_batch(definitions: List[Tuple[str, str]]) -> Dict[str, object]:
+    """
+    批量计算，定义之间可以互相引用（与书写顺序无关）
+
+    Returns:
+        {名称: 结果}，按书写顺序排列
+    """
+    expressions = dict(definitions)
+    if len(expressions) != len(definitions):
+        raise CalcError("存在重复定义的名称")
+
+    dependencies = {}
+    for name, expression in definitions:
+        _, names = _compile(expression)
+        unknown = names - expressions.keys()
+        if unknown:
+            raise CalcError(f"{name} 引用了未定义的变量：{', '.join(sorted(unknown))}")
+        dependencies[name] = names
+
+    # 按依赖关系拓扑排序后依次计算
+    values: Dict[str, object] = {}
+    visiting = set()
+
+    def resolve(name: str):
+        if name in values:
+            return
+        if name in visiting:
+            raise CalcError(f"存在循环引用：{name}")
+        visiting.add(name)
+        for dependency in dependencies[name]:
+            resolve(dependency)
+        visiting.discard(name)
+        try:
+            values[name] = evaluate(expressions[name], values)
+        except CalcError as e:
+            raise CalcError(f"{name}: {e}") from None
+
+    for name, _ in definitions:
+        resolve(name)
+    return {name: values[name] for name, _ in definitions}
+
+
+def format_value(value) -> str:
+    """格式化计算结果（向量按逐项列出）"""
+    if NUMPY_AVAILABLE and isinstance(value, np.ndarray):
+        return "[" + ", ".join(format_value(float(item)) for item in value.ravel()) + "]"
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return f"{value:.6g}" if abs(value) < 1e-3 else f"{value:,.4f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+__all__ = [
+    "NUMPY_AVAILABLE",
+    "CalcError",
+    "evaluate",
+    "parse_definitions",
+    "evaluate_batch",
+    "format_value",
+]
@@ -0,0 +1,142 @@
+"""
+录制/回放模块
+录制模式：记录每次模型调用与 web_search 的请求、响应和耗时（JSON Lines）
+回放模式：按请求内容从录制文件中取回响应，并按原始（或缩放后的）耗时等待，
+用于离线复现线上运行、对比性能优化效果
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .config import Config
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+KIND_MODEL = "model"
+KIND_WEB_SEARCH = "web_search"
+
+
+class CassetteMiss(KeyError):
+    """回放时找不到对应的录制条目"""
+
+
+def _request_key(kind: str, request: Any) -> str:
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{kind}\n{payload}".encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """录制文件（每行一条交互记录）"""
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        # 相同请求可能出现多次，按录制顺序依次回放
+        self._by_key: Dict[str, Deque[dict]] = defaultdict(deque)
+        # 请求内容对不上时（例如提示词中包含日期），按类型顺序兜底
+        self._by_kind: Dict[str, Deque[dict]] = defaultdict(deque)
+        self.recorded = 0
+        self.replayed = 0
+        self.fallbacks = 0
+
+        if mode == MODE_REPLAY:
+            self._load()
+        elif mode == MODE_RECORD:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 每次录制从空文件开始
+            open(path, "w", encoding="utf-8").close()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == MODE_RECORD
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._by_key[entry["key"]].append(entry)
+                self._by_kind[entry["kind"]].append(entry)
+
+    def record(self, kind: str, request: Any, response: Any, latency: float):
+        """追加一条交互记录（立即落盘，运行中断也不会丢失已录制内容）"""
+        entry = {
+            "kind": kind,
+            "key": _request_key(kind, request),
+            "request": request,
+            "response": response,
+            "latency": round(latency, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.recorded += 1
+
+    def lookup(self, kind: str, request: Any) -> Tuple[Any, float]:
+        """
+        取回录制的响应
+
+        Returns:
+            (响应, 按 latency_scale 缩放后的等待秒数)
+        """
+        key = _request_key(kind, request)
+        with self._lock:
+            queue = self._by_key.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._by_kind[kind].remove(entry)
+            elif self._by_kind.get(kind):
+                entry = self._by_kind[kind].popleft()
+                self._by_key[entry["key"]].remove(entry)
+                self.fallbacks += 1
+            else:
+                raise CassetteMiss(f"录制文件中没有更多 {kind} 记录")
+            self.replayed += 1
+        return entry["response"], entry["latency"] * self.latency_scale
+
+    def format_stats(self) -> str:
+        if self.recording:
+            return f"已录制 {self.recorded} 条交互 -> {self.path}"
+        if self.replaying:
+            return f"已回放 {self.replayed} 条交互（其中按顺序兜底 {self.fallbacks} 条）"
+        return ""
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """按配置获取录制/回放对象；未启用时返回 None"""
+    global _cassette
+    if Config.CASSETTE_MODE == MODE_OFF:
+        return None
+    if _cassette is None:
+        _cassette = Cassette(Config.CASSETTE_PATH, Config.CASSETTE_MODE, Config.CASSETTE_LATENCY_SCALE)
+    return _cassette
+
+
+__all__ = [
+    "MODE_OFF",
+    "MODE_RECORD",
+    "MODE_REPLAY",
+    "KIND_MODEL",
+    "KIND_WEB_SEARCH",
+    "Cassette",
+    "CassetteMiss",
+    "get_cassette",
+]
@@ -1,5 +1,7 @@
 """配置管理模块"""
 import os
+import tempfile
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,11 +19,59 @@ class Config:
     ZHIPU_WEB_SEARCH_ENABLED = os.getenv("ZHIPU_WEB_SEARCH_ENABLED", "false").lower() == "true"
     ZHIPU_SEARCH_ENGINE = os.getenv("ZHIPU_SEARCH_ENGINE", "search_std")
 
+    # 主机级限流配置（多个进程共享同一份配额）
+    RATE_LIMIT_DIR = os.getenv(
+        "RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "topic_strategy_ratelimit")
+    )
+    ZHIPU_MODEL_RPM = float(os.getenv("ZHIPU_MODEL_RPM", "60"))
+    ZHIPU_SEARCH_RPM = float(os.getenv("ZHIPU_SEARCH_RPM", "30"))
+    RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "2"))
+    # interactive（命令行交互）或 batch（批处理任务，排队时让路给交互式请求）
+    RATE_LIMIT_PRIORITY = os.getenv("RATE_LIMIT_PRIORITY", "interactive")
+
+    # 各阶段模型调用的截止时间（秒），0 表示不限制
+    PHASE_DEADLINES = {
+        "clarify": float(os.getenv("DEADLINE_CLARIFY", "120")),
+        "outline": float(os.getenv("DEADLINE_OUTLINE", "180")),
+        "analysis": float(os.getenv("DEADLINE_ANALYSIS", "600")),
+        "critic": float(os.getenv("DEADLINE_CRITIC", "400")),
+        "writing": float(os.getenv("DEADLINE_WRITING", "400")),
+    }
+
+    # 对冲请求：调用耗时超过近期延迟的该分位数时，再发一份相同请求，取先返回者
+    HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "5"))
+    # 对冲请求数占总调用数的上限，控制额外花费
+    HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+
+    # 单次运行预算（0 表示不限制，默认均不限制）
+    RUN_MAX_TOKENS = int(os.getenv("RUN_MAX_TOKENS", "0"))
+    RUN_MAX_SEARCHES = int(os.getenv("RUN_MAX_SEARCHES", "0"))
+    RUN_MAX_SECONDS = float(os.getenv("RUN_MAX_SECONDS", "0"))
+    # 资源使用比例达到该值时启用降级策略
+    BUDGET_DEGRADE_RATIO = float(os.getenv("BUDGET_DEGRADE_RATIO", "0.8"))
+    # 降级时质检阶段允许的搜索次数
+    BUDGET_DEGRADED_CRITIC_SEARCHES = int(os.getenv("BUDGET_DEGRADED_CRITIC_SEARCHES", "1"))
+
+    # 录制/回放：off（关闭）、record（录制真实调用）、replay（离线回放）
+    CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+    CASSETTE_PATH = os.getenv("CASSETTE_PATH", os.path.join("output", "cassette.jsonl"))
+    # 回放时的耗时缩放系数（1 为原始耗时，0 为不等待）
+    CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+
     OUTPUT_DIR = "output"
 
     @classmethod
     def validate(cls):
         """验证配置"""
+        if cls.CASSETTE_MODE == "replay":
+            # 离线回放不访问任何 API
+            if not os.path.exists(cls.CASSETTE_PATH):
+                raise ValueError(f"回放文件不存在：{cls.CASSETTE_PATH}")
+            os.makedirs(cls.OUTPUT_DIR, exist_ok=True)
+            return True
+
         if not cls.OPENAI_API_KEY:
             raise ValueError(
                 "未找到 OPENAI_API_KEY！\n"
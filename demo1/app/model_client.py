@@ -0,0 +1,371 @@
+"""
+模型客户端模块
+在 OpenAIChatCompletionClient 外层包装限流、截止时间与对冲请求等横切逻辑
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Deque, List, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+
+from .budget import get_active_budget
+from .cassette import KIND_MODEL, Cassette, get_cassette
+from .config import Config
+from .rate_limit import BUCKET_MODEL, get_rate_limiter
+
+
+class ChatCompletionClientWrapper(ChatCompletionClient):
+    """委托给内部客户端的包装基类，子类只需覆盖 create/create_stream"""
+
+    def __init__(self, inner: ChatCompletionClient):
+        self.inner = inner
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Union[Tool, ToolSchema]] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self.inner.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Union[Tool, ToolSchema]] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return self.inner.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    def actual_usage(self) -> RequestUsage:
+        return self.inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self.inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Union[Tool, ToolSchema]] = []) -> int:
+        return self.inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Union[Tool, ToolSchema]] = []) -> int:
+        return self.inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return self.inner.capabilities
+
+    @property
+    def model_info(self):
+        return self.inner.model_info
+
+
+class RateLimitedChatCompletionClient(ChatCompletionClientWrapper):
+    """每次模型调用前先从主机级令牌桶取令牌"""
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        await get_rate_limiter().acquire_async(BUCKET_MODEL)
+        return await self.inner.create(messages, **kwargs)
+
+    async def create_stream(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        await get_rate_limiter().acquire_async(BUCKET_MODEL)
+        async for chunk in self.inner.create_stream(messages, **kwargs):
+            yield chunk
+
+
+class CassetteChatCompletionClient(ChatCompletionClientWrapper):
+    """录制模式下记录每次模型调用；回放模式下直接从录制文件返回，不访问 API"""
+
+    def __init__(self, inner: Optional[ChatCompletionClient], cassette: Cassette, model_info=None):
+        super().__init__(inner)
+        self.cassette = cassette
+        self._model_info = model_info
+
+    @staticmethod
+    def _serialize_request(messages: Sequence[LLMMessage], tools: Sequence[Union[Tool, ToolSchema]]) -> dict:
+        return {
+            "messages": [message.model_dump(mode="json") for message in messages],
+            "tools": sorted(tool.name if isinstance(tool, Tool) else tool["name"] for tool in tools),
+        }
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        request = self._serialize_request(messages, kwargs.get("tools", []))
+
+        if self.cassette.replaying:
+            response, delay = self.cassette.lookup(KIND_MODEL, request)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return CreateResult.model_validate(response)
+
+        start = time.monotonic()
+        result = await self.inner.create(messages, **kwargs)
+        self.cassette.record(KIND_MODEL, request, result.model_dump(mode="json"), time.monotonic() - start)
+        return result
+
+    def actual_usage(self) -> RequestUsage:
+        if self.inner is None:
+            return RequestUsage(prompt_tokens=0, completion_tokens=0)
+        return self.inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        if self.inner is None:
+            return RequestUsage(prompt_tokens=0, completion_tokens=0)
+        return self.inner.total_usage()
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        if self.inner is None:
+            return self._model_info
+        return self.inner.capabilities
+
+    @property
+    def model_info(self):
+        if self.inner is None:
+            return self._model_info
+        return self.inner.model_info
+
+
+class BudgetedChatCompletionClient(ChatCompletionClientWrapper):
+    """调用前检查运行预算，调用后把实际 token 用量计入预算（含对冲请求）"""
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        budget = get_active_budget()
+        if budget is not None:
+            budget.check_model_call()
+        result = await self.inner.create(messages, **kwargs)
+        if budget is not None and result.usage:
+            budget.add_tokens(result.usage.prompt_tokens + result.usage.completion_tokens)
+        return result
+
+
+class PhaseDeadlineExceeded(TimeoutError):
+    """阶段截止时间已到，模型调用被放弃"""
+
+
+@dataclass
+class PhaseStatus:
+    """
+    单个阶段的执行状态
+
+    AutoGen 会在团队内部吞掉智能体抛出的异常（只记录日志），阶段照常结束；
+    工作流通过 error 判断本阶段是否因截止时间而中断，再决定如何降级
+    """
+    name: str
+    deadline: Optional[float] = None
+    error: Optional[BaseException] = None
+
+
+class HedgedChatCompletionClient(ChatCompletionClientWrapper):
+    """
+    截止时间 + 对冲请求
+
+    - 阶段截止时间：phase() 上下文内的每次调用只能使用阶段剩余时间
+      （create_stream 同样受截止时间约束，但不做对冲：已输出的片段无法撤回）
+    - 对冲请求：调用耗时超过近期延迟的指定分位数时，再发一份相同请求，
+      取先成功返回的结果并取消另一份；对冲次数不超过总调用数的 max_hedge_ratio
+    """
+
+    def __init__(
+        self,
+        inner: ChatCompletionClient,
+        percentile: float = 0.9,
+        min_samples: int = 5,
+        max_hedge_ratio: float = 0.1,
+        enabled: bool = True,
+        history_size: int = 50,
+    ):
+        super().__init__(inner)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.enabled = enabled
+        self._latencies: Deque[float] = deque(maxlen=history_size)
+        self._phase: Optional[PhaseStatus] = None
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @contextmanager
+    def phase(self, name: str, deadline_seconds: float):
+        """在阶段内为所有模型调用设置统一的截止时间（<=0 表示不限制），返回 PhaseStatus"""
+        previous = self._phase
+        self._phase = PhaseStatus(
+            name=name,
+            deadline=time.monotonic() + deadline_seconds if deadline_seconds > 0 else None,
+        )
+        try:
+            yield self._phase
+        finally:
+            self._phase = previous
+
+    def _deadline_exceeded(self, message: str) -> PhaseDeadlineExceeded:
+        error = PhaseDeadlineExceeded(message)
+        if self._phase is not None:
+            self._phase.error = error
+        return error
+
+    def _remaining(self) -> Optional[float]:
+        """当前阶段的剩余时间（None 表示不限制），已超时则抛出 PhaseDeadlineExceeded"""
+        if self._phase is None or self._phase.deadline is None:
+            return None
+        remaining = self._phase.deadline - time.monotonic()
+        if remaining <= 0:
+            raise self._deadline_exceeded(f"阶段 {self._phase.name} 已超过截止时间")
+        return remaining
+
+    def _hedge_delay(self) -> Optional[float]:
+        """根据近期调用延迟计算触发对冲的等待时间；样本不足或超出预算时返回 None"""
+        if not self.enabled or len(self._latencies) < self.min_samples:
+            return None
+        if self.hedges + 1 > self.max_hedge_ratio * self.calls:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        return ordered[index]
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        self.calls += 1
+        timeout = self._remaining()
+        try:
+            return await asyncio.wait_for(self._create_hedged(messages, kwargs), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise self._deadline_exceeded(f"阶段 {self._phase.name} 的模型调用超过截止时间") from None
+
+    async def create_stream(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        stream = self.inner.create_stream(messages, **kwargs).__aiter__()
+        try:
+            while True:
+                timeout = self._remaining()
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise self._deadline_exceeded(f"阶段 {self._phase.name} 的流式输出超过截止时间") from None
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _create_hedged(self, messages: Sequence[LLMMessage], kwargs: Mapping[str, Any]) -> CreateResult:
+        started = {}
+
+        def launch() -> asyncio.Task:
+            task = asyncio.ensure_future(self.inner.create(messages, **kwargs))
+            started[task] = time.monotonic()
+            return task
+
+        tasks: List[asyncio.Task] = [launch()]
+        try:
+            delay = self._hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self.hedges += 1
+                    tasks.append(launch())
+
+            pending = set(tasks)
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    self._latencies.append(time.monotonic() - started[task])
+                    if task is not tasks[0]:
+                        self.hedge_wins += 1
+                    return task.result()
+            raise first_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def format_stats(self) -> str:
+        """格式化对冲统计"""
+        if not self.calls:
+            return ""
+        return f"模型调用 {self.calls} 次，对冲 {self.hedges} 次（对冲胜出 {self.hedge_wins} 次）"
+
+
+def create_model_client() -> HedgedChatCompletionClient:
+    """
+    创建工作流使用的模型客户端
+
+    调用链（外 -> 内）：对冲/截止时间 -> 运行预算 -> 主机级限流 -> 录制 -> OpenAI 客户端；
+    回放模式下不创建 OpenAI 客户端，也不经过限流。
+    录制 / 回放时关闭对冲：对冲的重复请求在录制时会多写一条记录，
+    回放时会多消费一条记录，导致之后的调用全部错位
+    """
+    model_capabilities = ModelCapabilities(
+        vision=False,
+        function_calling=True,
+        json_output=True,
+    )
+
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        client = CassetteChatCompletionClient(None, cassette, model_info=model_capabilities)
+    else:
+        # openai SDK 导入较慢，回放模式下不需要
+        from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+        client = OpenAIChatCompletionClient(
+            model=Config.MODEL_NAME,
+            api_key=Config.OPENAI_API_KEY,
+            base_url=Config.OPENAI_API_BASE,
+            model_info=model_capabilities,
+        )
+        if cassette is not None:
+            client = CassetteChatCompletionClient(client, cassette)
+        client = RateLimitedChatCompletionClient(client)
+
+    return HedgedChatCompletionClient(
+        BudgetedChatCompletionClient(client),
+        percentile=Config.HEDGE_PERCENTILE,
+        min_samples=Config.HEDGE_MIN_SAMPLES,
+        max_hedge_ratio=Config.HEDGE_MAX_RATIO,
+        enabled=Config.HEDGE_ENABLED and cassette is None,
+    )
+
+
+__all__ = [
+    "ChatCompletionClientWrapper",
+    "RateLimitedChatCompletionClient",
+    "CassetteChatCompletionClient",
+    "BudgetedChatCompletionClient",
+    "HedgedChatCompletionClient",
+    "PhaseDeadlineExceeded",
+    "PhaseStatus",
+    "create_model_client",
+]
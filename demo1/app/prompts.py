@@ -51,6 +51,7 @@ ANALYST_SYSTEM_MESSAGE = """你是业务分析师，负责基于真实数据进
    - 行业/市场最新情况（加上当前年份，如"2026年XX行业"）
    - 目标受众痛点或竞品做法（二选一，按场景最关键的来）
 3. 所有结论必须基于搜索结果，禁止编造数据
+4. 需要测算市场规模（如 TAM → SAM → SOM、逐年增长）时，用 calculate_batch() 一次算完整张表，不要逐步调用 calculate()
 
 【分析框架】
 
@@ -363,3 +364,39 @@ def get_writing_prompt(user_input: str, additional_info: str, analyst_output: st
 
 按照你的 system_message 中的格式要求输出文档，不要添加任何额外说明。
 """
+
+
+def _compact_section(text: str, max_chars: int) -> str:
+    """压缩长文本：保留开头部分和“参考来源”段落"""
+    if len(text) <= max_chars:
+        return text
+    head, marker, sources = text.partition("## 参考来源")
+    compacted = head[:max_chars].rstrip() + "\n...（已省略部分内容）"
+    if marker:
+        compacted += f"\n\n{marker}{sources}"
+    return compacted
+
+
+def get_compact_writing_prompt(
+    user_input: str,
+    additional_info: str,
+    analyst_output: str,
+    critic_output: str,
+    max_chars: int = 3000,
+) -> str:
+    """生成压缩版撰写提示词（运行预算接近上限时使用）"""
+    info_section = f"\n补充信息：{additional_info}" if additional_info else ""
+    return f"""请整合以下内容，输出精简的 Markdown 策略文档。
+
+【业务场景】
+{user_input}
+{info_section}
+
+【分析师输出（节选）】
+{_compact_section(analyst_output, max_chars)}
+
+【批评者输出（节选）】
+{_compact_section(critic_output, max_chars // 2)}
+
+按照你的 system_message 中的格式要求输出文档，每个部分只保留最关键的结论与依据，不要添加任何额外说明。
+"""
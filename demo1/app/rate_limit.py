@@ -0,0 +1,249 @@
+"""
+跨进程限流模块
+同一主机上的多个工作流进程共享智谱API配额：
+- 每个端点一个令牌桶（状态存放在本地文件中，通过文件锁互斥）
+- 交互式请求优先于批处理请求
+- 记录排队等待时间，便于观察是否贴近配额上限
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+from .config import Config
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+
+# 单次等待的最长休眠时间（秒），避免错过其他进程释放的配额
+_MAX_SLEEP = 0.5
+# 交互式等待者的登记有效期（秒），进程崩溃后登记自动失效
+_WAITER_TTL = 5.0
+
+
+@dataclass
+class BucketSpec:
+    """令牌桶配置"""
+    rate_per_minute: float
+    burst: int = 1
+
+    @property
+    def rate_per_second(self) -> float:
+        return self.rate_per_minute / 60.0
+
+
+@dataclass
+class BucketStats:
+    """单个桶在本进程内的排队统计"""
+    acquired: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    recent_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=200))
+
+    def record(self, wait: float):
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def percentile(self, pct: float) -> float:
+        if not self.recent_waits:
+            return 0.0
+        ordered = sorted(self.recent_waits)
+        index = min(len(ordered) - 1, int(len(ordered) * pct))
+        return ordered[index]
+
+
+@contextmanager
+def _file_lock(path: str):
+    """主机级互斥锁（POSIX 用 flock，Windows 用 msvcrt）"""
+    with open(path, "a+b") as f:
+        if sys.platform == "win32":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class HostRateLimiter:
+    """
+    主机级令牌桶限流器
+
+    状态文件结构：
+        {"tokens": float, "updated": float, "waiters": {id: 过期时间},
+         "acquired": int, "wait_total": float}
+    """
+
+    def __init__(self, state_dir: str, buckets: Dict[str, BucketSpec]):
+        self.state_dir = state_dir
+        self.buckets = buckets
+        self.stats: Dict[str, BucketStats] = {name: BucketStats() for name in buckets}
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _paths(self, bucket: str):
+        base = os.path.join(self.state_dir, bucket)
+        return f"{base}.lock", f"{base}.json"
+
+    def _try_take(self, bucket: str, priority: str, waiter_id: str) -> float:
+        """
+        尝试取一个令牌
+
+        Returns:
+            0 表示成功；否则为建议的休眠秒数
+        """
+        spec = self.buckets[bucket]
+        lock_path, state_path = self._paths(bucket)
+        now = time.time()
+
+        with _file_lock(lock_path):
+            state = _load_state(state_path, spec, now)
+            elapsed = max(0.0, now - state["updated"])
+            state["tokens"] = min(float(spec.burst), state["tokens"] + elapsed * spec.rate_per_second)
+            state["updated"] = now
+            state["waiters"] = {k: v for k, v in state["waiters"].items() if v > now}
+
+            # 有交互式请求在排队时，批处理请求让路
+            blocked = priority == PRIORITY_BATCH and bool(state["waiters"])
+            if state["tokens"] >= 1.0 and not blocked:
+                state["tokens"] -= 1.0
+                state["waiters"].pop(waiter_id, None)
+                state["acquired"] += 1
+                _save_state(state_path, state)
+                return 0.0
+
+            if priority == PRIORITY_INTERACTIVE:
+                state["waiters"][waiter_id] = now + _WAITER_TTL
+            _save_state(state_path, state)
+
+        if spec.rate_per_second <= 0:
+            return _MAX_SLEEP
+        refill = 1.0 / spec.rate_per_second
+        if blocked:
+            # 让路时令牌要先留给排队的交互式请求：按它们还需要的补充时间等待，至少等一个补充间隔，
+            # 避免令牌充足时以 10ms 间隔反复抢文件锁
+            missing = len(state["waiters"]) + 1.0 - state["tokens"]
+            return min(_MAX_SLEEP, max(refill, missing * refill))
+        missing = max(0.0, 1.0 - state["tokens"])
+        return min(_MAX_SLEEP, max(0.01, missing * refill))
+
+    def _record(self, bucket: str, wait: float):
+        self.stats[bucket].record(wait)
+        lock_path, state_path = self._paths(bucket)
+        with _file_lock(lock_path):
+            state = _load_state(state_path, self.buckets[bucket], time.time())
+            state["wait_total"] += wait
+            _save_state(state_path, state)
+
+    def acquire(self, bucket: str, priority: Optional[str] = None) -> float:
+        """阻塞直到拿到令牌，返回排队等待秒数"""
+        priority = priority or Config.RATE_LIMIT_PRIORITY
+        waiter_id = uuid.uuid4().hex
+        start = time.monotonic()
+        while True:
+            sleep = self._try_take(bucket, priority, waiter_id)
+            if sleep == 0.0:
+                break
+            time.sleep(sleep)
+        wait = time.monotonic() - start
+        self._record(bucket, wait)
+        return wait
+
+    async def acquire_async(self, bucket: str, priority: Optional[str] = None) -> float:
+        """异步版本：等待期间不阻塞事件循环"""
+        priority = priority or Config.RATE_LIMIT_PRIORITY
+        waiter_id = uuid.uuid4().hex
+        start = time.monotonic()
+        while True:
+            sleep = self._try_take(bucket, priority, waiter_id)
+            if sleep == 0.0:
+                break
+            await asyncio.sleep(sleep)
+        wait = time.monotonic() - start
+        self._record(bucket, wait)
+        return wait
+
+    def format_stats(self) -> str:
+        """格式化本进程的排队等待统计"""
+        lines = []
+        for name, stats in self.stats.items():
+            if not stats.acquired:
+                continue
+            avg = stats.total_wait / stats.acquired
+            lines.append(
+                f"{name}: {stats.acquired} 次, 平均等待 {avg:.2f}s, "
+                f"p95 {stats.percentile(0.95):.2f}s, 最大 {stats.max_wait:.2f}s"
+            )
+        return "\n".join(lines)
+
+
+def _load_state(path: str, spec: BucketSpec, now: float) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("tokens", float(spec.burst))
+    state.setdefault("updated", now)
+    state.setdefault("waiters", {})
+    state.setdefault("acquired", 0)
+    state.setdefault("wait_total", 0.0)
+    return state
+
+
+def _save_state(path: str, state: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+BUCKET_MODEL = "model"
+BUCKET_WEB_SEARCH = "web_search"
+
+_limiter: Optional[HostRateLimiter] = None
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """获取进程内共享的限流器（按需创建）"""
+    global _limiter
+    if _limiter is None:
+        _limiter = HostRateLimiter(
+            Config.RATE_LIMIT_DIR,
+            {
+                BUCKET_MODEL: BucketSpec(Config.ZHIPU_MODEL_RPM, Config.RATE_LIMIT_BURST),
+                BUCKET_WEB_SEARCH: BucketSpec(Config.ZHIPU_SEARCH_RPM, Config.RATE_LIMIT_BURST),
+            },
+        )
+    return _limiter
+
+
+__all__ = [
+    "PRIORITY_INTERACTIVE",
+    "PRIORITY_BATCH",
+    "BUCKET_MODEL",
+    "BUCKET_WEB_SEARCH",
+    "BucketSpec",
+    "HostRateLimiter",
+    "get_rate_limiter",
+]
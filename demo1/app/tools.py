@@ -2,13 +2,20 @@
 工具函数模块
 提供Agent可以调用的工具函数
 """
+import time
 from datetime import datetime
 from threading import BoundedSemaphore
 from typing import Annotated
 
+from .budget import get_active_budget
+from .calc import CalcError, evaluate, evaluate_batch, format_value, parse_definitions
+from .cassette import KIND_WEB_SEARCH, get_cassette
 from .config import Config
+from .rate_limit import BUCKET_WEB_SEARCH, get_rate_limiter
 
-# 限制并发搜索为1，避免触发智谱API限流（429错误）
+_client = None
+
+# 限制进程内并发搜索为1；跨进程的速率由主机级限流器控制，避免触发智谱API限流（429错误）
 _WEB_SEARCH_SEMAPHORE = BoundedSemaphore(1)
 
 
@@ -30,34 +37,60 @@ def web_search(query: Annotated[str, "搜索关键词"]) -> Annotated[str, "搜
     Raises:
         SystemExit: 联网搜索未启用或调用失败时退出程序
     """
-    if not Config.is_zhipu_api():
+    cassette = get_cassette()
+    replaying = cassette is not None and cassette.replaying
+
+    if not replaying and not Config.is_zhipu_api():
         print("\n[错误] web_search 调用失败：当前未使用智谱AI API，联网搜索不可用")
         print("请在 .env 中配置智谱AI API：")
         print("  OPENAI_API_BASE=https://open.bigmodel.cn/api/paas/v4")
         print("  OPENAI_API_KEY=your-zhipu-api-key")
         raise SystemExit(1)
 
-    if not Config.ZHIPU_WEB_SEARCH_ENABLED:
+    if not replaying and not Config.ZHIPU_WEB_SEARCH_ENABLED:
         print("\n[错误] web_search 调用失败：联网搜索未启用")
         print("请在 .env 中设置：ZHIPU_WEB_SEARCH_ENABLED=true")
         raise SystemExit(1)
 
     _WEB_SEARCH_SEMAPHORE.acquire()
     try:
-        return _zhipu_web_search(query)
+        budget = get_active_budget()
+        if budget is not None and not budget.try_consume_search():
+            return f"【联网搜索结果】关于'{query}'：本次运行的搜索额度已用尽，请基于已有信息完成任务"
+
+        if replaying:
+            response, delay = cassette.lookup(KIND_WEB_SEARCH, {"query": query})
+            if delay > 0:
+                time.sleep(delay)
+            return response
+
+        get_rate_limiter().acquire(BUCKET_WEB_SEARCH)
+        start = time.monotonic()
+        result = _zhipu_web_search(query)
+        if cassette is not None and cassette.recording:
+            cassette.record(KIND_WEB_SEARCH, {"query": query}, result, time.monotonic() - start)
+        return result
     finally:
         _WEB_SEARCH_SEMAPHORE.release()
 
 
+def _get_client():
+    """获取智谱AI客户端（首次调用时导入 zai SDK 并创建，之后复用）"""
+    global _client
+    if _client is None:
+        try:
+            from zai import ZhipuAiClient
+        except ImportError:
+            print("\n[错误] web_search 调用失败：未安装 zai-sdk")
+            print("请运行: pip install zai-sdk")
+            raise SystemExit(1)
+        _client = ZhipuAiClient(api_key=Config.OPENAI_API_KEY)
+    return _client
+
+
 def _zhipu_web_search(query: str) -> str:
     """调用智谱AI联网搜索API（使用zai SDK）"""
-    try:
-        from zai import ZhipuAiClient
-    except ImportError:
-        print("\n[错误] web_search 调用失败：未安装 zai-sdk")
-        print("请运行: pip install zai-sdk")
-        raise SystemExit(1)
-
+    client = _get_client()
     today = datetime.now().strftime("%Y年%m月%d日")
 
     tools = [{
@@ -74,7 +107,6 @@ def _zhipu_web_search(query: str) -> str:
     messages = [{"role": "user", "content": query}]
 
     try:
-        client = ZhipuAiClient(api_key=Config.OPENAI_API_KEY)
         response = client.chat.completions.create(
             model=Config.MODEL_NAME,
             messages=messages,
@@ -138,15 +170,38 @@ def calculate(expression: Annotated[str, "数学表达式"]) -> Annotated[str, "
         计算结果
     """
     try:
-        # 安全的eval：只允许数学运算
-        allowed_chars = set("0123456789+-*/(). ")
-        if not all(c in allowed_chars for c in expression):
-            return "错误：表达式包含非法字符"
+        # 白名单 AST 解释器，不使用 eval
+        result = evaluate(expression)
+        return f"计算结果：{format_value(result)}"
+    except CalcError as e:
+        return f"计算错误：{str(e)}"
 
-        result = eval(expression, {"__builtins__": {}}, {})
-        return f"计算结果：{result}"
-    except Exception as e:
+
+def calculate_batch(
+    definitions: Annotated[str, "多条计算定义，每行一条“名称 = 表达式”，可引用其他名称"],
+) -> Annotated[str, "每个名称的计算结果"]:
+    """
+    一次完成整张测算表（如 TAM -> SAM -> SOM、逐年增长预测），避免逐步调用 calculate
+
+    Args:
+        definitions: 例如
+            TAM = 3000 * 0.15
+            SAM = TAM * 0.4
+            SOM = SAM * 0.05
+            revenue = grow(SOM, 0.3, 5)   # 5 年复合增长 30%
+            total = sum(revenue)
+
+    Returns:
+        每个名称的计算结果（向量按年份逐项列出）
+    """
+    try:
+        results = evaluate_batch(parse_definitions(definitions))
+    except CalcError as e:
         return f"计算错误：{str(e)}"
 
+    lines = ["计算结果："]
+    lines.extend(f"- {name} = {format_value(value)}" for name, value in results.items())
+    return "\n".join(lines)
+
 
-__all__ = ["get_current_date", "web_search", "calculate"]
+__all__ = ["get_current_date", "web_search", "calculate", "calculate_batch"]
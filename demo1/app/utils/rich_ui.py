@@ -8,7 +8,6 @@ import io
 try:
     from rich.console import Console
     from rich.panel import Panel
-    from rich.markdown import Markdown
     RICH_AVAILABLE = True
 except ImportError:
     RICH_AVAILABLE = False
@@ -101,6 +100,8 @@ def print_content(content: str):
         # 检测是否是Markdown格式
         if content.startswith("#") or "```" in content:
             try:
+                # Markdown 渲染依赖较重，首次需要时再导入
+                from rich.markdown import Markdown
                 console.print(Markdown(content))
                 return
             except:
@@ -12,10 +12,12 @@ import os
 from datetime import datetime
 
 from autogen_agentchat.teams import RoundRobinGroupChat
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_core.models import ModelCapabilities
 
+from .budget import BudgetExceeded, RunBudget, activate_budget
+from .cassette import get_cassette
 from .config import Config
+from .model_client import PhaseDeadlineExceeded, create_model_client
+from .rate_limit import get_rate_limiter
 from .utils import stream_messages, StreamDisplayConfig, print_content
 from .utils.rich_ui import print_phase_header, print_success, start_loading, stop_loading
 from .agents import (
@@ -31,9 +33,20 @@ from .prompts import (
     get_analysis_prompt,
     get_critic_prompt,
     get_writing_prompt,
+    get_compact_writing_prompt,
 )
 
 
+def _find_agent_output(result, agent_name: str) -> str:
+    """取指定智能体的最后一次输出；阶段中断、没有输出时返回空字符串（不回退到任务提示词）"""
+    if result is None:
+        return ""
+    for msg in reversed(result.messages):
+        if getattr(msg, "source", None) == agent_name:
+            return str(msg.content)
+    return ""
+
+
 def _extract_agent_output(result, agent_name: str, fallback_warning: str) -> str:
     """
     从消息结果中提取指定智能体的最后一次输出
@@ -63,6 +76,17 @@ def _truncate_output(text: str, max_chars: int = 400) -> str:
     return f"{text[:max_chars].rstrip()}... (truncated {omitted} chars)"
 
 
+def _fallback_document(user_input: str, analyst_output: str, critic_output: str) -> str:
+    """撰写阶段无法完成时的兜底文档：原样整理分析与质检内容"""
+    return (
+        "# 选题策略（未经撰写整理）\n\n"
+        "> 撰写阶段未能完成，以下为分析与质检阶段的原始输出。\n\n"
+        f"## 业务场景\n\n{user_input}\n\n"
+        f"## 分析结论\n\n{analyst_output}\n\n"
+        f"## 质检意见\n\n{critic_output}\n"
+    )
+
+
 class TopicStrategyWorkflow:
     """选题策略生成工作流"""
 
@@ -71,19 +95,8 @@ class TopicStrategyWorkflow:
         # 验证配置
         Config.validate()
 
-        # 创建模型客户端
-        model_capabilities = ModelCapabilities(
-            vision=False,
-            function_calling=True,
-            json_output=True,
-        )
-
-        self.model_client = OpenAIChatCompletionClient(
-            model=Config.MODEL_NAME,
-            api_key=Config.OPENAI_API_KEY,
-            base_url=Config.OPENAI_API_BASE,
-            model_info=model_capabilities,
-        )
+        # 创建模型客户端（接入主机级限流）
+        self.model_client = create_model_client()
 
         # 创建智能体（无 Coordinator）
         self.clarifier = create_clarifier(self.model_client)
@@ -109,6 +122,15 @@ class TopicStrategyWorkflow:
         Returns:
             生成的策略文档内容
         """
+        self.budget = RunBudget.from_config()
+        activate_budget(self.budget)
+        try:
+            return await self._run_phases(user_input)
+        finally:
+            activate_budget(None)
+
+    async def _run_phases(self, user_input: str) -> str:
+        """按顺序执行五个阶段（运行预算已激活）"""
         print("\n" + "=" * 80)
         print("选题策略生成器启动")
         print("=" * 80 + "\n")
@@ -126,9 +148,11 @@ class TopicStrategyWorkflow:
 
         clarification_loading = start_loading("确认中...")
         try:
-            clarification_result = await stream_messages(
-                clarification_team.run_stream(task=clarification_prompt),
-                display=StreamDisplayConfig(
+            clarification_result, clarification_error = await self._run_phase(
+                "clarify",
+                clarification_team,
+                clarification_prompt,
+                StreamDisplayConfig(
                     show_agent_headers=True,
                     show_content=False,
                     show_tools=False,
@@ -136,11 +160,16 @@ class TopicStrategyWorkflow:
             )
         finally:
             stop_loading(clarification_loading)
-        print_success("澄清阶段完成")
 
-        clarifier_message = _extract_agent_output(
-            clarification_result, "Clarifier", ""
-        )
+        # 降级：澄清超时则按信息充分处理，直接进入后续阶段
+        if clarification_error is not None:
+            print(f"\n⚠️  澄清阶段未完成（{clarification_error}），跳过澄清。\n")
+            clarifier_message = ""
+        else:
+            print_success("澄清阶段完成")
+            clarifier_message = _extract_agent_output(
+                clarification_result, "Clarifier", ""
+            )
 
         additional_info = ""
         if clarifier_message and "【需要澄清】" in clarifier_message:
@@ -167,10 +196,17 @@ class TopicStrategyWorkflow:
         print_phase_header("阶段2：搜索大纲对齐", "bold cyan")
 
         approved_outline = ""
+        outline_output = ""
         critic_feedback = ""
         max_outline_rounds = 2
 
         for round_index in range(max_outline_rounds):
+            # 降级：预算接近上限时不再进行第二轮大纲修正
+            if round_index > 0 and self.budget.near_limit():
+                approved_outline = outline_output
+                print("\n⚠️  运行预算接近上限，跳过大纲修正，直接进入分析。\n")
+                break
+
             outline_prompt = get_search_outline_prompt(user_input, additional_info, critic_feedback)
 
             outline_team = RoundRobinGroupChat(
@@ -180,9 +216,11 @@ class TopicStrategyWorkflow:
 
             outline_loading = start_loading("生成搜索大纲...")
             try:
-                outline_result = await stream_messages(
-                    outline_team.run_stream(task=outline_prompt),
-                    display=StreamDisplayConfig(
+                outline_result, outline_error = await self._run_phase(
+                    "outline",
+                    outline_team,
+                    outline_prompt,
+                    StreamDisplayConfig(
                         show_agent_headers=True,
                         show_content=True,
                         show_tools=False,
@@ -192,6 +230,12 @@ class TopicStrategyWorkflow:
             finally:
                 stop_loading(outline_loading)
 
+            # 降级：大纲超时则沿用上一轮大纲（第一轮则不带大纲）进入分析
+            if outline_error is not None:
+                approved_outline = approved_outline or outline_output
+                print(f"\n⚠️  搜索大纲未完成（{outline_error}），不再修正大纲，直接进入分析。\n")
+                break
+
             outline_output = _extract_agent_output(
                 outline_result, "Analyst", "警告：未找到 Analyst 的搜索大纲"
             )
@@ -205,9 +249,11 @@ class TopicStrategyWorkflow:
 
             review_loading = start_loading("质检搜索大纲...")
             try:
-                review_result = await stream_messages(
-                    review_team.run_stream(task=review_prompt),
-                    display=StreamDisplayConfig(
+                review_result, review_error = await self._run_phase(
+                    "outline",
+                    review_team,
+                    review_prompt,
+                    StreamDisplayConfig(
                         show_agent_headers=True,
                         show_content=True,
                         show_tools=False,
@@ -217,6 +263,12 @@ class TopicStrategyWorkflow:
             finally:
                 stop_loading(review_loading)
 
+            # 降级：审核超时则直接采用本轮大纲
+            if review_error is not None:
+                approved_outline = outline_output
+                print(f"\n⚠️  大纲审核未完成（{review_error}），未经审核直接采用本轮大纲。\n")
+                break
+
             review_output = _extract_agent_output(
                 review_result, "Critic", "警告：未找到 Critic 的审核结果"
             )
@@ -229,7 +281,7 @@ class TopicStrategyWorkflow:
             critic_feedback = review_output
             print("\n⚠️  搜索大纲被打回，需要修正后再提交。\n")
 
-        if not approved_outline:
+        if not approved_outline and outline_output:
             approved_outline = outline_output
             print("\n⚠️  搜索大纲多次未通过质检，将在提示风险后继续进入分析。\n")
             print("   提醒：请在结果中重点核查“行业痛点/受众痛点/竞品做法”的数据来源。\n")
@@ -247,9 +299,11 @@ class TopicStrategyWorkflow:
 
         analysis_loading = start_loading("分析中（联网搜索）...")
         try:
-            analysis_result = await stream_messages(
-                analysis_team.run_stream(task=analysis_prompt),
-                display=StreamDisplayConfig(
+            analysis_result, analysis_error = await self._run_phase(
+                "analysis",
+                analysis_team,
+                analysis_prompt,
+                StreamDisplayConfig(
                     show_agent_headers=True,
                     show_content=True,
                     show_tools=True,
@@ -258,17 +312,27 @@ class TopicStrategyWorkflow:
             )
         finally:
             stop_loading(analysis_loading)
-        print_success("分析阶段完成")
 
-        analyst_output = _extract_agent_output(
-            analysis_result, "Analyst", "警告：未找到 Analyst 的输出"
-        )
+        # 降级：分析超时则使用已产出的部分内容
+        if analysis_error is not None:
+            analyst_output = _find_agent_output(analysis_result, "Analyst") or "（分析阶段未完成，未产出分析结论）"
+            print(f"\n⚠️  分析阶段未完成（{analysis_error}），使用已产出的部分分析继续。\n")
+        else:
+            print_success("分析阶段完成")
+            analyst_output = _extract_agent_output(
+                analysis_result, "Analyst", "警告：未找到 Analyst 的输出"
+            )
 
         # 阶段4：质检阶段（单 Agent，可带工具）
         print_phase_header("阶段4：质量检查", "bold magenta")
 
         critic_prompt = get_critic_prompt(analyst_output)
 
+        # 降级：预算接近上限时限制质检阶段的搜索次数（已用尽时本阶段会直接跳过）
+        if self.budget.exceeded is None and self.budget.near_limit():
+            self.budget.set_phase_search_cap(Config.BUDGET_DEGRADED_CRITIC_SEARCHES)
+            print(f"   运行预算接近上限，质检阶段最多搜索 {Config.BUDGET_DEGRADED_CRITIC_SEARCHES} 次\n")
+
         critic_team = RoundRobinGroupChat(
             participants=[self.critic],
             max_turns=3,  # 可能需要搜索验证
@@ -276,9 +340,11 @@ class TopicStrategyWorkflow:
 
         critic_loading = start_loading("质检中...")
         try:
-            critic_result = await stream_messages(
-                critic_team.run_stream(task=critic_prompt),
-                display=StreamDisplayConfig(
+            critic_result, critic_error = await self._run_phase(
+                "critic",
+                critic_team,
+                critic_prompt,
+                StreamDisplayConfig(
                     show_agent_headers=True,
                     show_content=True,
                     show_tools=True,
@@ -287,18 +353,32 @@ class TopicStrategyWorkflow:
             )
         finally:
             stop_loading(critic_loading)
-        print_success("质检阶段完成")
+            self.budget.set_phase_search_cap(None)
 
-        critic_output = _extract_agent_output(
-            critic_result, "Critic", "警告：未找到 Critic 的输出"
-        )
+        # 降级：质检超时则使用已产出的部分质检意见
+        if critic_error is not None:
+            critic_output = _find_agent_output(critic_result, "Critic") or "（质检阶段未完成，结论未经质检，请自行核查）"
+            print(f"\n⚠️  质检阶段未完成（{critic_error}），使用已产出的部分质检意见继续。\n")
+        else:
+            print_success("质检阶段完成")
+            critic_output = _extract_agent_output(
+                critic_result, "Critic", "警告：未找到 Critic 的输出"
+            )
         # 兜底显示质检报告摘要，避免仅有工具输出
         print_content(_truncate_output(critic_output, 400))
 
         # 阶段5：文档撰写阶段（单 Agent）
         print_phase_header("阶段5：文档生成", "bold blue")
 
-        writing_prompt = get_writing_prompt(user_input, additional_info, analyst_output, critic_output)
+        # 降级：预算接近上限或已用尽时使用压缩版撰写提示词（用尽时跳过了前面的阶段，放行这最后一次调用）
+        if self.budget.exceeded is not None:
+            print(f"   {self.budget.exceeded}，使用精简提示词根据已有内容生成文档\n")
+            writing_prompt = get_compact_writing_prompt(user_input, additional_info, analyst_output, critic_output)
+        elif self.budget.near_limit():
+            print("   运行预算接近上限，使用精简提示词生成文档\n")
+            writing_prompt = get_compact_writing_prompt(user_input, additional_info, analyst_output, critic_output)
+        else:
+            writing_prompt = get_writing_prompt(user_input, additional_info, analyst_output, critic_output)
 
         writing_team = RoundRobinGroupChat(
             participants=[self.writer],
@@ -307,22 +387,32 @@ class TopicStrategyWorkflow:
 
         writing_loading = start_loading("文档生成中...")
         try:
-            writing_result = await stream_messages(
-                writing_team.run_stream(task=writing_prompt),
-                display=StreamDisplayConfig(
-                    show_agent_headers=True,
-                    show_content=True,
-                    show_tools=False,
-                    content_max_chars=400,
-                ),
-            )
+            with self.budget.final_call():
+                writing_result, writing_error = await self._run_phase(
+                    "writing",
+                    writing_team,
+                    writing_prompt,
+                    StreamDisplayConfig(
+                        show_agent_headers=True,
+                        show_content=True,
+                        show_tools=False,
+                        content_max_chars=400,
+                    ),
+                )
         finally:
             stop_loading(writing_loading)
-        print_success("文档生成阶段完成")
 
-        writer_output = _extract_agent_output(
-            writing_result, "Writer", "警告：未找到 Writer 的输出"
-        )
+        # 降级：撰写超时且没有产出时，直接整理分析与质检内容成文
+        if writing_error is not None:
+            writer_output = _find_agent_output(writing_result, "Writer") or _fallback_document(
+                user_input, analyst_output, critic_output
+            )
+            print(f"\n⚠️  撰写阶段未完成（{writing_error}），已根据分析与质检内容直接整理文档。\n")
+        else:
+            print_success("文档生成阶段完成")
+            writer_output = _extract_agent_output(
+                writing_result, "Writer", "警告：未找到 Writer 的输出"
+            )
 
         # 保存文档
         output_path = self._save_document(writer_output)
@@ -330,10 +420,43 @@ class TopicStrategyWorkflow:
         print("\n" + "=" * 80)
         print("策略文档生成完成！")
         print(f"文档已保存至：{output_path}")
+        print(f"资源用量：{self.budget.format_usage()}")
+        limiter_stats = get_rate_limiter().format_stats()
+        if limiter_stats:
+            print("限流排队统计：")
+            print(limiter_stats)
+        hedge_stats = self.model_client.format_stats()
+        if hedge_stats:
+            print(hedge_stats)
+        cassette = get_cassette()
+        if cassette is not None:
+            print(cassette.format_stats())
         print("=" * 80 + "\n")
 
         return writer_output
 
+    async def _run_phase(self, phase: str, team, task: str, display: StreamDisplayConfig):
+        """
+        在阶段截止时间内运行单 Agent 团队
+
+        运行预算已用尽时直接跳过（撰写阶段除外，由调用方放行最后一次调用）。
+
+        Returns:
+            (TaskResult，阶段中断时为 None 或不完整的结果；中断原因，正常完成时为 None)
+        """
+        exceeded = self.budget.exceeded
+        if exceeded is not None and phase != "writing":
+            return None, exceeded
+        with self.model_client.phase(phase, Config.PHASE_DEADLINES[phase]) as status:
+            try:
+                result = await stream_messages(team.run_stream(task=task), display=display)
+            except (PhaseDeadlineExceeded, BudgetExceeded) as e:
+                return None, e
+        if status.error is None and exceeded is None:
+            # 本阶段内预算用尽
+            return result, self.budget.exceeded
+        return result, status.error
+
     def _save_document(self, content: str) -> str:
         """
         保存文档到文件
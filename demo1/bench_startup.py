@@ -0,0 +1,88 @@
+"""
+冷启动耗时基准
+
+统计两个关键时间点（每次都在新进程中测量）：
+1. `import app`：`python -m app` 打印横幅前的导入开销
+2. `import app.workflow`：创建工作流前的全部导入开销
+
+并解析 `python -X importtime` 输出，按顶层包汇总自身耗时，定位最重的依赖。
+
+用法（在 demo1 目录下）：
+    python bench_startup.py [--runs 5] [--top 15]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# 冷启动目标（毫秒，已扣除解释器自身启动时间）
+TARGET_BANNER_MS = 50
+TARGET_WORKFLOW_MS = 800
+
+
+def _measure_once(statement: str) -> float:
+    """在新进程中执行语句，返回耗时（毫秒）"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(statement: str, runs: int) -> float:
+    """多次测量取中位数"""
+    return statistics.median(_measure_once(statement) for _ in range(runs))
+
+
+def import_profile(module: str) -> dict:
+    """
+    解析 -X importtime 输出
+
+    Returns:
+        {顶层包名: 自身耗时之和（毫秒）}
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    totals = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1000
+    return dict(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的进程数")
+    parser.add_argument("--top", type=int, default=15, help="显示最重的前 N 个顶层包")
+    args = parser.parse_args()
+
+    baseline = measure("pass", args.runs)
+    banner = measure("import app", args.runs) - baseline
+    workflow = measure("import app.workflow", args.runs) - baseline
+
+    print("=" * 60)
+    print(f"解释器启动（基线）  : {baseline:8.1f} ms")
+    print(f"import app         : {banner:8.1f} ms  (目标 {TARGET_BANNER_MS} ms)")
+    print(f"import app.workflow: {workflow:8.1f} ms  (目标 {TARGET_WORKFLOW_MS} ms)")
+    print("=" * 60)
+
+    profile = import_profile("app.workflow")
+    print(f"按顶层包汇总的导入耗时（前 {args.top} 项）：")
+    for name, ms in sorted(profile.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+        print(f"  {name:<30} {ms:8.1f} ms")
+    print("=" * 60)
+
+    over_budget = banner > TARGET_BANNER_MS or workflow > TARGET_WORKFLOW_MS
+    if over_budget:
+        print("[WARN] 冷启动超出目标")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
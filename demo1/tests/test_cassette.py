@@ -0,0 +1,71 @@
+"""录制/回放与对冲请求的组合：回放顺序不能被对冲的重复请求打乱"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from autogen_core.models import CreateResult, RequestUsage, UserMessage
+
+from app import cassette as cassette_module
+from app.cassette import KIND_MODEL, MODE_RECORD, Cassette
+from app.config import Config
+from app.model_client import CassetteChatCompletionClient, create_model_client
+
+
+def _message(text: str) -> UserMessage:
+    return UserMessage(content=text, source="user")
+
+
+def _result(text: str) -> dict:
+    result = CreateResult(
+        finish_reason="stop",
+        content=text,
+        usage=RequestUsage(prompt_tokens=1, completion_tokens=1),
+        cached=False,
+    )
+    return result.model_dump(mode="json")
+
+
+class ReplayWithHedgingTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cassette.jsonl")
+        recorder = Cassette(self.path, MODE_RECORD)
+        # 第一条很快、之后变慢：开启对冲时，第二次调用必然触发对冲请求
+        for text, latency in (("A", 0.01), ("B", 0.2), ("C", 0.2)):
+            request = CassetteChatCompletionClient._serialize_request([_message(text)], [])
+            recorder.record(KIND_MODEL, request, _result(f"answer-{text}"), latency)
+
+        cassette_module._cassette = None
+        patches = {
+            "CASSETTE_MODE": "replay",
+            "CASSETTE_PATH": self.path,
+            "CASSETTE_LATENCY_SCALE": 1.0,
+            "HEDGE_ENABLED": True,
+            "HEDGE_MIN_SAMPLES": 1,
+            "HEDGE_PERCENTILE": 0.0,
+            "HEDGE_MAX_RATIO": 1.0,
+        }
+        self.patchers = [mock.patch.object(Config, name, value) for name, value in patches.items()]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        cassette_module._cassette = None
+        self.tmp.cleanup()
+
+    async def test_replay_keeps_order_with_hedging_enabled(self):
+        client = create_model_client()
+        answers = [(await client.create([_message(text)])).content for text in ("A", "B", "C")]
+
+        self.assertEqual(answers, ["answer-A", "answer-B", "answer-C"])
+        self.assertEqual(client.hedges, 0)
+        cassette = cassette_module.get_cassette()
+        self.assertEqual(cassette.replayed, 3)
+        self.assertEqual(cassette.fallbacks, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
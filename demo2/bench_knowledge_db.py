@@ -0,0 +1,108 @@
+"""SQLite 读写吞吐基准：对比“每次操作新建连接”（旧实现）与线程长连接 + WAL（KnowledgeDB）
+
+用法：python bench_knowledge_db.py [--rows 2000] [--readers 4] [--seconds 3]
+"""
+import argparse
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from knowledge_db import KnowledgeDB
+
+
+class _LegacyDB:
+    """旧实现：每次操作 sqlite3.connect，默认日志模式"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        with self._get_conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS web_knowledge (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "keyword TEXT NOT NULL, expanded_keywords TEXT, title TEXT, content TEXT NOT NULL, "
+                "source_url TEXT, search_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+                "synced_to_vector INTEGER DEFAULT 0)"
+            )
+
+    def _get_conn(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def save(self, keyword: str, content: str) -> int:
+        with self._get_conn() as conn:
+            cursor = conn.execute(
+                "INSERT INTO web_knowledge (keyword, content) VALUES (?, ?)", (keyword, content)
+            )
+            return cursor.lastrowid
+
+    def get_by_id(self, record_id: int):
+        with self._get_conn() as conn:
+            row = conn.execute("SELECT * FROM web_knowledge WHERE id = ?", (record_id,)).fetchone()
+            return dict(row) if row else None
+
+
+def _bench_writes(db, rows: int) -> float:
+    start = time.perf_counter()
+    for i in range(rows):
+        db.save(keyword=f"关键词{i}", content=f"内容 {i} " * 20)
+    return rows / (time.perf_counter() - start)
+
+
+def _bench_mixed(db, rows: int, readers: int, seconds: float) -> tuple:
+    """readers 个读线程随机按 ID 读取，同时一个写线程持续写入"""
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0]
+
+    def reader(slot: int):
+        i = slot
+        while not stop.is_set():
+            db.get_by_id(i % rows + 1)
+            reads[slot] += 1
+            i += 7
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            db.save(keyword=f"新增{i}", content=f"新增内容 {i} " * 20)
+            writes[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=reader, args=(slot,)) for slot in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(reads) / seconds, writes[0] / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 读写吞吐基准")
+    parser.add_argument("--rows", type=int, default=2000, help="预写入的行数")
+    parser.add_argument("--readers", type=int, default=4, help="并发读线程数")
+    parser.add_argument("--seconds", type=float, default=3.0, help="并发读写测试时长")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        candidates = [
+            ("旧实现（每次新建连接）", _LegacyDB(Path(tmp) / "legacy.db")),
+            ("KnowledgeDB（长连接 + WAL）", KnowledgeDB(Path(tmp) / "pooled.db")),
+        ]
+        print("=" * 60)
+        for name, db in candidates:
+            write_rate = _bench_writes(db, args.rows)
+            read_rate, mixed_write_rate = _bench_mixed(db, args.rows, args.readers, args.seconds)
+            print(f"[{name}]")
+            print(f"  顺序写入: {write_rate:10.0f} 行/秒")
+            print(f"  并发读取: {read_rate:10.0f} 次/秒（{args.readers} 个读线程）")
+            print(f"  并发写入: {mixed_write_rate:10.0f} 行/秒（与读线程同时进行）")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""检索规模基准：本地哈希向量（不调用 API）+ 合成语料，测量入库、同步、重建、查询延迟与内存随语料规模的变化
+
+每个规模在独立的子进程与临时目录中运行，互不影响，峰值内存按进程统计。
+
+用法：python bench_retrieval.py [--sizes 1000,10000,100000] [--queries 200] [--backend numpy]
+      （100 万条单次运行需要数十分钟）
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+
+_RESULT_PREFIX = "BENCH_RESULT "
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _dir_size_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 1e6
+
+
+def _percentiles(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+    return {"p50": statistics.median(latencies), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def _run_worker(rows: int, queries: int, seed: int) -> dict:
+    """在当前目录（临时目录）下完成一个规模的全部测量"""
+    from config import DB_DIR
+    from init_db import rebuild_vector_db
+    from knowledge_db import KnowledgeDB
+    from retriever import KnowledgeRetriever
+    from sync_to_vector import sync_to_vector
+    from synthetic_corpus import SyntheticCorpus, populate
+
+    result = {"rows": rows}
+    knowledge_db = KnowledgeDB()
+    result["write_rps"] = populate(knowledge_db, rows, seed=seed)
+
+    # 同步 / 重建的进度输出不计入结果
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sync_to_vector()
+    result["sync_rps"] = rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rebuild_vector_db()
+    result["rebuild_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        retriever = KnowledgeRetriever()
+    result["load_ms"] = (time.perf_counter() - start) * 1000
+
+    texts = SyntheticCorpus(seed=seed).queries(queries)
+    for mode in ("vector", "hybrid"):
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            retriever.retrieve(text, n_results=5, min_similarity=0.0, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+        result[mode] = _percentiles(latencies)
+
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["disk_mb"] = _dir_size_mb(Path(DB_DIR))
+    return result
+
+
+def _run_size(rows: int, queries: int, seed: int, backend: str) -> dict:
+    env = dict(
+        os.environ,
+        EMBEDDING_BACKEND="local",
+        EMBEDDING_CACHE_ENABLED="false",
+        VECTOR_BACKEND=backend,
+        # 测的是检索本身，关闭进程内缓存
+        QUERY_EMBEDDING_CACHE_SIZE="0",
+        RETRIEVAL_CACHE_SIZE="0",
+        PYTHONPATH=os.pathsep.join(filter(None, [str(Path(__file__).parent), os.environ.get("PYTHONPATH")])),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        completed = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--worker",
+             "--rows", str(rows), "--queries", str(queries), "--seed", str(seed)],
+            cwd=tmp, env=env, capture_output=True, text=True, encoding="utf-8",
+        )
+    for line in completed.stdout.splitlines():
+        if line.startswith(_RESULT_PREFIX):
+            return json.loads(line[len(_RESULT_PREFIX):])
+    raise RuntimeError(f"{rows} 条的测试失败:\n{completed.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索规模基准（本地向量 + 合成语料）")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="语料规模，逗号分隔（如 1000,10000,100000,1000000）")
+    parser.add_argument("--queries", type=int, default=200, help="每种检索模式的查询次数")
+    parser.add_argument("--seed", type=int, default=0, help="语料随机种子")
+    parser.add_argument("--backend", default="numpy", choices=["numpy", "chroma"], help="向量索引后端")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(_RESULT_PREFIX + json.dumps(_run_worker(args.rows, args.queries, args.seed)))
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    print("=" * 112)
+    print(f"检索规模基准：{args.backend} 索引，本地哈希向量，每种模式 {args.queries} 次查询")
+    print("-" * 112)
+    print(
+        f"{'条数':>9}{'写入(条/s)':>12}{'同步(条/s)':>12}{'重建(s)':>9}{'加载(ms)':>10}"
+        f"{'向量p50/p95/p99(ms)':>24}{'混合p50/p95/p99(ms)':>24}{'内存(MB)':>10}{'磁盘(MB)':>10}"
+    )
+    for rows in sizes:
+        result = _run_size(rows, args.queries, args.seed, args.backend)
+        latency = lambda mode: "/".join(f"{result[mode][q]:.1f}" for q in ("p50", "p95", "p99"))
+        rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+        print(
+            f"{rows:>9}{result['write_rps']:>12.0f}{result['sync_rps']:>12.0f}{result['rebuild_s']:>9.1f}"
+            f"{result['load_ms']:>10.1f}{latency('vector'):>26}{latency('hybrid'):>26}{rss:>10}{result['disk_mb']:>10.1f}"
+        )
+    print("=" * 112)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""向量索引基准：对比 Chroma（HNSW）与 NumPy 内存映射索引的加载耗时、查询延迟、召回率、常驻内存与磁盘占用
+
+使用随机生成的归一化向量，不调用 Embedding API。
+NumPy 索引的常驻内存指每次查询都要完整扫描的文件（vectors.bin + scales.bin）；
+重排用的 float32 原始向量只按候选行读取，计入磁盘不计入常驻内存。
+
+用法：python bench_vector_index.py [--rows 20000] [--dim 256] [--queries 200] [--k 10] [--ivf-lists 64]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if sys.platform == "win32":
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+
+import numpy as np
+
+import numpy_index
+
+_ADD_CHUNK_SIZE = 5000
+
+
+def _make_data(rows: int, dim: int, queries: int, seed: int = 0):
+    """按簇生成数据（更接近真实语料），查询为数据点加噪声"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, rows // 200), dim)).astype(np.float32)
+    data = centers[rng.integers(len(centers), size=rows)] + 0.5 * rng.normal(size=(rows, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    picks = rng.integers(rows, size=queries)
+    query = data[picks] + 0.3 * rng.normal(size=(queries, dim)).astype(np.float32)
+    query /= np.linalg.norm(query, axis=1, keepdims=True)
+    return data, query
+
+
+def _ground_truth(data: np.ndarray, query: np.ndarray, k: int) -> list:
+    scores = query @ data.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _resident_size(path: Path) -> int:
+    return sum(f.stat().st_size for name in ("vectors.bin", "scales.bin") for f in path.rglob(name))
+
+
+def _fill(collection, data: np.ndarray):
+    for start in range(0, len(data), _ADD_CHUNK_SIZE):
+        chunk = data[start : start + _ADD_CHUNK_SIZE]
+        ids = [f"idx_{i}" for i in range(start, start + len(chunk))]
+        collection.upsert(
+            ids=ids,
+            embeddings=chunk.tolist(),
+            metadatas=[{"sqlite_id": i, "keyword": f"k{i}"} for i in range(start, start + len(chunk))],
+        )
+
+
+def _measure(open_collection, query: np.ndarray, truth: list, k: int) -> dict:
+    """冷加载（新客户端 + 首次查询）耗时、逐条查询延迟与 recall@k"""
+    start = time.perf_counter()
+    collection = open_collection()
+    collection.query(query_embeddings=[query[0].tolist()], n_results=k)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    latencies, hits = [], 0
+    for vector, expected in zip(query, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[vector.tolist()], n_results=k, include=["metadatas", "distances"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len({metadata["sqlite_id"] for metadata in result["metadatas"][0]} & expected)
+    latencies.sort()
+    return {
+        "load_ms": load_ms,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "recall": hits / (k * len(truth)),
+    }
+
+
+def _bench_chroma(root: Path, data, query, truth, k):
+    try:
+        import chromadb
+        from chromadb.api.client import SharedSystemClient
+        from chromadb.config import Settings
+    except ImportError:
+        return None
+
+    path = root / "chroma"
+    settings = Settings(anonymized_telemetry=False)
+    start = time.perf_counter()
+    client = chromadb.PersistentClient(path=str(path), settings=settings)
+    _fill(client.create_collection(name="bench"), data)
+    build_s = time.perf_counter() - start
+    del client
+    SharedSystemClient.clear_system_cache()
+
+    def open_collection():
+        # 清掉进程内缓存，模拟新进程启动
+        SharedSystemClient.clear_system_cache()
+        return chromadb.PersistentClient(path=str(path), settings=settings).get_collection(name="bench")
+
+    stats = _measure(open_collection, query, truth, k)
+    stats.update(build_s=build_s, disk_mb=_dir_size(path) / 1e6)
+    return stats
+
+
+def _bench_numpy(
+    root: Path, name: str, data, query, truth, k, dtype="float32", ivf_lists=0, ivf_probe=8, rescore=0
+):
+    numpy_index.NUMPY_INDEX_RESCORE = rescore
+    numpy_index.NUMPY_INDEX_IVF_LISTS = ivf_lists
+    numpy_index.NUMPY_INDEX_IVF_PROBE = ivf_probe
+    numpy_index.NUMPY_INDEX_IVF_MIN_SIZE = 1 if ivf_lists else 0
+    path = root / name
+    start = time.perf_counter()
+    client = numpy_index.NumpyIndexClient(path, dtype=dtype)
+    collection = client.create_collection(name="bench")
+    if ivf_lists:
+        # 先写入全部数据再训练一次分区，避免逐批重训
+        numpy_index.NUMPY_INDEX_IVF_LISTS = 0
+        _fill(collection, data)
+        numpy_index.NUMPY_INDEX_IVF_LISTS = ivf_lists
+        collection._train_ivf(len(data))
+    else:
+        _fill(collection, data)
+    build_s = time.perf_counter() - start
+    collection.close()
+
+    stats = _measure(lambda: numpy_index.NumpyIndexClient(path, dtype=dtype).get_collection("bench"), query, truth, k)
+    stats.update(build_s=build_s, disk_mb=_dir_size(path) / 1e6, resident_mb=_resident_size(path) / 1e6)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量索引基准（Chroma vs NumPy）")
+    parser.add_argument("--rows", type=int, default=20000, help="向量条数")
+    parser.add_argument("--dim", type=int, default=256, help="向量维度")
+    parser.add_argument("--queries", type=int, default=200, help="查询次数")
+    parser.add_argument("--k", type=int, default=10, help="top-k")
+    parser.add_argument("--ivf-lists", type=int, default=64, help="IVF 分区数（0 跳过 IVF 测试）")
+    parser.add_argument("--ivf-probe", type=int, default=8, help="IVF 每次探测的分区数")
+    parser.add_argument("--rescore", type=int, default=4, help="低精度索引重排的候选倍数")
+    args = parser.parse_args()
+
+    data, query = _make_data(args.rows, args.dim, args.queries)
+    truth = _ground_truth(data, query, args.k)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        chroma = _bench_chroma(root, data, query, truth, args.k)
+        if chroma:
+            results.append(("Chroma (HNSW)", chroma))
+        results.append(("NumPy float32", _bench_numpy(root, "np32", data, query, truth, args.k)))
+        results.append(("NumPy float16", _bench_numpy(root, "np16", data, query, truth, args.k, dtype="float16")))
+        results.append(("NumPy int8", _bench_numpy(root, "np8", data, query, truth, args.k, dtype="int8")))
+        if args.rescore:
+            for dtype, short in (("float16", "16"), ("int8", "8")):
+                results.append((f"NumPy {dtype} +重排×{args.rescore}", _bench_numpy(
+                    root, f"np{short}r", data, query, truth, args.k, dtype=dtype, rescore=args.rescore
+                )))
+        if args.ivf_lists:
+            label = f"NumPy IVF {args.ivf_lists}/{args.ivf_probe}"
+            results.append((label, _bench_numpy(
+                root, "npivf", data, query, truth, args.k, ivf_lists=args.ivf_lists, ivf_probe=args.ivf_probe
+            )))
+
+    print("=" * 96)
+    print(f"{args.rows} 条 × {args.dim} 维，{args.queries} 次查询，top-{args.k}")
+    print("-" * 96)
+    print(
+        f"{'索引':<22}{'构建(s)':>9}{'加载(ms)':>10}{'p50(ms)':>9}{'p95(ms)':>9}{'召回率':>9}"
+        f"{'常驻(MB)':>10}{'磁盘(MB)':>10}"
+    )
+    for name, stats in results:
+        resident = f"{stats['resident_mb']:.1f}" if "resident_mb" in stats else "-"
+        print(
+            f"{name:<24}{stats['build_s']:>9.2f}{stats['load_ms']:>10.1f}{stats['p50_ms']:>9.2f}"
+            f"{stats['p95_ms']:>9.2f}{stats['recall']:>9.1%}{resident:>10}{stats['disk_mb']:>10.1f}"
+        )
+    print("=" * 96)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,8 @@ ZHIPUAI_API_KEY = os.getenv("ZHIPUAI_API_KEY")
 
 # Embedding 配置
 EMBEDDING_MODEL = os.getenv("ZHIPUAI_EMBEDDING_MODEL", "embedding-3")
+# 请求的向量维度（embedding-3 支持 256 / 512 / 1024 / 2048，0 表示模型默认维度）；修改后需要重建向量库
+EMBEDDING_DIMENSIONS = int(os.getenv("ZHIPUAI_EMBEDDING_DIMENSIONS", "0"))
 
 # 联网搜索配置
 WEB_SEARCH_ENABLED = os.getenv("ZHIPU_WEB_SEARCH_ENABLED", "false").lower() == "true"
@@ -21,4 +23,77 @@ WEB_SEARCH_ENGINE = os.getenv("ZHIPU_SEARCH_ENGINE", "search_std")
 DB_DIR = Path("./db")
 CHROMADB_PATH = DB_DIR / "chromadb"
 SQLITE_DB_PATH = DB_DIR / "knowledge.db"
+# SQLite 页缓存（KB）与内存映射大小（字节）
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
 COLLECTION_NAME = "knowledge_base"
+
+# 向量缓存（模型 + 文本 -> 向量），语料不变时重建向量库无需调用 API
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = DB_DIR / "embedding_cache.db"
+
+# 向量化吞吐配置：单次请求的最大条数 / 估算 token 数、并发批次数、每分钟请求上限
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "32000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "120"))
+
+# 增量同步每页读取的行数（按 id 键集分页，控制内存占用）
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+
+# 后台向量同步：新入库的 ID 攒够防抖窗口（秒）或条数后批量同步；退出时等待刷盘的最长秒数
+SYNC_DEBOUNCE_SECONDS = float(os.getenv("SYNC_DEBOUNCE_SECONDS", "1.0"))
+SYNC_MAX_PENDING = int(os.getenv("SYNC_MAX_PENDING", "256"))
+SYNC_FLUSH_TIMEOUT = float(os.getenv("SYNC_FLUSH_TIMEOUT", "30"))
+
+# 当前生效的向量集合名（重建时在新集合中构建，完成后原子切换该指针）
+ACTIVE_COLLECTION_FILE = DB_DIR / "active_collection"
+
+# 向量索引后端：chroma（默认）或 numpy（内存映射矩阵 + 点积，启动快、无需 HNSW）
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+NUMPY_INDEX_PATH = DB_DIR / "numpy_index"
+# 向量存储精度：float32、float16（内存减半）或 int8（每行一个缩放系数，内存约 1/4）
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float32")
+# 低精度存储时另存一份 float32 原始向量（只在磁盘上按需读取，不常驻内存）：
+# 先用低精度向量取 top-k × 该倍数的候选，再按原始精度重排；0 表示不保存原始向量、不重排
+NUMPY_INDEX_RESCORE = int(os.getenv("NUMPY_INDEX_RESCORE", "4"))
+# IVF 分区数（0 表示不分区、全量点积）；每次查询探测的分区数；数据量达到多少时开始训练分区
+NUMPY_INDEX_IVF_LISTS = int(os.getenv("NUMPY_INDEX_IVF_LISTS", "0"))
+NUMPY_INDEX_IVF_PROBE = int(os.getenv("NUMPY_INDEX_IVF_PROBE", "8"))
+NUMPY_INDEX_IVF_MIN_SIZE = int(os.getenv("NUMPY_INDEX_IVF_MIN_SIZE", "20000"))
+
+# 检索模式：hybrid（关键词快速路径 + BM25 全文 + 向量，RRF 融合）或 vector（仅向量）
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# 倒数排名融合常数（越大各来源排名差异的影响越平缓）
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# 检索器内存缓存：查询向量 LRU 条数、检索结果 LRU 条数（0 表示关闭）
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "256"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))
+
+# 入库去重：近似重复的 MinHash 相似度阈值（估计的 Jaccard）、参与近似去重的最短内容长度（规范化后的字数）
+DEDUP_NEAR_THRESHOLD = float(os.getenv("DEDUP_NEAR_THRESHOLD", "0.8"))
+DEDUP_NEAR_MIN_CHARS = int(os.getenv("DEDUP_NEAR_MIN_CHARS", "20"))
+
+# 联网搜索缓存（规范化查询 + 模型 -> 搜索结果与提取出的知识条目）：有效期（小时）、最多保留条数（按最近使用淘汰）
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_PATH = DB_DIR / "search_cache.db"
+SEARCH_CACHE_TTL_HOURS = float(os.getenv("SEARCH_CACHE_TTL_HOURS", "24"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000"))
+
+# 联网搜索模式：fanout（原始关键词与每个扩展词分别搜索，并发执行后合并）或 combined（拼成一个查询只搜索一次）
+SEARCH_MODE = os.getenv("SEARCH_MODE", "fanout").lower()
+# 搜索 / 提取调用的并发数与每分钟请求上限（两类调用共用一个限流器）
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "4"))
+SEARCH_RPM = float(os.getenv("SEARCH_RPM", "120"))
+
+# 流式提取入库：边接收提取结果边解析，每条知识经 保存 -> 向量化 -> 写索引 三个阶段流水处理；阶段之间的队列长度（满时上游等待）
+EXTRACT_STREAMING = os.getenv("EXTRACT_STREAMING", "true").lower() == "true"
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+# 检索等待本次条目写入索引的最长时间（秒），超时后未完成的记录交给后台同步
+INGEST_FLUSH_TIMEOUT = float(os.getenv("INGEST_FLUSH_TIMEOUT", "60"))
+
+# Embedding 后端：zhipu（智谱 API）或 local（本地哈希字符 n-gram 向量，确定性、无需网络，用于离线测试与基准）
+# 两种后端的向量维度不同，切换后需要执行 init_db.py 重建向量库
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "zhipu").lower()
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "256"))
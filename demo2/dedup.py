@@ -0,0 +1,81 @@
+"""内容去重：规范化内容指纹（完全重复）+ MinHash 签名与分段 LSH（近似重复）
+
+知识条目多为几十到几百字的短文本，SimHash 对这类文本的少量改动就会产生较大的汉明距离，
+因此近似去重用字符 bigram 的 MinHash 估计 Jaccard 相似度。
+"""
+import hashlib
+import re
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+
+# MinHash：64 个哈希函数，分 16 段、每段 4 个；Jaccard 约 0.5 以上的两条内容大概率至少有一段相同
+NUM_PERM = 64
+LSH_BANDS = 16
+_ROWS_PER_BAND = NUM_PERM // LSH_BANDS
+
+# 字符 n-gram 长度（中文不分词，按字切片；码点最多 21 位，bigram 可无损编码进 64 位整数）
+_SHINGLE_SIZE = 2
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+# multiply-shift 哈希族：h(x) = (a * x + b) mod 2^64 的高 32 位（a 为奇数），固定种子保证签名可复现
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, 2 ** 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+
+
+def normalize_text(text: str) -> str:
+    """规范化：全半角统一（NFKC）、小写、去掉空白与标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _NON_WORD.sub("", text)
+
+
+def content_fingerprint(text: str) -> str:
+    """规范化后的内容指纹（只差空白 / 标点 / 大小写的内容视为相同）"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _shingles(normalized: str) -> np.ndarray:
+    """字符 bigram 直接编码为整数（两个码点拼接，无需再哈希），去重后返回"""
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < _SHINGLE_SIZE:
+        return codes
+    return np.unique((codes[:-1] << np.uint64(21)) | codes[1:])
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """MinHash 签名（NUM_PERM 个 uint32），空内容返回 None"""
+    values = _shingles(normalize_text(text))
+    if not len(values):
+        return None
+    # uint64 乘法按 2^64 回绕，正是 multiply-shift 需要的取模
+    with np.errstate(over="ignore"):
+        hashed = (values[:, np.newaxis] * _PERM_A + _PERM_B) >> np.uint64(32)
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def lsh_bands(signature: np.ndarray) -> List[int]:
+    """每段签名压成一个有符号 64 位整数（可直接存入 SQLite INTEGER）"""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(signature[band * _ROWS_PER_BAND : (band + 1) * _ROWS_PER_BAND].tobytes(), digest_size=8).digest(),
+            "big",
+            signed=True,
+        )
+        for band in range(LSH_BANDS)
+    ]
+
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """两条签名的估计 Jaccard 相似度"""
+    return float(np.mean(a == b))
+
+
+def pack_signature(signature: Optional[np.ndarray]) -> Optional[bytes]:
+    return None if signature is None else signature.astype("<u4").tobytes()
+
+
+def unpack_signature(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    return None if blob is None else np.frombuffer(blob, dtype="<u4")
@@ -0,0 +1,93 @@
+"""向量缓存：按 (模型 + 文本) 内容寻址，避免重复调用 Embedding API"""
+import hashlib
+import sqlite3
+import threading
+from array import array
+from typing import List, Optional, Sequence
+
+from config import EMBEDDING_CACHE_PATH
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key BLOB PRIMARY KEY,
+    vector BLOB NOT NULL
+) WITHOUT ROWID
+"""
+
+# SQLite 单条语句的参数个数有上限，批量查询时分段
+_MAX_PARAMS = 500
+
+
+def _cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    """float32 紧凑存储（约为 JSON 的 1/5）"""
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """SQLite 向量缓存（线程安全）"""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_CREATE_TABLE_SQL)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """批量查询，未命中的位置为 None"""
+        keys = [_cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _MAX_PARAMS):
+                chunk = keys[i : i + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})",
+                    chunk,
+                )
+                found.update(rows.fetchall())
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+
+        return [_unpack(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """批量写入"""
+        rows = [(_cache_key(model, text), _pack(vector)) for text, vector in zip(texts, vectors)]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)",
+                    rows,
+                )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
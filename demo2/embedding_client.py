@@ -1,29 +1,161 @@
-"""智谱AI Embedding 客户端"""
-from typing import List
+"""Embedding 客户端：智谱AI API，或本地哈希 n-gram 向量（离线测试 / 基准）"""
+import unicodedata
+from typing import List, Optional
 
-from chromadb.api.types import Documents, EmbeddingFunction
-from zai import ZhipuAiClient
+import numpy as np
 
-from config import EMBEDDING_MODEL, ZHIPUAI_API_KEY
+from config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    LOCAL_EMBEDDING_DIM,
+    VECTOR_BACKEND,
+    ZHIPUAI_API_KEY,
+)
+from embedding_cache import EmbeddingCache
+
+if VECTOR_BACKEND == "chroma":
+    from chromadb.api.types import Documents, EmbeddingFunction
+else:
+    # NumPy 索引不经过 Chroma，省去导入 chromadb 的约 1 秒
+    Documents = List[str]
+    EmbeddingFunction = object
+
+# 缓存按模型区分；指定维度时不同维度的向量互不复用
+_CACHE_MODEL = f"{EMBEDDING_MODEL}@{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else EMBEDDING_MODEL
 
 
 class ZhipuAIEmbedding(EmbeddingFunction):
-    """智谱AI Embedding API 客户端"""
+    """智谱AI Embedding API 客户端（带持久化向量缓存）"""
 
-    def __init__(self):
+    def __init__(self, cache: Optional[EmbeddingCache] = None):
         if not ZHIPUAI_API_KEY:
             raise ValueError("ZHIPUAI_API_KEY 未设置，请检查 .env 文件")
+        # 用到时才导入 SDK：本地向量后端（离线测试 / 基准）不需要安装 zai
+        from zai import ZhipuAiClient
+
         self.client = ZhipuAiClient(api_key=ZHIPUAI_API_KEY)
+        if cache is None and EMBEDDING_CACHE_ENABLED:
+            cache = EmbeddingCache()
+        self.cache = cache
+        self.api_calls = 0
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """批量向量化文本"""
-        response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """直接调用 API"""
+        self.api_calls += 1
+        options = {"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS else {}
+        response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=texts, **options)
         return [item.embedding for item in response.data]
 
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量向量化文本（只对缓存未命中的文本调用 API）"""
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        results = self.cache.get_many(_CACHE_MODEL, texts)
+        # 同一批内的重复文本只请求一次
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, results) if vector is None))
+        if missing:
+            vectors = self.embed_missing(missing)
+            fetched = dict(zip(missing, vectors))
+            results = [vector if vector is not None else fetched[text] for text, vector in zip(texts, results)]
+        return results
+
+    def embed_missing(self, texts: List[str]) -> List[List[float]]:
+        """调用 API 向量化（调用方已确认缓存未命中），结果写入缓存"""
+        vectors = self._embed_uncached(texts)
+        if self.cache is not None:
+            self.cache.put_many(_CACHE_MODEL, texts, vectors)
+        return vectors
+
+    def lookup_cached(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """只查缓存，不调用 API（未命中的位置为 None）"""
+        if self.cache is None:
+            return [None] * len(texts)
+        return self.cache.get_many(_CACHE_MODEL, texts)
+
     def embed_query(self, text: str) -> List[float]:
         """向量化单个查询文本"""
-        response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=[text])
-        return response.data[0].embedding
+        return self.embed_documents([text])[0]
+
+    def cache_stats(self) -> dict:
+        """缓存命中统计"""
+        stats = self.cache.stats() if self.cache else {"hits": 0, "misses": 0, "hit_rate": 0.0}
+        stats["api_calls"] = self.api_calls
+        return stats
+
+    def __call__(self, input: Documents) -> List[List[float]]:
+        """兼容 Chromadb 的 EmbeddingFunction 接口"""
+        if isinstance(input, str):
+            return [self.embed_query(input)]
+        if isinstance(input, list):
+            return self.embed_documents(input)
+        raise ValueError(f"不支持的输入类型: {type(input)}")
+
+
+class LocalHashEmbedding(EmbeddingFunction):
+    """
+    本地哈希 n-gram 向量（不调用 API）
+
+    文本规范化后取字符 1/2/3-gram，码点直接拼成整数，用 multiply-shift 哈希映射到 dim 维并带符号累加，
+    按 n-gram 出现次数做次线性加权后 L2 归一化。同一文本在任何进程中得到相同向量，
+    字面相近的文本余弦相似度高，足以替代真实向量做吞吐、延迟与规模测试。
+    """
+
+    # 本地计算不受 API 速率限制，也无需持久化缓存
+    rate_limited = False
+    # multiply-shift 参数（奇数乘数），每种 n-gram 一组，固定值保证跨进程一致
+    _MULTIPLIERS = (
+        np.uint64(0x9E3779B97F4A7C15),
+        np.uint64(0xC2B2AE3D27D4EB4F),
+        np.uint64(0x165667B19E3779F9),
+    )
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+        self.cache = None
+        self.api_calls = 0
+
+    def _vectorize(self, text: str) -> List[float]:
+        normalized = unicodedata.normalize("NFKC", text).lower()
+        codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        grams = [codes]
+        if len(codes) >= 2:
+            grams.append((codes[:-1] << np.uint64(21)) | codes[1:])
+        if len(codes) >= 3:
+            grams.append((codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:])
+
+        vector = np.zeros(self.dim, dtype=np.float64)
+        with np.errstate(over="ignore"):
+            for values, multiplier in zip(grams, self._MULTIPLIERS):
+                if not len(values):
+                    continue
+                hashed = values * multiplier
+                index = (hashed >> np.uint64(40)) % np.uint64(self.dim)
+                sign = np.where(hashed & np.uint64(1 << 39), 1.0, -1.0)
+                vector += np.bincount(index.astype(np.int64), weights=sign, minlength=self.dim)
+        # 次线性加权：高频 n-gram 不主导方向
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vectorize(text) for text in texts]
+
+    def embed_missing(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    def lookup_cached(self, texts: List[str]) -> List[Optional[List[float]]]:
+        return [None] * len(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vectorize(text)
+
+    def cache_stats(self) -> dict:
+        return {"hits": 0, "misses": 0, "hit_rate": 0.0, "api_calls": 0}
 
     def __call__(self, input: Documents) -> List[List[float]]:
         """兼容 Chromadb 的 EmbeddingFunction 接口"""
@@ -32,3 +164,10 @@ class ZhipuAIEmbedding(EmbeddingFunction):
         if isinstance(input, list):
             return self.embed_documents(input)
         raise ValueError(f"不支持的输入类型: {type(input)}")
+
+
+def create_embedding_function():
+    """按 EMBEDDING_BACKEND 创建 Embedding 客户端"""
+    if EMBEDDING_BACKEND == "local":
+        return LocalHashEmbedding()
+    return ZhipuAIEmbedding()
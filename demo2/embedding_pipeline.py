@@ -0,0 +1,128 @@
+"""并发向量化管道：按条数与 token 量打包，多个批次并发请求，失败批次逐条重试"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from config import (
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_MAX_BATCH_SIZE,
+    EMBEDDING_MAX_BATCH_TOKENS,
+    EMBEDDING_RPM,
+)
+from rate_limiter import RateLimiter
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数（中文约 1 字 1 token，按字符数估算偏保守）"""
+    return max(1, len(text))
+
+
+def pack_batches(
+    texts: List[str],
+    max_count: int = EMBEDDING_MAX_BATCH_SIZE,
+    max_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+) -> List[List[int]]:
+    """
+    按条数和 token 量打包
+
+    Returns:
+        每个批次内文本在 texts 中的下标
+    """
+    batches = []
+    current, current_tokens = [], 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_count or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingPipeline:
+    """并发向量化（缓存命中的文本不占用 API 配额）"""
+
+    def __init__(
+        self,
+        embedding_function,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        limiter: Optional[RateLimiter] = None,
+        max_retries: int = 2,
+        max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+    ):
+        self.embedding_function = embedding_function
+        self.concurrency = max(1, concurrency)
+        self.max_batch_size = max_batch_size
+        # 本地向量化（rate_limited = False）不限流
+        rpm = EMBEDDING_RPM if getattr(embedding_function, "rate_limited", True) else 0
+        self.limiter = limiter or RateLimiter(rpm, burst=self.concurrency)
+        self.max_retries = max_retries
+        self.failed = 0
+        self.api_batches = 0
+
+    def _call(self, texts: List[str]) -> List[List[float]]:
+        self.limiter.acquire()
+        # 缓存已在 embed() 中查过，直接请求未命中的部分
+        embed = getattr(self.embedding_function, "embed_missing", self.embedding_function.embed_documents)
+        return embed(texts)
+
+    def _embed_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """整批请求失败时逐条重试，仍失败的位置返回 None"""
+        try:
+            return self._call(texts)
+        except Exception as e:
+            print(f"[WARN] 批次向量化失败（{len(texts)} 条），逐条重试: {e}")
+
+        results = []
+        for text in texts:
+            vector = None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    vector = self._call([text])[0]
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        print(f"[WARN] 单条向量化失败，跳过: {e}")
+                    else:
+                        time.sleep(2 ** attempt)
+            if vector is None:
+                self.failed += 1
+            results.append(vector)
+        return results
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        向量化全部文本
+
+        Returns:
+            与 texts 一一对应的向量，失败的位置为 None
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        # 先查缓存，只打包未命中的文本
+        lookup = getattr(self.embedding_function, "lookup_cached", None)
+        cached = lookup(texts) if lookup else [None] * len(texts)
+        pending = []
+        for index, vector in enumerate(cached):
+            if vector is None:
+                pending.append(index)
+            else:
+                results[index] = vector
+        if not pending:
+            return results
+
+        packed = pack_batches([texts[i] for i in pending], max_count=self.max_batch_size)
+        batches = [[pending[i] for i in batch] for batch in packed]
+        self.api_batches += len(batches)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [
+                (batch, executor.submit(self._embed_batch, [texts[i] for i in batch]))
+                for batch in batches
+            ]
+            for batch, future in futures:
+                for index, vector in zip(batch, future.result()):
+                    results[index] = vector
+        return results
@@ -0,0 +1,189 @@
+"""批量入库：从文件读取关键词，按 搜索 + 提取 -> 保存 -> 向量化 -> 写索引 流水线并发处理
+
+每个关键词在 SQLite 任务表中记录状态，中断后再次运行会跳过已完成的关键词，从断点继续。
+
+用法：python ingest.py keywords.txt [--search-concurrency 4] [--embed-concurrency 4] [--retry-failed] [--report-interval 10]
+"""
+import argparse
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+if sys.platform == "win32":
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+
+from config import EMBEDDING_CONCURRENCY, SEARCH_CONCURRENCY
+from ingest_pipeline import IngestPipeline
+from knowledge_db import KnowledgeDB
+from sync_to_vector import sync_to_vector
+from web_searcher import search_knowledge
+
+
+def read_keywords(path: Path) -> List[str]:
+    """每行一个关键词，忽略空行与 # 开头的注释，去掉重复"""
+    keywords = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        keyword = line.strip()
+        if keyword and not keyword.startswith("#"):
+            keywords.append(keyword)
+    return list(dict.fromkeys(keywords))
+
+
+class _Progress:
+    """线程安全的进度计数"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.saved = 0
+        self.searching = 0
+        self._lock = threading.Lock()
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+
+def run_ingest(
+    keywords_path: Path,
+    search_concurrency: int = SEARCH_CONCURRENCY,
+    embed_concurrency: int = EMBEDDING_CONCURRENCY,
+    retry_failed: bool = False,
+    report_interval: float = 10.0,
+) -> dict:
+    """
+    批量入库
+
+    流程：
+    1. 关键词登记到任务表；上次中断时处理中的任务恢复为待处理
+    2. search_concurrency 个线程并发搜索 + 流式提取（共用搜索限流器，命中搜索缓存时不调用 API）
+    3. 提取出的条目进入入库管道：保存（去重）-> 向量化（embed_concurrency 并发）-> 写索引
+    4. 某个关键词的条目全部保存后，任务标记为完成
+    5. 最后执行一次增量同步，补上未写入索引的记录（没有待处理关键词时也执行）
+    """
+    knowledge_db = KnowledgeDB()
+    added = knowledge_db.add_ingest_jobs(read_keywords(keywords_path))
+    resumed = knowledge_db.reset_ingest_jobs(retry_failed=retry_failed)
+    pending = knowledge_db.get_pending_ingest_jobs()
+    counts = knowledge_db.count_ingest_jobs()
+    print(
+        f"[INFO] 新登记 {added} 个关键词，恢复 {resumed} 个中断任务；"
+        f"待处理 {len(pending)}，已完成 {counts.get('done', 0)}，失败 {counts.get('failed', 0)}"
+    )
+    if not pending:
+        # 上次中断时已保存但未写入索引的记录，仍然补上
+        sync_to_vector()
+        return {"done": 0, "failed": 0, "saved": 0, "elapsed": 0.0}
+
+    progress = _Progress(len(pending))
+    keywords: queue.Queue = queue.Queue()
+    for keyword in pending:
+        keywords.put(keyword)
+
+    start = time.monotonic()
+    ingest = IngestPipeline(knowledge_db, embedding_concurrency=embed_concurrency).start()
+
+    def on_saved(keyword: str):
+        def callback(saved: int, error):
+            knowledge_db.finish_ingest_job(keyword, saved_count=saved, error=error)
+            progress.add(done=0 if error else 1, failed=1 if error else 0, saved=saved)
+        return callback
+
+    def searcher():
+        while True:
+            try:
+                keyword = keywords.get_nowait()
+            except queue.Empty:
+                return
+            knowledge_db.start_ingest_job(keyword)
+            progress.add(searching=1)
+            try:
+                search_knowledge(keyword, on_item=lambda item: ingest.put(item, tag=keyword))
+            except Exception as e:
+                knowledge_db.finish_ingest_job(keyword, error=str(e))
+                progress.add(failed=1)
+                print(f"[WARN] {keyword}: {e}")
+            else:
+                ingest.mark(keyword, on_saved(keyword))
+            finally:
+                progress.add(searching=-1)
+
+    stopped = threading.Event()
+
+    def reporter():
+        while not stopped.wait(report_interval):
+            _report(progress, keywords, ingest, start)
+
+    threads = [
+        threading.Thread(target=searcher, name=f"ingest-search-{i}", daemon=True)
+        for i in range(max(1, search_concurrency))
+    ]
+    threading.Thread(target=reporter, name="ingest-report", daemon=True).start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = ingest.close()
+    stopped.set()
+    _report(progress, keywords, ingest, start)
+
+    # 向量化 / 写索引失败的记录、以及上次中断时遗留的未同步记录，用增量同步补上
+    if stats["unindexed"]:
+        print(f"[INFO] {len(stats['unindexed'])} 条未写入索引")
+    sync_to_vector()
+
+    elapsed = time.monotonic() - start
+    print(
+        f"[OK] 批量入库完成：关键词 完成 {progress.done} / 失败 {progress.failed}，"
+        f"入库 {progress.saved} 条（跳过重复 {stats['exact'] + stats['near']}），索引 {stats['indexed']} 条，"
+        f"耗时 {elapsed:.1f}s，{progress.done / elapsed * 60 if elapsed else 0:.1f} 个关键词/分钟"
+    )
+    return {"done": progress.done, "failed": progress.failed, "saved": progress.saved, "elapsed": elapsed}
+
+
+def _report(progress: _Progress, keywords: queue.Queue, ingest: IngestPipeline, start: float):
+    elapsed = time.monotonic() - start
+    depths = ingest.queue_depths()
+    finished = progress.done + progress.failed
+    print(
+        f"[PROGRESS] 关键词 {finished}/{progress.total}，{progress.done / elapsed * 60 if elapsed else 0:.1f} 个/分钟，"
+        f"入库 {progress.saved} 条，索引 {ingest.indexed} 条 | "
+        f"队列: 待搜索 {keywords.qsize()}，搜索中 {progress.searching}，"
+        f"待保存 {depths['save']}，待向量化 {depths['embed']}，待写索引 {depths['index']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量关键词入库（可断点续传）")
+    parser.add_argument("keywords", type=Path, help="关键词文件（每行一个）")
+    parser.add_argument("--search-concurrency", type=int, default=SEARCH_CONCURRENCY, help="并发搜索 + 提取的关键词数")
+    parser.add_argument("--embed-concurrency", type=int, default=EMBEDDING_CONCURRENCY, help="并发向量化批次数")
+    parser.add_argument("--retry-failed", action="store_true", help="重试上次失败的关键词")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="进度输出间隔（秒）")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print(f"[START] 批量入库: {args.keywords}")
+    print("=" * 50)
+    try:
+        run_ingest(
+            args.keywords,
+            search_concurrency=args.search_concurrency,
+            embed_concurrency=args.embed_concurrency,
+            retry_failed=args.retry_failed,
+            report_interval=args.report_interval,
+        )
+    except KeyboardInterrupt:
+        print("\n[WARN] 已中断，再次运行将从断点继续")
+        sys.exit(130)
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
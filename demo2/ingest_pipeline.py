@@ -0,0 +1,353 @@
+"""流式入库管道：知识条目逐条进入，经 保存 -> 向量化 -> 写索引 三个阶段流水处理，阶段之间用有界队列相连"""
+import atexit
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import EMBEDDING_CONCURRENCY, INGEST_FLUSH_TIMEOUT, INGEST_QUEUE_SIZE
+from knowledge_db import KnowledgeDB
+
+# 队列中的结束信号
+_STOP = object()
+
+
+class _Marker:
+    """保存队列中的标记：同一 tag 之前放入的条目全部保存后回调"""
+
+    def __init__(self, tag, callback: Callable[[int, Optional[str]], None]):
+        self.tag = tag
+        self.callback = callback
+
+
+class _Flush:
+    """流经全部阶段的标记：同一 tag 之前放入的条目都处理完（写入索引或失败）后置位"""
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.done = threading.Event()
+
+
+class IngestPipeline:
+    """
+    流式入库管道（每个阶段一个线程）
+
+    - put() 把提取出的条目放进保存队列，队列满时阻塞（下游跟不上时上游自然减速）
+    - 每个阶段取到一条后，顺带取走队列中已经到达的条目一起处理：条目稀疏时逐条低延迟，密集时自动攒批
+      （向量化阶段再由 EmbeddingPipeline 按条数 / token 量拆分并发请求）
+    - mark() 在某个 tag（如关键词）的条目全部放入后登记回调，这些条目保存完成时回调（用于记录任务进度）
+    - track() / flush() 单独统计某个 tag 的条目并等待它们处理完，管道可以长期运行、被多次检索复用
+    - close() 等待全部条目处理完，返回统计
+
+    传入 embedding_function / collection 时复用调用方（如检索器）已打开的资源，不再单独创建。
+    长期运行的共享管道传 keep_saved=False：不累积全部记录 ID（stats() 中 saved / unindexed 为空），
+    每次检索的记录由 flush() 返回。
+    保存阶段做入库去重；向量化失败或写索引失败的记录保持未同步状态，执行 sync 时会补上。
+    """
+
+    def __init__(
+        self,
+        knowledge_db: Optional[KnowledgeDB] = None,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        embedding_concurrency: int = EMBEDDING_CONCURRENCY,
+        embedding_function=None,
+        collection=None,
+        keep_saved: bool = True,
+    ):
+        self.knowledge_db = knowledge_db or KnowledgeDB()
+        self.embedding_concurrency = embedding_concurrency
+        self._embedding_function = embedding_function
+        self.keep_saved = keep_saved
+        size = max(1, queue_size)
+        self._save_queue: queue.Queue = queue.Queue(maxsize=size)
+        self._embed_queue: queue.Queue = queue.Queue(maxsize=size)
+        self._index_queue: queue.Queue = queue.Queue(maxsize=size)
+        self._threads: List[threading.Thread] = []
+        self._pipeline = None
+        self._collection = collection
+        self._resources_ready = threading.Event()
+        self._start = 0.0
+        self.saved: List[tuple] = []
+        self._indexed_ids = set()
+        self._saved_by_tag: Dict[object, int] = {}
+        # 有条目保存失败、标记还没到达的 tag -> 错误信息（标记到达时按失败回调）
+        self._failed_tags: Dict[object, str] = {}
+        # track() 登记的 tag -> 单独统计；记录 ID -> tag（写入索引时归属）
+        self._tracked: Dict[object, dict] = {}
+        self._tag_of: Dict[int, object] = {}
+        self._tracked_lock = threading.Lock()
+        self.exact = 0
+        self.near = 0
+        self.indexed = 0
+        self.failed = 0
+        self.first_indexed: Optional[float] = None
+        self.errors: List[str] = []
+
+    def start(self) -> "IngestPipeline":
+        self._start = time.monotonic()
+        stages = [
+            # 保存失败的条目没有入库，无法由 sync 补上
+            ("ingest-save", self._save_queue, self._embed_queue, self._save_stage, "条目未入库"),
+            ("ingest-embed", self._embed_queue, self._index_queue, self._embed_stage, "执行 sync 时重试"),
+            ("ingest-index", self._index_queue, None, self._index_stage, "执行 sync 时重试"),
+        ]
+        for name, source, target, handler, note in stages:
+            thread = threading.Thread(
+                target=self._run, args=(source, target, handler, note), name=name, daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        # 向量库客户端 / 集合的创建与搜索、保存并行进行
+        threading.Thread(target=self._open_resources, name="ingest-open", daemon=True).start()
+        return self
+
+    def put(self, item: dict, tag=None):
+        """放入一条 {"keyword", "content"}（线程安全，队列满时阻塞）"""
+        self._save_queue.put((tag, item))
+
+    def mark(self, tag, callback: Callable[[int, Optional[str]], None]):
+        """tag 的条目全部放入后调用：这些条目保存完成时回调 callback(保存条数, 错误信息或 None)"""
+        self._save_queue.put(_Marker(tag, callback))
+
+    def track(self, tag):
+        """开始单独统计 tag 的条目（在放入条目之前调用），flush(tag) 时返回统计"""
+        with self._tracked_lock:
+            self._tracked[tag] = {
+                "saved": [],
+                "indexed": set(),
+                "exact": 0,
+                "near": 0,
+                "first_indexed": None,
+                "start": time.monotonic(),
+            }
+
+    def flush(self, tag, timeout: Optional[float] = INGEST_FLUSH_TIMEOUT) -> dict:
+        """
+        等待 tag 之前放入的条目全部处理完，返回该 tag 的统计（结构同 stats()）并结束统计
+
+        超时（如向量化阶段卡住）时不再等待，返回已有的统计：已保存未索引的记录在 unindexed 中，
+        仍在队列里的条目之后照常处理。
+        """
+        marker = _Flush(tag)
+        self._save_queue.put(marker)
+        if not marker.done.wait(timeout):
+            print(f"[WARN] 入库管道 {timeout:g}s 内未处理完本次条目，未写入索引的记录稍后同步")
+        with self._tracked_lock:
+            tracked = self._tracked.pop(tag)
+            for record_id, _ in tracked["saved"]:
+                self._tag_of.pop(record_id, None)
+        return {
+            "saved": tracked["saved"],
+            "unindexed": [record_id for record_id, _ in tracked["saved"] if record_id not in tracked["indexed"]],
+            "exact": tracked["exact"],
+            "near": tracked["near"],
+            "indexed": len(tracked["indexed"]),
+            "first_indexed": tracked["first_indexed"],
+            "elapsed": time.monotonic() - tracked["start"],
+        }
+
+    def close(self) -> dict:
+        """等待全部条目处理完，返回统计"""
+        self._save_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        return self.stats()
+
+    def queue_depths(self) -> dict:
+        return {
+            "save": self._save_queue.qsize(),
+            "embed": self._embed_queue.qsize(),
+            "index": self._index_queue.qsize(),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "saved": list(self.saved),
+            # 已保存但未写入索引的记录（向量化 / 写索引失败），可交给后台同步重试
+            "unindexed": [record_id for record_id, _ in self.saved if record_id not in self._indexed_ids],
+            "exact": self.exact,
+            "near": self.near,
+            "indexed": self.indexed,
+            "failed": self.failed,
+            "first_indexed": self.first_indexed,
+            "elapsed": time.monotonic() - self._start,
+            "errors": list(self.errors),
+        }
+
+    def _run(self, source: queue.Queue, target: Optional[queue.Queue], handler, failure_note: str):
+        try:
+            stop = False
+            while not stop:
+                batch = [source.get()]
+                if batch[0] is _STOP:
+                    break
+                while True:
+                    try:
+                        item = source.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+
+                flushes = [entry for entry in batch if isinstance(entry, _Flush)]
+                entries = [entry for entry in batch if not isinstance(entry, _Flush)]
+                result = None
+                if entries:
+                    try:
+                        result = handler(entries)
+                    except Exception as e:
+                        self.errors.append(f"{threading.current_thread().name}: {e}")
+                        print(
+                            f"[WARN] 入库管道 {threading.current_thread().name} 失败（{len(entries)} 条），"
+                            f"{failure_note}: {e}"
+                        )
+                if target is not None and result:
+                    target.put(result)
+                # 标记排在本批结果之后传给下一阶段，最后一个阶段处理完时置位
+                for flush in flushes:
+                    if target is not None:
+                        target.put(flush)
+                    else:
+                        self._finish_flush(flush)
+            if target is not None:
+                target.put(_STOP)
+        finally:
+            # 阶段线程随管道结束，及时关闭本线程的 SQLite 连接
+            self.knowledge_db.release_connection()
+
+    def _finish_flush(self, flush: _Flush):
+        """tag 之前的条目已全部流过管道：清理只用 flush、不用 mark 的 tag 留下的计数"""
+        with self._tracked_lock:
+            self._saved_by_tag.pop(flush.tag, None)
+            self._failed_tags.pop(flush.tag, None)
+        flush.done.set()
+
+    def _open_resources(self):
+        try:
+            from embedding_client import create_embedding_function
+            from embedding_pipeline import EmbeddingPipeline
+            from vector_collection import open_collection
+
+            if self._pipeline is None:
+                embedding_function = self._embedding_function or create_embedding_function()
+                self._pipeline = EmbeddingPipeline(embedding_function, concurrency=self.embedding_concurrency)
+            if self._collection is None:
+                self._collection = open_collection(self._pipeline.embedding_function)
+        except Exception as e:
+            self.errors.append(f"ingest-open: {e}")
+            print(f"[WARN] 打开向量库失败，新条目稍后执行 sync 时同步: {e}")
+        finally:
+            self._resources_ready.set()
+
+    def _save_stage(self, entries: list) -> List[dict]:
+        markers = [entry for entry in entries if isinstance(entry, _Marker)]
+        tagged = [entry for entry in entries if not isinstance(entry, _Marker)]
+        payload = [{"keyword": item["keyword"], "content": item["content"]} for _, item in tagged]
+        tags = {id(item): tag for item, (tag, _) in zip(payload, tagged)}
+        try:
+            result = self.knowledge_db.save_deduplicated(payload)
+        except Exception as e:
+            for marker in markers:
+                self._failed_tags.pop(marker.tag, None)
+                marker.callback(self._saved_by_tag.pop(marker.tag, 0), str(e))
+            marked = {marker.tag for marker in markers}
+            with self._tracked_lock:
+                for tag, _ in tagged:
+                    if tag not in marked:
+                        self._failed_tags.setdefault(tag, str(e))
+            raise
+
+        self.exact += result["exact"]
+        self.near += result["near"]
+        rows = []
+        with self._tracked_lock:
+            for item, kind in result["skipped"]:
+                tracked = self._tracked.get(tags[id(item)])
+                if tracked is not None:
+                    tracked[kind] += 1
+            for record_id, item in zip(result["ids"], result["items"]):
+                tag = tags[id(item)]
+                self._saved_by_tag[tag] = self._saved_by_tag.get(tag, 0) + 1
+                if self.keep_saved:
+                    self.saved.append((record_id, item["keyword"]))
+                tracked = self._tracked.get(tag)
+                if tracked is not None:
+                    tracked["saved"].append((record_id, item["keyword"]))
+                    self._tag_of[record_id] = tag
+                rows.append({"id": record_id, "keyword": item["keyword"], "content": item["content"], "version": 1})
+        # 标记之前的条目已在本批中保存（保存队列先进先出）；之前的批次保存失败过的 tag 按失败回调
+        for marker in markers:
+            marker.callback(self._saved_by_tag.pop(marker.tag, 0), self._failed_tags.pop(marker.tag, None))
+        return rows
+
+    def _embed_stage(self, batches: List[List[dict]]) -> tuple:
+        from sync_to_vector import embed_rows
+
+        rows = [row for batch in batches for row in batch]
+        self._resources_ready.wait()
+        if self._pipeline is None or self._collection is None:
+            # 长期运行的管道：上次打开失败时重试
+            self._open_resources()
+        if self._pipeline is None or self._collection is None:
+            return None
+        failed_before = self._pipeline.failed
+        unchanged, ready = embed_rows(self._pipeline, rows)
+        self.failed += self._pipeline.failed - failed_before
+        return unchanged, ready
+
+    def _index_stage(self, results: List[tuple]) -> None:
+        from sync_to_vector import upsert_rows
+        from vector_collection import write_active
+
+        unchanged = [entry for entries, _ in results for entry in entries]
+        ready = [row for _, rows in results for row in rows]
+        if not unchanged and not ready:
+            return None
+
+        def commit(entries: List[dict]):
+            self.knowledge_db.mark_indexed(entries)
+            self.knowledge_db.bump_index_generation()
+            if self.keep_saved:
+                self._indexed_ids.update(entry["id"] for entry in entries)
+            self.indexed += len(entries)
+            now = time.monotonic()
+            if self.first_indexed is None:
+                self.first_indexed = now - self._start
+            with self._tracked_lock:
+                for entry in entries:
+                    tracked = self._tracked.get(self._tag_of.pop(entry["id"], None))
+                    if tracked is not None:
+                        tracked["indexed"].add(entry["id"])
+                        if tracked["first_indexed"] is None:
+                            tracked["first_indexed"] = now - tracked["start"]
+
+        self._collection = write_active(
+            self._collection,
+            self._pipeline.embedding_function,
+            lambda target: unchanged + (upsert_rows(target, ready) if ready else []),
+            commit,
+        )
+        return None
+
+
+_pipeline: Optional[IngestPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_ingest_pipeline(embedding_function=None, collection=None) -> IngestPipeline:
+    """
+    进程内共享的流式入库管道（首次调用时启动，退出时等待处理完）
+
+    每次检索用 track() / flush() 区分自己的条目，不必每次新建线程、向量化客户端与向量库连接；
+    embedding_function / collection 只在首次创建时使用。
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = IngestPipeline(
+                embedding_function=embedding_function, collection=collection, keep_saved=False
+            ).start()
+            atexit.register(_pipeline.close)
+        return _pipeline
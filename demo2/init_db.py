@@ -1,21 +1,124 @@
-"""向量库重建脚本：清空向量库，将 SQLite 的 keyword 重新向量化"""
-import shutil
+"""向量库重建脚本：在新集合中重新向量化 SQLite 全部记录，完成后原子切换（重建期间检索不中断）"""
 import sys
+import time
+from datetime import datetime
+from typing import Optional
 
 if sys.platform == "win32":
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
 
-import chromadb
-from chromadb.config import Settings
+from config import COLLECTION_NAME, EMBEDDING_MAX_BATCH_SIZE, SQLITE_DB_PATH, SYNC_PAGE_SIZE
+from embedding_client import create_embedding_function
+from embedding_pipeline import EmbeddingPipeline
+from knowledge_db import KnowledgeDB, document_hash, index_document
+from sync_to_vector import index_rows, sync_to_vector
+from vector_collection import create_client, get_active_collection_name, set_active_collection_name
 
-from config import CHROMADB_PATH, COLLECTION_NAME, SQLITE_DB_PATH
-from embedding_client import ZhipuAIEmbedding
-from knowledge_db import KnowledgeDB
+# 重建中集合的 metadata 标记；断点（已处理到的最大 SQLite ID）也存在 metadata 中
+_STATE_BUILDING = "building"
+_STATE_READY = "ready"
 
 
-def rebuild_vector_db(batch_size: int = 10) -> int:
-    """清空向量库并重新导入 SQLite 全部 keyword（索引层）"""
+def _list_collections(client) -> list:
+    """[(集合名, metadata), ...]（兼容只返回集合名的旧版 Chroma）"""
+    result = []
+    for collection in client.list_collections():
+        if isinstance(collection, str):
+            collection = client.get_collection(name=collection)
+        result.append((collection.name, collection.metadata or {}))
+    return result
+
+
+def _find_staging(client):
+    """查找上次未完成的重建集合（用于续传）"""
+    for name, metadata in _list_collections(client):
+        if name.startswith(f"{COLLECTION_NAME}_") and metadata.get("rebuild_state") == _STATE_BUILDING:
+            return name, metadata
+    return None, None
+
+
+def _set_checkpoint(collection, started_at: str, last_id: int, state: str = _STATE_BUILDING):
+    collection.modify(metadata={
+        "description": "知识库索引",
+        "rebuild_state": state,
+        "rebuild_started_at": started_at,
+        "rebuild_last_id": last_id,
+    })
+
+
+def _reconcile(staging, pipeline: EmbeddingPipeline, knowledge_db: KnowledgeDB, page_size: int) -> tuple:
+    """
+    追平重建期间的变更：删除已不存在的记录、重新索引内容已变化的记录
+
+    只比对 ID 与 content_hash，不调用向量化接口（除非确有变化），开销远小于向量化本身。
+    """
+    removed, refreshed, offset = 0, 0, 0
+    while True:
+        result = staging.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not result["ids"]:
+            return removed, refreshed
+        hashes = {metadata["sqlite_id"]: metadata.get("content_hash") for metadata in result["metadatas"]}
+        rows = knowledge_db.get_by_ids(list(hashes), columns=("keyword", "content", "version"))
+        present = {row["id"] for row in rows}
+
+        missing = [f"idx_{record_id}" for record_id in hashes if record_id not in present]
+        if missing:
+            staging.delete(ids=missing)
+            removed += len(missing)
+        changed = [
+            row for row in rows
+            if document_hash(index_document(row["keyword"], row["content"])) != hashes[row["id"]]
+        ]
+        if changed:
+            index_rows(staging, pipeline, changed, verbose=False)
+            refreshed += len(changed)
+        offset += len(result["ids"]) - len(missing)
+
+
+def _catch_up(collection, pipeline: EmbeddingPipeline, knowledge_db: KnowledgeDB, since: int, page_size: int) -> int:
+    """
+    切换后追平：重建开始以来新增 / 修改过的记录全部重新写入新集合
+
+    其他进程（后台同步、手动 sync、入库管道）在切换前可能已把这些记录写进旧集合并标记为已同步，
+    增量同步不会再处理它们。内容都在向量缓存中，重新写入不调用向量化接口。
+    """
+    caught = 0
+    for page in knowledge_db.iter_changed_since(since, page_size=page_size):
+        # 不带 content_hash：不论是否已标记同步都重新写入
+        entries = index_rows(collection, pipeline, page, verbose=False)
+        knowledge_db.mark_indexed(entries)
+        caught += len(entries)
+    return caught
+
+
+def _drop_retired(client, keep: set):
+    """删除更早的重建产物（保留当前与上一个集合，仍在使用旧集合的进程不会立即失效）"""
+    for name, metadata in _list_collections(client):
+        if name in keep or not (name == COLLECTION_NAME or name.startswith(f"{COLLECTION_NAME}_")):
+            continue
+        if metadata.get("rebuild_state") == _STATE_BUILDING:
+            continue
+        client.delete_collection(name=name)
+        print(f"[INFO] 已删除旧集合: {name}")
+
+
+def rebuild_vector_db(
+    batch_size: Optional[int] = None,
+    page_size: int = SYNC_PAGE_SIZE,
+    resume: bool = True,
+) -> int:
+    """
+    重建向量库（索引层）
+
+    流程：
+    1. 在新集合中按 id 分页流式读取 SQLite，并发向量化（命中向量缓存的不调用 API）
+    2. 每页写入后把断点存进集合 metadata，中断后再次运行从断点继续
+    3. 追平重建期间新增 / 修改 / 删除的记录
+    4. 原子切换生效集合；旧集合保留一代，检索全程可用
+    5. 切换后再追平一次：重建开始以来被其他进程同步进旧集合的记录重新写入新集合，
+       期间保留的墓碑交给最后的增量同步删除
+    """
     if not SQLITE_DB_PATH.exists():
         print("[WARN] SQLite 数据库不存在")
         return 0
@@ -27,48 +130,74 @@ def rebuild_vector_db(batch_size: int = 10) -> int:
         return 0
 
     print(f"[INFO] SQLite 中共有 {total} 条数据")
+    start = time.monotonic()
+
+    client = create_client()
+    embedding_function = create_embedding_function()
+    pipeline = EmbeddingPipeline(embedding_function, max_batch_size=batch_size or EMBEDDING_MAX_BATCH_SIZE)
+
+    name, metadata = _find_staging(client) if resume else (None, None)
+    if name:
+        started_at = metadata.get("rebuild_started_at", "")
+        last_id = int(metadata.get("rebuild_last_id", 0))
+        staging = client.get_collection(name=name, embedding_function=embedding_function)
+        print(f"[INFO] 继续上次未完成的重建: {name}（已处理到 ID {last_id}）")
+    else:
+        now = datetime.now()
+        started_at = now.strftime("%Y-%m-%d %H:%M:%S")
+        last_id = 0
+        name = f"{COLLECTION_NAME}_{now.strftime('%Y%m%d%H%M%S%f')}"
+        staging = client.create_collection(name=name, embedding_function=embedding_function)
+        _set_checkpoint(staging, started_at, last_id)
+        print(f"[OK] 创建重建集合: {name}")
+    # 从这里起其他进程同步的变更只会进入旧集合，切换后据此追平
+    since = knowledge_db.begin_rebuild(resume=last_id > 0)
+
+    # 1-2. 流式分页向量化写入，每页记录断点；第二轮补上扫描期间新写入的记录
+    indexed, failed_ids = 0, []
+    for _ in range(2):
+        for page in knowledge_db.iter_all(page_size=page_size, after_id=last_id):
+            entries = index_rows(staging, pipeline, page, verbose=False)
+            done = {entry["id"] for entry in entries}
+            failed_ids.extend(row["id"] for row in page if row["id"] not in done)
+            indexed += len(entries)
+            last_id = page[-1]["id"]
+            _set_checkpoint(staging, started_at, last_id)
+            elapsed = time.monotonic() - start
+            print(f"[INFO] 进度: ID {last_id}，本次已索引 {indexed} 条，{indexed / elapsed if elapsed else 0:.1f} 条/秒")
+
+    # 3. 追平重建期间的变更
+    removed, refreshed = _reconcile(staging, pipeline, knowledge_db, page_size)
+    if removed or refreshed:
+        print(f"[INFO] 追平重建期间的变更: 删除 {removed} 条，更新 {refreshed} 条")
+
+    # 4. 原子切换
+    previous = get_active_collection_name()
+    _set_checkpoint(staging, started_at, last_id, state=_STATE_READY)
+    set_active_collection_name(name)
+    knowledge_db.bump_index_generation()
+    print(f"[OK] 已切换生效集合: {previous} -> {name}")
+
+    # 5. 切换后追平，之后恢复清除墓碑
+    caught = _catch_up(staging, pipeline, knowledge_db, since, page_size)
+    knowledge_db.end_rebuild()
+    if caught:
+        print(f"[INFO] 追平切换前同步到旧集合的记录: {caught} 条")
+    _drop_retired(client, keep={name, previous})
+
+    # 向量化失败的记录不在新集合中，标记为待同步
+    knowledge_db.mark_unsynced(failed_ids)
+
+    # 仍待同步的记录与重建期间保留的墓碑，用增量同步补进新集合（内容已在向量缓存中）
+    sync_to_vector(batch_size=batch_size, page_size=page_size)
 
-    # 清空向量库
-    if CHROMADB_PATH.exists():
-        shutil.rmtree(CHROMADB_PATH)
-        print(f"[INFO] 已清空向量库")
-
-    # 创建新向量库
-    CHROMADB_PATH.mkdir(parents=True, exist_ok=True)
-    client = chromadb.PersistentClient(
-        path=str(CHROMADB_PATH),
-        settings=Settings(anonymized_telemetry=False),
-    )
-    embedding_function = ZhipuAIEmbedding()
-    collection = client.create_collection(
-        name=COLLECTION_NAME,
-        embedding_function=embedding_function,
-        metadata={"description": "知识库索引"},
-    )
-    print(f"[OK] 创建新集合: {COLLECTION_NAME}")
-
-    # 获取全部数据
-    with knowledge_db._get_conn() as conn:
-        cursor = conn.execute("SELECT id, keyword, content FROM web_knowledge ORDER BY id")
-        all_data = [dict(row) for row in cursor.fetchall()]
-
-    # 批量插入（keyword + content）
-    synced_ids = []
-    for i in range(0, len(all_data), batch_size):
-        batch = all_data[i : i + batch_size]
-        collection.add(
-            ids=[f"idx_{item['id']}" for item in batch],
-            documents=[f"{item['keyword']}: {item['content']}" for item in batch],
-            metadatas=[{"sqlite_id": item["id"], "keyword": item["keyword"]} for item in batch],
-        )
-        synced_ids.extend(item["id"] for item in batch)
-        print(f"[INFO] 进度: {min(i + batch_size, len(all_data))}/{len(all_data)}")
-
-    # 标记全部为已同步
-    knowledge_db.mark_synced(synced_ids)
-
-    print(f"[OK] 重建完成！共 {len(synced_ids)} 条索引")
-    return len(synced_ids)
+    if failed_ids:
+        print(f"[WARN] {len(failed_ids)} 条向量化失败，已标记为待同步，执行 sync 时重试")
+    stats = embedding_function.cache_stats()
+    print(f"[INFO] 向量缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}，API 调用 {stats['api_calls']} 次")
+    count = staging.count()
+    print(f"[OK] 重建完成！共 {count} 条索引，耗时 {time.monotonic() - start:.1f}s")
+    return count
 
 
 if __name__ == "__main__":
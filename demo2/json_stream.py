@@ -0,0 +1,70 @@
+"""增量 JSON 数组解析：流式输出逐段喂入，数组中的元素一闭合就解析返回，无需等待完整响应"""
+import json
+from typing import List
+
+
+class JsonArrayStream:
+    """
+    增量解析顶层 JSON 数组
+
+    第一个 "[" 之前的内容（如 ```json 代码块标记）被忽略；数组闭合后的内容也被忽略。
+    无法解析的元素跳过，不影响后续元素。
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        # 0：尚未进入数组；1：位于顶层数组中（元素之间）；>1：位于某个元素内部
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.done = False
+        self.skipped = 0
+
+    def feed(self, text: str) -> list:
+        """喂入一段文本，返回本段中闭合的元素"""
+        elements = []
+        for char in text:
+            if self.done:
+                break
+            if self._depth == 0:
+                if char == "[":
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._buffer.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 1 and char in ",]":
+                # 标量元素在逗号 / 数组结尾处结束（对象 / 数组元素闭合时已经取出）
+                self._emit(elements)
+                if char == "]":
+                    self.done = True
+                continue
+
+            self._buffer.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._emit(elements)
+        return elements
+
+    def _emit(self, elements: list):
+        text = "".join(self._buffer).strip()
+        self._buffer.clear()
+        if not text:
+            return
+        try:
+            elements.append(json.loads(text))
+        except json.JSONDecodeError:
+            self.skipped += 1
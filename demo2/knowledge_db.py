@@ -1,9 +1,29 @@
 """SQLite 知识库管理"""
+import atexit
+import hashlib
 import json
 import sqlite3
-from typing import Optional
+import threading
+import weakref
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
 
-from config import SQLITE_DB_PATH
+from config import (
+    DEDUP_NEAR_MIN_CHARS,
+    DEDUP_NEAR_THRESHOLD,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_DB_PATH,
+    SQLITE_MMAP_SIZE,
+)
+from dedup import (
+    content_fingerprint,
+    estimate_similarity,
+    lsh_bands,
+    minhash,
+    normalize_text,
+    pack_signature,
+    unpack_signature,
+)
 
 _CREATE_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS web_knowledge (
@@ -14,30 +34,447 @@ CREATE TABLE IF NOT EXISTS web_knowledge (
     content TEXT NOT NULL,
     source_url TEXT,
     search_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    synced_to_vector INTEGER DEFAULT 0
+    synced_to_vector INTEGER DEFAULT 0,
+    content_hash TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP,
+    content_fingerprint TEXT,
+    minhash BLOB
+)
+"""
+
+# 变更追踪：旧库缺少的列（ALTER TABLE 只允许常量默认值，updated_at 由插入语句显式写入）
+_MIGRATION_COLUMNS = {
+    "content_hash": "TEXT",
+    "version": "INTEGER NOT NULL DEFAULT 1",
+    "updated_at": "TIMESTAMP",
+    "content_fingerprint": "TEXT",
+    "minhash": "BLOB",
+}
+
+# 近似去重的 LSH 分段表（每条记录 LSH_BANDS 行，任一段相同即为候选）
+_CREATE_BANDS_SQL = """
+CREATE TABLE IF NOT EXISTS content_minhash_bands (
+    band INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (band, value, id)
+) WITHOUT ROWID
+"""
+
+_CREATE_BANDS_TRIGGER_SQL = """
+CREATE TRIGGER IF NOT EXISTS trg_web_knowledge_bands_delete
+AFTER DELETE ON web_knowledge
+BEGIN
+    DELETE FROM content_minhash_bands WHERE id = OLD.id;
+END
+"""
+
+# 删除的记录留下墓碑，增量同步据此删除向量库中的孤立索引
+_CREATE_TOMBSTONES_SQL = """
+CREATE TABLE IF NOT EXISTS web_knowledge_tombstones (
+    id INTEGER PRIMARY KEY,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# 不依赖自定义 SQL 函数，外部工具直接改库时同样生效：
+# keyword / content 变化 -> 版本号 +1 并标记为待同步；删除 -> 写墓碑
+_CREATE_TRIGGERS_SQL = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_web_knowledge_changed
+    AFTER UPDATE OF keyword, content ON web_knowledge
+    WHEN OLD.keyword IS NOT NEW.keyword OR OLD.content IS NOT NEW.content
+    BEGIN
+        UPDATE web_knowledge
+        SET version = OLD.version + 1, synced_to_vector = 0, updated_at = CURRENT_TIMESTAMP
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_web_knowledge_deleted
+    AFTER DELETE ON web_knowledge
+    BEGIN
+        INSERT OR REPLACE INTO web_knowledge_tombstones (id) VALUES (OLD.id);
+    END
+    """,
+)
+
+# 键值元数据；index_generation 在数据或索引变化时递增，检索结果缓存据此失效
+_CREATE_META_SQL = """
+CREATE TABLE IF NOT EXISTS kb_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+)
+"""
+
+_GENERATION_KEY = "index_generation"
+# 重建开始时间（unix 秒）：存在期间墓碑保留不清除，切换后据此追平重建期间的变更
+_REBUILD_KEY = "rebuild_since"
+
+# 数据变化（新增 / 修改检索字段 / 删除）时递增版本号；向量索引的变化由同步流程显式递增
+_CREATE_GENERATION_TRIGGERS_SQL = tuple(
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_web_knowledge_generation_{event.split()[0].lower()}
+    AFTER {event} ON web_knowledge
+    BEGIN
+        UPDATE kb_meta SET value = value + 1 WHERE key = '{_GENERATION_KEY}';
+    END
+    """
+    for event in ("INSERT", "UPDATE OF keyword, content", "DELETE")
+)
+
+# 批量入库任务（每个关键词一行）：pending -> running -> done / failed，中断后据此续传
+_CREATE_INGEST_JOBS_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    keyword TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    saved_count INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# 全文索引：外部内容表（不重复存储正文），trigram 分词对中文短词和子串都能命中
+_CREATE_FTS_SQL = """
+CREATE VIRTUAL TABLE web_knowledge_fts USING fts5(
+    keyword, content,
+    content='web_knowledge', content_rowid='id',
+    tokenize='trigram'
 )
 """
 
+_CREATE_FTS_TRIGGERS_SQL = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_web_knowledge_fts_insert
+    AFTER INSERT ON web_knowledge
+    BEGIN
+        INSERT INTO web_knowledge_fts (rowid, keyword, content) VALUES (NEW.id, NEW.keyword, NEW.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_web_knowledge_fts_delete
+    AFTER DELETE ON web_knowledge
+    BEGIN
+        INSERT INTO web_knowledge_fts (web_knowledge_fts, rowid, keyword, content)
+        VALUES ('delete', OLD.id, OLD.keyword, OLD.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_web_knowledge_fts_update
+    AFTER UPDATE OF keyword, content ON web_knowledge
+    BEGIN
+        INSERT INTO web_knowledge_fts (web_knowledge_fts, rowid, keyword, content)
+        VALUES ('delete', OLD.id, OLD.keyword, OLD.content);
+        INSERT INTO web_knowledge_fts (rowid, keyword, content) VALUES (NEW.id, NEW.keyword, NEW.content);
+    END
+    """,
+)
+
+# trigram 分词的最短可索引长度，更短的查询退化为 LIKE 扫描
+_FTS_MIN_QUERY_CHARS = 3
+
+_COLUMNS = (
+    "id",
+    "keyword",
+    "expanded_keywords",
+    "title",
+    "content",
+    "source_url",
+    "search_time",
+    "synced_to_vector",
+    "content_hash",
+    "version",
+    "updated_at",
+    "content_fingerprint",
+    "minhash",
+)
+
+_INSERT_SQL = """
+INSERT INTO web_knowledge (
+    keyword, expanded_keywords, title, content, source_url, content_fingerprint, minhash, updated_at
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+
+# SQLite 单条语句的参数个数有上限，批量查询时分段
+_MAX_PARAMS = 500
+
+
+class DuplicateContentError(sqlite3.IntegrityError):
+    """内容与已有记录完全重复（规范化指纹唯一约束），existing_id 为已有记录的 ID（能查到时）"""
+
+    def __init__(self, existing_id: Optional[int] = None):
+        detail = f"（已有记录 ID {existing_id}）" if existing_id is not None else ""
+        super().__init__(f"内容与已有记录重复{detail}")
+        self.existing_id = existing_id
+
+
+def _is_duplicate(error: sqlite3.IntegrityError) -> bool:
+    return "content_fingerprint" in str(error)
+
+
+def _insert_values(
+    keyword: str,
+    content: str,
+    expanded_keywords: Optional[list] = None,
+    title: Optional[str] = None,
+    source_url: Optional[str] = None,
+) -> tuple:
+    fingerprint, signature = _signature(content)
+    return (
+        keyword,
+        json.dumps(expanded_keywords, ensure_ascii=False) if expanded_keywords else None,
+        title,
+        content,
+        source_url,
+        fingerprint,
+        pack_signature(signature),
+    )
+
+
+def _signature(content: str) -> tuple:
+    """(规范化内容指纹, MinHash 签名)；过短的内容只做完全去重，签名为 None"""
+    if len(normalize_text(content)) < DEDUP_NEAR_MIN_CHARS:
+        return content_fingerprint(content), None
+    return content_fingerprint(content), minhash(content)
+
+
+def _insert_bands(conn: sqlite3.Connection, rows: Sequence[tuple]):
+    """写入 LSH 分段，rows: [(记录 ID, 打包后的签名或 None), ...]"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO content_minhash_bands (band, value, id) VALUES (?, ?, ?)",
+        [
+            (band, value, record_id)
+            for record_id, blob in rows
+            if blob is not None
+            for band, value in enumerate(lsh_bands(unpack_signature(blob)))
+        ],
+    )
+
+
+def index_document(keyword: str, content: str) -> str:
+    """向量库中存储 / 向量化的文本"""
+    return f"{keyword}: {content}"
+
+
+def document_hash(document: str) -> str:
+    """已索引文本的指纹：同步时相同则无需重新向量化"""
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+class ConnectionManager:
+    """
+    每个线程复用一个长连接（同一数据库文件的所有 KnowledgeDB 实例共享）
+
+    - WAL 模式：读不阻塞写，同步写入与检索可以并发
+    - synchronous=NORMAL：WAL 下仍能保证一致性，提交开销更小
+    - cache_size / mmap_size：减少读盘
+    - 连接长期存在，sqlite3 的语句缓存（cached_statements）得以复用预编译语句
+    - 线程结束时（线程局部变量被回收）自动关闭该线程的连接，也可以调用 release() 提前关闭
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def get(self) -> sqlite3.Connection:
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = self._connect()
+            holder = self._local.holder = _ConnectionHolder(conn)
+            with self._lock:
+                self._connections.append(conn)
+            # 线程退出时 threading.local 中的对象被回收，随之关闭连接
+            weakref.finalize(holder, self._close, conn)
+        return holder.conn
+
+    def release(self):
+        """关闭当前线程的连接（短生命周期线程结束前调用；之后再 get() 会新建连接）"""
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            del self._local.holder
+            self._close(holder.conn)
+
+    def _close(self, conn: sqlite3.Connection):
+        with self._lock:
+            if conn not in self._connections:
+                return
+            self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 每个连接只由创建它的线程使用；关闭 check_same_thread 是为了线程退出（或进程退出）时能在别的线程里关闭它
+        conn = sqlite3.connect(str(self.db_path), timeout=30, cached_statements=256, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(SQLITE_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def close_all(self):
+        """关闭所有线程的连接（进程退出时调用，顺带完成 WAL checkpoint）"""
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            self._close(conn)
+        self._local = threading.local()
+
+
+class _ConnectionHolder:
+    """线程局部变量中保存连接的容器（可被弱引用，用于在线程退出时关闭连接）"""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+_managers: Dict[Path, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+_initialized: set = set()
+# 支持 FTS5（trigram 分词需 SQLite >= 3.34）的数据库
+_fts_enabled: set = set()
+
+
+def get_connection_manager(db_path: Path) -> ConnectionManager:
+    """按数据库文件获取共享的连接管理器"""
+    key = Path(db_path).resolve()
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConnectionManager(key)
+        return manager
+
+
+@atexit.register
+def _close_all_connections():
+    for manager in list(_managers.values()):
+        manager.close_all()
+
 
 class KnowledgeDB:
     """SQLite 知识库管理器"""
 
-    def __init__(self):
-        self.db_path = SQLITE_DB_PATH
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or SQLITE_DB_PATH)
+        self._connections = get_connection_manager(self.db_path)
         self._init_db()
 
     def _get_conn(self) -> sqlite3.Connection:
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """获取当前线程的数据库连接（长连接，使用 `with conn:` 管理事务）"""
+        return self._connections.get()
+
+    def release_connection(self):
+        """关闭当前线程的数据库连接（工作线程退出前调用）"""
+        self._connections.release()
 
     def _init_db(self):
-        """初始化数据库表"""
+        """初始化数据库表（每个进程每个数据库只执行一次）"""
+        key = self._connections.db_path
+        with _managers_lock:
+            if key in _initialized:
+                return
+            _initialized.add(key)
+            self._create_schema()
+
+    def _create_schema(self):
         with self._get_conn() as conn:
             conn.execute(_CREATE_TABLE_SQL)
+            added = self._migrate(conn)
+            conn.execute(_CREATE_TOMBSTONES_SQL)
+            for sql in _CREATE_TRIGGERS_SQL:
+                conn.execute(sql)
+            conn.execute(_CREATE_META_SQL)
+            conn.execute(
+                "INSERT OR IGNORE INTO kb_meta (key, value) VALUES (?, 0)", (_GENERATION_KEY,)
+            )
+            for sql in _CREATE_GENERATION_TRIGGERS_SQL:
+                conn.execute(sql)
+            self._create_dedup_schema(conn, backfill="content_fingerprint" in added)
+            conn.execute(_CREATE_INGEST_JOBS_SQL)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_keyword ON web_knowledge(keyword)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_synced ON web_knowledge(synced_to_vector)")
+        self._create_fts()
+
+    def _create_fts(self):
+        """创建全文索引并由触发器维护；SQLite 不支持时关闭全文检索，其余功能不受影响"""
+        conn = self._get_conn()
+        try:
+            with conn:
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'web_knowledge_fts'"
+                ).fetchone()
+                if not exists:
+                    conn.execute(_CREATE_FTS_SQL)
+                    # 旧库已有数据：一次性建好索引
+                    conn.execute("INSERT INTO web_knowledge_fts (web_knowledge_fts) VALUES ('rebuild')")
+                for sql in _CREATE_FTS_TRIGGERS_SQL:
+                    conn.execute(sql)
+        except sqlite3.OperationalError as e:
+            print(f"[WARN] SQLite 不支持 FTS5 trigram 分词，全文检索已关闭: {e}")
+            return
+        _fts_enabled.add(self._connections.db_path)
+
+    @property
+    def fts_enabled(self) -> bool:
+        return self._connections.db_path in _fts_enabled
+
+    def _migrate(self, conn: sqlite3.Connection) -> set:
+        """为旧库补充变更追踪 / 去重列，返回本次新增的列"""
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(web_knowledge)")}
+        added = set()
+        for name, definition in _MIGRATION_COLUMNS.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE web_knowledge ADD COLUMN {name} {definition}")
+                added.add(name)
+        if "updated_at" in added:
+            conn.execute("UPDATE web_knowledge SET updated_at = search_time WHERE updated_at IS NULL")
+        return added
+
+    def _create_dedup_schema(self, conn: sqlite3.Connection, backfill: bool):
+        conn.execute(_CREATE_BANDS_SQL)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_minhash_bands_id ON content_minhash_bands(id)")
+        conn.execute(_CREATE_BANDS_TRIGGER_SQL)
+        # 指纹唯一：同一内容只入库一次（NULL 不参与唯一约束）
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_content_fingerprint ON web_knowledge(content_fingerprint)"
+        )
+        if backfill:
+            self._backfill_signatures(conn)
+
+    def _backfill_signatures(self, conn: sqlite3.Connection, page_size: int = 1000):
+        """旧库补算指纹与签名；已有的完全重复记录保留，但指纹留空（UPDATE OR IGNORE）"""
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, content FROM web_knowledge WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            updated = []
+            for row in rows:
+                fingerprint, signature = _signature(row["content"])
+                blob = pack_signature(signature)
+                cursor = conn.execute(
+                    "UPDATE OR IGNORE web_knowledge SET content_fingerprint = ?, minhash = ? WHERE id = ?",
+                    (fingerprint, blob, row["id"]),
+                )
+                if cursor.rowcount:
+                    updated.append((row["id"], blob))
+            _insert_bands(conn, updated)
+            last_id = rows[-1]["id"]
 
     def save(
         self,
@@ -47,22 +484,161 @@ class KnowledgeDB:
         title: Optional[str] = None,
         source_url: Optional[str] = None,
     ) -> int:
-        """保存搜索结果"""
-        with self._get_conn() as conn:
-            cursor = conn.execute(
-                """
-                INSERT INTO web_knowledge (keyword, expanded_keywords, title, content, source_url)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    keyword,
-                    json.dumps(expanded_keywords, ensure_ascii=False) if expanded_keywords else None,
-                    title,
-                    content,
-                    source_url,
-                ),
-            )
-            return cursor.lastrowid
+        """
+        保存搜索结果
+
+        Raises:
+            DuplicateContentError: 内容与已有记录完全重复（需要跳过重复时用 save_deduplicated）
+        """
+        values = _insert_values(keyword, content, expanded_keywords, title, source_url)
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.execute(_INSERT_SQL, values)
+                _insert_bands(conn, [(cursor.lastrowid, values[-1])])
+                return cursor.lastrowid
+        except sqlite3.IntegrityError as e:
+            if _is_duplicate(e):
+                raise DuplicateContentError(self._find_fingerprint(values[-2])) from None
+            raise
+
+    def save_many(self, items: Sequence[dict]) -> List[int]:
+        """
+        批量保存（executemany，单个事务只提交一次）
+
+        Args:
+            items: [{"keyword": str, "content": str, "expanded_keywords"?: list,
+                     "title"?: str, "source_url"?: str}, ...]
+
+        Returns:
+            与 items 一一对应的记录 ID
+
+        Raises:
+            DuplicateContentError: 任一条内容与已有记录或本批其他条目完全重复，整批回滚、都不写入
+                （需要跳过重复时用 save_deduplicated）
+        """
+        if not items:
+            return []
+        rows = [
+            _insert_values(
+                item["keyword"],
+                item["content"],
+                item.get("expanded_keywords"),
+                item.get("title"),
+                item.get("source_url"),
+            )
+            for item in items
+        ]
+        conn = self._get_conn()
+        with conn:
+            # 立即取得写锁：事务内 AUTOINCREMENT 分配的 ID 连续，可由最后一个 ID 反推全部 ID
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(_INSERT_SQL, rows)
+            except sqlite3.IntegrityError as e:
+                if _is_duplicate(e):
+                    raise DuplicateContentError() from None
+                raise
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            ids = list(range(last_id - len(rows) + 1, last_id + 1))
+            _insert_bands(conn, [(record_id, row[-1]) for record_id, row in zip(ids, rows)])
+        return ids
+
+    def save_deduplicated(self, items: Sequence[dict]) -> dict:
+        """
+        去重后批量保存（在向量化之前拦截重复内容）
+
+        - 完全重复：规范化内容指纹与已有记录 / 本批前面的条目相同
+        - 近似重复：MinHash 估计的 Jaccard 相似度 >= DEDUP_NEAR_THRESHOLD（按 LSH 分段召回候选，再比对签名）
+
+        Returns:
+            {"ids": [新记录 ID], "items": [对应的条目], "exact": 完全重复跳过数, "near": 近似重复跳过数,
+             "skipped": [(跳过的条目, "exact" | "near"), ...]}
+        """
+        result = {"ids": [], "items": [], "exact": 0, "near": 0, "skipped": []}
+        if not items:
+            return result
+        rows = [
+            _insert_values(
+                item["keyword"],
+                item["content"],
+                item.get("expanded_keywords"),
+                item.get("title"),
+                item.get("source_url"),
+            )
+            for item in items
+        ]
+        conn = self._get_conn()
+        with conn:
+            # 检查与写入在同一个写事务中，并发入库也不会漏判
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            existing = self._existing_fingerprints(conn, [row[-2] for row in rows])
+
+            accepted, accepted_rows, batch_signatures = [], [], []
+            for item, row in zip(items, rows):
+                fingerprint, signature = row[-2], unpack_signature(row[-1])
+                if fingerprint in existing:
+                    result["exact"] += 1
+                    result["skipped"].append((item, "exact"))
+                    continue
+                if signature is not None:
+                    if any(estimate_similarity(signature, other) >= DEDUP_NEAR_THRESHOLD for other in batch_signatures) \
+                            or self._has_near_duplicate(conn, signature):
+                        result["near"] += 1
+                        result["skipped"].append((item, "near"))
+                        continue
+                    batch_signatures.append(signature)
+                existing.add(fingerprint)
+                accepted.append(item)
+                accepted_rows.append(row)
+
+            if accepted_rows:
+                conn.executemany(_INSERT_SQL, accepted_rows)
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                result["ids"] = list(range(last_id - len(accepted_rows) + 1, last_id + 1))
+                result["items"] = accepted
+                _insert_bands(conn, [(record_id, row[-1]) for record_id, row in zip(result["ids"], accepted_rows)])
+            for key in ("exact", "near"):
+                if result[key]:
+                    conn.execute(
+                        "INSERT INTO kb_meta (key, value) VALUES (?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                        (f"dedup_{key}_skipped", result[key]),
+                    )
+        return result
+
+    def _existing_fingerprints(self, conn: sqlite3.Connection, fingerprints: Sequence[str]) -> set:
+        found = set()
+        unique = list(dict.fromkeys(fingerprints))
+        for i in range(0, len(unique), _MAX_PARAMS):
+            chunk = unique[i : i + _MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(row[0] for row in conn.execute(
+                f"SELECT content_fingerprint FROM web_knowledge WHERE content_fingerprint IN ({placeholders})",
+                chunk,
+            ))
+        return found
+
+    def _has_near_duplicate(self, conn: sqlite3.Connection, signature) -> bool:
+        """LSH：任一分段相同的记录为候选，再比对完整签名"""
+        bands = lsh_bands(signature)
+        union = " UNION ".join(
+            "SELECT id FROM content_minhash_bands WHERE band = ? AND value = ?" for _ in bands
+        )
+        params = [param for band, value in enumerate(bands) for param in (band, value)]
+        rows = conn.execute(
+            f"SELECT minhash FROM web_knowledge WHERE id IN ({union}) AND minhash IS NOT NULL",
+            params,
+        )
+        return any(estimate_similarity(signature, unpack_signature(row[0])) >= DEDUP_NEAR_THRESHOLD for row in rows)
+
+    def get_dedup_stats(self) -> dict:
+        """累计跳过的重复条数"""
+        rows = dict(self._get_conn().execute(
+            "SELECT key, value FROM kb_meta WHERE key IN ('dedup_exact_skipped', 'dedup_near_skipped')"
+        ).fetchall())
+        return {"exact": rows.get("dedup_exact_skipped", 0), "near": rows.get("dedup_near_skipped", 0)}
 
     def get_unsynced(self, limit: int = 100) -> list:
         """获取未同步到向量库的记录"""
@@ -73,6 +649,313 @@ class KnowledgeDB:
             )
             return [dict(row) for row in cursor.fetchall()]
 
+    def iter_unsynced(
+        self,
+        page_size: int = 500,
+        columns: Sequence[str] = ("keyword", "content", "version", "content_hash"),
+    ) -> Iterator[List[dict]]:
+        """
+        按 id 键集分页遍历全部未同步记录（每页一次查询走 idx_synced，内存占用与积压量无关）
+
+        调用方在两页之间标记已同步不影响遍历；处理失败的行本轮不会重复返回。
+
+        Yields:
+            每页 [dict, ...]（只含 id 与 columns 指定的列）
+        """
+        return self._iter_pages("synced_to_vector = 0", page_size, columns)
+
+    def iter_all(
+        self,
+        page_size: int = 500,
+        columns: Sequence[str] = ("keyword", "content", "version"),
+        after_id: int = 0,
+    ) -> Iterator[List[dict]]:
+        """按 id 键集分页遍历全部记录（从 after_id 之后开始，用于可续传的全量重建）"""
+        return self._iter_pages("1", page_size, columns, after_id)
+
+    def _iter_pages(
+        self,
+        condition: str,
+        page_size: int,
+        columns: Sequence[str],
+        after_id: int = 0,
+    ) -> Iterator[List[dict]]:
+        unknown = set(columns) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(sorted(unknown))}")
+        selected = ", ".join(dict.fromkeys(("id", *columns)))
+        last_id = after_id
+        while True:
+            cursor = self._get_conn().execute(
+                f"SELECT {selected} FROM web_knowledge "
+                f"WHERE {condition} AND id > ? ORDER BY id LIMIT ?",
+                (last_id, page_size),
+            )
+            page = [dict(row) for row in cursor]
+            if not page:
+                return
+            yield page
+            last_id = page[-1]["id"]
+
+    def iter_changed_since(
+        self,
+        since: int,
+        page_size: int = 500,
+        columns: Sequence[str] = ("keyword", "content", "version"),
+    ) -> Iterator[List[dict]]:
+        """按 id 键集分页遍历 since（unix 秒）之后新增或修改过的记录"""
+        return self._iter_pages(f"updated_at >= datetime({int(since)}, 'unixepoch')", page_size, columns)
+
+    def begin_rebuild(self, resume: bool = False) -> int:
+        """
+        登记重建开始，返回开始时间（unix 秒，多留 1 秒余量）
+
+        登记期间 clear_tombstones 不生效：其他进程同步时只会从旧集合删除索引，
+        墓碑留到切换后再对新集合执行一次。续传时沿用上次登记的时间。
+        """
+        with self._get_conn() as conn:
+            verb = "INSERT OR IGNORE" if resume else "INSERT OR REPLACE"
+            conn.execute(
+                f"{verb} INTO kb_meta (key, value) VALUES (?, CAST(strftime('%s', 'now') AS INTEGER) - 1)",
+                (_REBUILD_KEY,),
+            )
+            return conn.execute("SELECT value FROM kb_meta WHERE key = ?", (_REBUILD_KEY,)).fetchone()[0]
+
+    def end_rebuild(self):
+        """重建切换完成，恢复清除墓碑"""
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM kb_meta WHERE key = ?", (_REBUILD_KEY,))
+
+    def get_index_generation(self) -> int:
+        """数据 / 索引版本号（只增不减），用于检索缓存失效"""
+        row = self._get_conn().execute(
+            "SELECT value FROM kb_meta WHERE key = ?", (_GENERATION_KEY,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump_index_generation(self) -> int:
+        """向量索引变化后调用（同步 / 重建 / 删除索引），返回新版本号"""
+        with self._get_conn() as conn:
+            conn.execute("UPDATE kb_meta SET value = value + 1 WHERE key = ?", (_GENERATION_KEY,))
+            return conn.execute("SELECT value FROM kb_meta WHERE key = ?", (_GENERATION_KEY,)).fetchone()[0]
+
+    def find_keyword(self, keyword: str, limit: int = 5, prefix: bool = True) -> List[dict]:
+        """
+        关键词精确 / 前缀匹配（走 idx_keyword，不需要向量化）
+
+        Returns:
+            [{"id", "keyword", "content", "match": "exact" | "prefix"}, ...]，精确匹配在前，同类按时间倒序
+        """
+        keyword = keyword.strip()
+        if not keyword:
+            return []
+        conn = self._get_conn()
+        rows = [
+            {**dict(row), "match": "exact"}
+            for row in conn.execute(
+                "SELECT id, keyword, content FROM web_knowledge WHERE keyword = ? ORDER BY id DESC LIMIT ?",
+                (keyword, limit),
+            )
+        ]
+        if prefix and len(rows) < limit:
+            # 范围查询代替 LIKE 'x%'：不受大小写 / 转义规则影响，同样走索引
+            rows.extend(
+                {**dict(row), "match": "prefix"}
+                for row in conn.execute(
+                    "SELECT id, keyword, content FROM web_knowledge "
+                    "WHERE keyword > ? AND keyword < ? ORDER BY id DESC LIMIT ?",
+                    (keyword, keyword + "\U0010ffff", limit - len(rows)),
+                )
+            )
+        return rows
+
+    def search_fulltext(self, query: str, limit: int = 5) -> List[dict]:
+        """
+        全文检索 keyword / content（BM25 排序，keyword 权重更高）
+
+        Returns:
+            [{"id", "keyword", "content", "bm25"}, ...]，相关度从高到低；不支持 FTS5 时返回空列表
+        """
+        query = query.strip()
+        if not query or not self.fts_enabled:
+            return []
+        conn = self._get_conn()
+        if len(query) < _FTS_MIN_QUERY_CHARS:
+            # trigram 无法索引 1-2 个字的查询，改用 LIKE（关键词命中优先）
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            cursor = conn.execute(
+                "SELECT id, keyword, content, 0.0 AS bm25 FROM web_knowledge "
+                "WHERE keyword LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\' "
+                "ORDER BY (keyword LIKE ? ESCAPE '\\') DESC, id DESC LIMIT ?",
+                (pattern, pattern, pattern, limit),
+            )
+        else:
+            # 整体作为短语匹配，双引号转义，避免用户输入被解析成 FTS 语法
+            phrase = '"' + query.replace('"', '""') + '"'
+            cursor = conn.execute(
+                "SELECT rowid AS id, keyword, content, bm25(web_knowledge_fts, 2.0, 1.0) AS bm25 "
+                "FROM web_knowledge_fts WHERE web_knowledge_fts MATCH ? ORDER BY bm25 LIMIT ?",
+                (phrase, limit),
+            )
+        return [dict(row) for row in cursor]
+
+    def count_unsynced(self) -> int:
+        """统计未同步记录数"""
+        with self._get_conn() as conn:
+            cursor = conn.execute("SELECT COUNT(*) FROM web_knowledge WHERE synced_to_vector = 0")
+            return cursor.fetchone()[0]
+
+    def mark_indexed(self, entries: Sequence[dict]):
+        """
+        记录已写入向量库的版本（按版本号条件更新）
+
+        向量化期间记录又被修改时版本号已变，该行保持待同步，下次同步会重新索引。
+
+        Args:
+            entries: [{"id": int, "version": int, "content_hash": str}, ...]
+        """
+        if not entries:
+            return
+        with self._get_conn() as conn:
+            conn.executemany(
+                "UPDATE web_knowledge SET synced_to_vector = 1, content_hash = ? WHERE id = ? AND version = ?",
+                [(entry["content_hash"], entry["id"], entry["version"]) for entry in entries],
+            )
+
+    def mark_unsynced(self, ids: Sequence[int]):
+        """标记为待同步（如重建时向量化失败的记录）"""
+        if not ids:
+            return
+        with self._get_conn() as conn:
+            conn.executemany(
+                "UPDATE web_knowledge SET synced_to_vector = 0 WHERE id = ?",
+                [(record_id,) for record_id in ids],
+            )
+
+    def update(self, record_id: int, keyword: Optional[str] = None, content: Optional[str] = None) -> bool:
+        """
+        修改记录（触发器负责递增版本号并标记待同步），返回记录是否存在
+
+        Raises:
+            DuplicateContentError: 新内容与其他记录完全重复（记录保持不变）
+        """
+        assignments, params = [], []
+        if keyword is not None:
+            assignments.append("keyword = ?")
+            params.append(keyword)
+        signature = None
+        if content is not None:
+            fingerprint, signature = _signature(content)
+            assignments.append("content = ?, content_fingerprint = ?, minhash = ?")
+            params.extend((content, fingerprint, pack_signature(signature)))
+        if not assignments:
+            return self.get_by_id(record_id) is not None
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.execute(
+                    f"UPDATE web_knowledge SET {', '.join(assignments)} WHERE id = ?",
+                    (*params, record_id),
+                )
+                if content is not None and cursor.rowcount:
+                    conn.execute("DELETE FROM content_minhash_bands WHERE id = ?", (record_id,))
+                    _insert_bands(conn, [(record_id, pack_signature(signature))])
+                return cursor.rowcount > 0
+        except sqlite3.IntegrityError as e:
+            if _is_duplicate(e):
+                raise DuplicateContentError(self._find_fingerprint(fingerprint)) from None
+            raise
+
+    def _find_fingerprint(self, fingerprint: str) -> Optional[int]:
+        """规范化指纹相同的已有记录 ID"""
+        row = self._get_conn().execute(
+            "SELECT id FROM web_knowledge WHERE content_fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, record_ids: Sequence[int]) -> int:
+        """删除记录（触发器写入墓碑，下次同步时从向量库移除），返回删除条数"""
+        deleted = 0
+        with self._get_conn() as conn:
+            for i in range(0, len(record_ids), _MAX_PARAMS):
+                chunk = list(record_ids[i : i + _MAX_PARAMS])
+                placeholders = ",".join("?" * len(chunk))
+                cursor = conn.execute(f"DELETE FROM web_knowledge WHERE id IN ({placeholders})", chunk)
+                deleted += cursor.rowcount
+        return deleted
+
+    def get_tombstones(self, limit: int = 500, after_id: int = 0) -> List[int]:
+        """待从向量库删除的记录 ID（按 id 分页）"""
+        cursor = self._get_conn().execute(
+            "SELECT id FROM web_knowledge_tombstones WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        )
+        return [row["id"] for row in cursor]
+
+    def count_tombstones(self) -> int:
+        cursor = self._get_conn().execute("SELECT COUNT(*) FROM web_knowledge_tombstones")
+        return cursor.fetchone()[0]
+
+    def clear_tombstones(self, record_ids: Sequence[int]):
+        """向量库已删除对应索引后清除墓碑（重建进行中时保留，见 begin_rebuild）"""
+        if not record_ids:
+            return
+        with self._get_conn() as conn:
+            conn.executemany(
+                "DELETE FROM web_knowledge_tombstones WHERE id = ? "
+                "AND NOT EXISTS (SELECT 1 FROM kb_meta WHERE key = ?)",
+                [(record_id, _REBUILD_KEY) for record_id in record_ids],
+            )
+
+    def add_ingest_jobs(self, keywords: Sequence[str]) -> int:
+        """登记批量入库任务（已登记的关键词忽略），返回新增数"""
+        with self._get_conn() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO ingest_jobs (keyword) VALUES (?)",
+                [(keyword,) for keyword in keywords],
+            )
+            return conn.total_changes - before
+
+    def reset_ingest_jobs(self, retry_failed: bool = False) -> int:
+        """把上次中断时仍在处理的任务（以及可选的失败任务）恢复为待处理，返回恢复数"""
+        statuses = ("running", "failed") if retry_failed else ("running",)
+        placeholders = ",".join("?" * len(statuses))
+        with self._get_conn() as conn:
+            cursor = conn.execute(
+                f"UPDATE ingest_jobs SET status = 'pending', updated_at = CURRENT_TIMESTAMP "
+                f"WHERE status IN ({placeholders})",
+                statuses,
+            )
+            return cursor.rowcount
+
+    def get_pending_ingest_jobs(self) -> List[str]:
+        """待处理的关键词（按登记顺序）"""
+        cursor = self._get_conn().execute(
+            "SELECT keyword FROM ingest_jobs WHERE status = 'pending' ORDER BY rowid"
+        )
+        return [row["keyword"] for row in cursor]
+
+    def start_ingest_job(self, keyword: str):
+        with self._get_conn() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET status = 'running', attempts = attempts + 1, "
+                "updated_at = CURRENT_TIMESTAMP WHERE keyword = ?",
+                (keyword,),
+            )
+
+    def finish_ingest_job(self, keyword: str, saved_count: int = 0, error: Optional[str] = None):
+        """任务完成（error 不为空时标记为失败）"""
+        with self._get_conn() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET status = ?, saved_count = ?, error = ?, "
+                "updated_at = CURRENT_TIMESTAMP WHERE keyword = ?",
+                ("failed" if error else "done", saved_count, error, keyword),
+            )
+
+    def count_ingest_jobs(self) -> dict:
+        """各状态的任务数"""
+        cursor = self._get_conn().execute("SELECT status, COUNT(*) FROM ingest_jobs GROUP BY status")
+        return {status: count for status, count in cursor.fetchall()}
+
     def mark_synced(self, ids: list):
         """标记为已同步"""
         if not ids:
@@ -96,3 +979,37 @@ class KnowledgeDB:
             cursor = conn.execute("SELECT * FROM web_knowledge WHERE id = ?", (record_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
+
+    def get_by_ids(self, record_ids: Sequence[int], columns: Optional[Sequence[str]] = None) -> list:
+        """
+        根据 ID 批量获取记录（一个连接、一次查询）
+
+        Args:
+            record_ids: 记录 ID，返回结果保持该顺序（不存在的 ID 跳过）
+            columns: 只取这些列（id 总会包含），默认取全部列
+
+        Returns:
+            [dict, ...]
+        """
+        if not record_ids:
+            return []
+        if columns:
+            unknown = set(columns) - set(_COLUMNS)
+            if unknown:
+                raise ValueError(f"未知的列: {', '.join(sorted(unknown))}")
+            selected = ", ".join(dict.fromkeys(("id", *columns)))
+        else:
+            selected = "*"
+
+        unique_ids = list(dict.fromkeys(record_ids))
+        rows = {}
+        with self._get_conn() as conn:
+            for i in range(0, len(unique_ids), _MAX_PARAMS):
+                chunk = unique_ids[i : i + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = conn.execute(
+                    f"SELECT {selected} FROM web_knowledge WHERE id IN ({placeholders})",
+                    chunk,
+                )
+                rows.update((row["id"], dict(row)) for row in cursor)
+        return [rows[record_id] for record_id in record_ids if record_id in rows]
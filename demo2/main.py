@@ -14,8 +14,8 @@ from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.prompt import Prompt
 
-from config import CHROMADB_PATH
 from retriever import create_retriever
+from vector_collection import index_exists
 
 console = Console()
 
@@ -31,21 +31,22 @@ def print_help():
     console.print(Markdown("""
 **命令：**
 - `<关键词>`: 联网搜索（自动使用向量库扩展关键词）
+- `refresh <关键词>`: 忽略搜索缓存，重新联网搜索
 - `local <关键词>`: 仅向量检索（不联网）
-- `sync`: 同步 SQLite 数据到向量库
+- `sync`: 同步 SQLite 数据到向量库（先等待后台同步完成）
 - `stats`: 查看 SQLite 统计
 - `help`: 显示帮助
 - `exit` / `quit`: 退出
 """))
 
 
-def do_web_search(retriever, keyword: str):
+def do_web_search(retriever, keyword: str, sync_worker=None, refresh: bool = False):
     """联网搜索（默认行为）"""
     from semantic_searcher import create_semantic_searcher
 
     console.print(f"\n[cyan]搜索: {keyword}[/cyan]")
-    searcher = create_semantic_searcher(retriever)
-    result = searcher.search(keyword, n_expand=3)
+    searcher = create_semantic_searcher(retriever, sync_worker)
+    result = searcher.search(keyword, n_expand=3, refresh=refresh)
 
     if result["expanded_keywords"]:
         console.print(f"[dim]扩展关键词: {', '.join(result['expanded_keywords'])}[/dim]")
@@ -55,6 +56,8 @@ def do_web_search(retriever, keyword: str):
         title="搜索结果",
         border_style="blue",
     ))
+    if result["cached"]:
+        console.print("[dim]结果来自搜索缓存，输入 refresh <关键词> 可强制重新搜索[/dim]")
     console.print(f"[green]已保存 {result['saved_count']} 条到 SQLite[/green]")
 
 
@@ -68,26 +71,48 @@ def do_local_search(retriever, keyword: str):
     console.print(Panel(Markdown(result), title="本地检索结果", border_style="green"))
 
 
-def do_sync():
+def do_sync(sync_worker=None):
     from sync_to_vector import sync_to_vector
+    if sync_worker is not None and sync_worker.pending:
+        console.print("[dim]等待后台同步完成...[/dim]")
+        sync_worker.flush()
     console.print("\n[cyan]同步 SQLite -> Chromadb...[/cyan]")
     count = sync_to_vector()
     console.print(f"[green]同步完成，共 {count} 条[/green]")
 
 
-def do_stats():
+def do_stats(retriever=None):
     from knowledge_db import KnowledgeDB
     db = KnowledgeDB()
+    dedup = db.get_dedup_stats()
     console.print(Markdown(f"""
 **SQLite 知识库统计：**
 - 总记录数: {db.count()}
-- 未同步到向量库: {len(db.get_unsynced())}
+- 未同步到向量库: {db.count_unsynced()}
+- 待删除索引: {db.count_tombstones()}
+- 入库去重: 跳过完全相同 {dedup['exact']} 条，近似重复 {dedup['near']} 条
+"""))
+    if retriever:
+        stats = retriever.cache_stats()
+        console.print(Markdown(f"""
+**检索缓存：**
+- 查询向量: 命中 {stats['embedding_hits']} / 未命中 {stats['embedding_misses']}
+- 检索结果: 命中 {stats['result_hits']} / 未命中 {stats['result_misses']}
+"""))
+    from web_searcher import get_search_cache
+    search_cache = get_search_cache()
+    if search_cache is not None:
+        stats = search_cache.stats()
+        console.print(Markdown(f"""
+**搜索缓存：**
+- 缓存条目: {stats['entries']}
+- 本次会话: 命中 {stats['hits']} / 未命中 {stats['misses']}
 """))
 
 
 def init_retriever():
     """尝试初始化向量检索器（可选）"""
-    if not CHROMADB_PATH.exists() or not list(CHROMADB_PATH.glob("*")):
+    if not index_exists():
         return None
     try:
         retriever = create_retriever()
@@ -97,7 +122,27 @@ def init_retriever():
         return None
 
 
-def handle_command(retriever, user_input: str) -> bool:
+def init_sync_worker():
+    """启动后台向量同步线程（失败时退回到搜索后同步执行）"""
+    try:
+        from sync_worker import get_sync_worker
+        return get_sync_worker()
+    except Exception as e:
+        console.print(f"[yellow]后台同步未启动，将在搜索后同步执行: {e}[/yellow]")
+        return None
+
+
+def stop_sync_worker(sync_worker):
+    """退出前把排队中的数据同步完"""
+    if sync_worker is None:
+        return
+    if sync_worker.pending:
+        console.print(f"[dim]正在同步剩余 {sync_worker.pending} 条...[/dim]")
+    if not sync_worker.stop(flush=True):
+        console.print("[yellow]后台同步未在超时前完成，剩余数据可稍后执行 sync 补齐[/yellow]")
+
+
+def handle_command(retriever, user_input: str, sync_worker=None) -> bool:
     cmd = user_input.lower()
 
     if cmd in ["exit", "quit"]:
@@ -110,18 +155,28 @@ def handle_command(retriever, user_input: str) -> bool:
 
     if cmd == "sync":
         try:
-            do_sync()
+            do_sync(sync_worker)
         except Exception as e:
             console.print(f"[red]同步失败: {e}[/red]")
         return True
 
     if cmd == "stats":
         try:
-            do_stats()
+            do_stats(retriever)
         except Exception as e:
             console.print(f"[red]统计失败: {e}[/red]")
         return True
 
+    # refresh <关键词> - 忽略搜索缓存
+    if cmd.startswith("refresh "):
+        keyword = user_input[8:].strip()
+        if keyword:
+            try:
+                do_web_search(retriever, keyword, sync_worker, refresh=True)
+            except Exception as e:
+                console.print(f"[red]搜索失败: {e}[/red]")
+        return True
+
     # local <关键词> - 仅本地向量检索
     if cmd.startswith("local "):
         keyword = user_input[6:].strip()
@@ -134,7 +189,7 @@ def handle_command(retriever, user_input: str) -> bool:
 
     # 默认：联网搜索
     try:
-        do_web_search(retriever, user_input)
+        do_web_search(retriever, user_input, sync_worker)
     except Exception as e:
         console.print(f"[red]搜索失败: {e}[/red]")
 
@@ -144,15 +199,19 @@ def handle_command(retriever, user_input: str) -> bool:
 def main():
     print_banner()
     retriever = init_retriever()
+    sync_worker = init_sync_worker()
     print_help()
 
-    while True:
-        console.print("\n" + "-" * 40)
-        user_input = Prompt.ask("[bold cyan]请输入关键词[/bold cyan]").strip()
-        if not user_input:
-            continue
-        if not handle_command(retriever, user_input):
-            break
+    try:
+        while True:
+            console.print("\n" + "-" * 40)
+            user_input = Prompt.ask("[bold cyan]请输入关键词[/bold cyan]").strip()
+            if not user_input:
+                continue
+            if not handle_command(retriever, user_input, sync_worker):
+                break
+    finally:
+        stop_sync_worker(sync_worker)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,557 @@
+"""NumPy 向量索引：内存映射的归一化向量矩阵 + ID 数组，点积求 top-k（可选 IVF 分区）
+
+对外提供与 Chroma 相同的客户端 / 集合接口子集（get_collection、upsert、delete、query、get ...），
+sync_to_vector / init_db / retriever 不需要区分后端。
+
+每个集合一个目录：
+- vectors.bin   行主序向量矩阵（float32 / float16 / int8，已归一化），按槽位追加
+- scales.bin    int8 存储时每行的缩放系数（float32）
+- vectors_full.bin  低精度存储时的 float32 原始向量（启用重排时），查询只读取候选行
+- slots.bin     每个槽位对应的 SQLite ID（int64，-1 表示已删除）
+- rows.db       SQLite ID -> 槽位、keyword、content_hash；同时作为跨进程写锁
+- meta.json     维度、存储精度、集合 metadata
+- ivf.npz / ivf_assign.bin  IVF 聚类中心与每个槽位所属分区（启用时）
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import (
+    NUMPY_INDEX_DTYPE,
+    NUMPY_INDEX_IVF_LISTS,
+    NUMPY_INDEX_IVF_MIN_SIZE,
+    NUMPY_INDEX_IVF_PROBE,
+    NUMPY_INDEX_PATH,
+    NUMPY_INDEX_RESCORE,
+)
+
+_CREATE_ROWS_SQL = """
+CREATE TABLE IF NOT EXISTS rows (
+    sqlite_id INTEGER PRIMARY KEY,
+    slot INTEGER NOT NULL,
+    keyword TEXT,
+    content_hash TEXT
+)
+"""
+
+# 打分时每块处理的行数（float16 升精度的临时块留在 CPU 缓存内，也控制临时内存）
+_SCORE_BLOCK_ROWS = 8192
+# IVF 训练：每个分区的采样数与 k-means 迭代次数
+_IVF_SAMPLES_PER_LIST = 64
+_IVF_ITERATIONS = 10
+
+_SLOT_DTYPE = np.dtype("<i8")
+_ASSIGN_DTYPE = np.dtype("<i4")
+_SCALE_DTYPE = np.dtype("<f4")
+_FULL_DTYPE = np.dtype("<f4")
+
+_SUPPORTED_DTYPES = ("float32", "float16", "int8")
+# int8 对称量化：每行按最大绝对值缩放到 [-127, 127]
+_INT8_MAX = 127
+
+
+def _parse_id(chroma_id: str) -> int:
+    """idx_<sqlite_id> -> sqlite_id"""
+    return int(str(chroma_id).rsplit("_", 1)[-1])
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _encode(vectors: np.ndarray, dtype: np.dtype) -> tuple:
+    """按存储精度编码，返回 (存储矩阵, 每行缩放系数；非 int8 时为 None)"""
+    if dtype != np.int8:
+        return vectors.astype(dtype), None
+    scales = np.abs(vectors).max(axis=1) / _INT8_MAX
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, np.newaxis]).astype(np.int8), scales.astype(_SCALE_DTYPE)
+
+
+def _write_slots(path: Path, slots: Sequence[int], data: np.ndarray):
+    """按槽位覆盖写入多行（超出文件末尾即追加）；连续槽位合并成一次写，追加时整批只写一次"""
+    if not len(slots):
+        return
+    row_bytes = data.dtype.itemsize * (data.shape[1] if data.ndim == 2 else 1)
+    slots = np.asarray(slots, dtype=np.int64)
+    order = np.argsort(slots, kind="stable")
+    breaks = np.flatnonzero(np.diff(slots[order]) != 1) + 1
+    with open(path, "r+b" if path.exists() else "w+b") as f:
+        for run in np.split(order, breaks):
+            f.seek(int(slots[run[0]]) * row_bytes)
+            f.write(np.ascontiguousarray(data[run]).tobytes())
+
+
+class NumpyCollection:
+    """单个 NumPy 索引集合（接口与 chromadb Collection 对齐）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.name = self.path.name
+        self._lock = threading.RLock()
+        self._meta_stat = None
+        self._reload_meta()
+        self._conn = sqlite3.connect(str(self.path / "rows.db"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_CREATE_ROWS_SQL)
+        self._conn.commit()
+        # 内存映射按文件大小缓存，其他进程追加后自动重新映射
+        self._mapped: Dict[str, tuple] = {}
+        self._ivf_cache = None
+
+    # ---------- 元数据 ----------
+
+    @property
+    def metadata(self) -> dict:
+        with self._lock:
+            self._refresh_meta()
+            return dict(self._meta.get("metadata") or {})
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._meta.get("dim")
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self._meta.get("dtype", "float32"))
+
+    @property
+    def quantized(self) -> bool:
+        return self.dtype == np.int8
+
+    @property
+    def full_precision(self) -> bool:
+        """是否另存了 float32 原始向量（用于重排）"""
+        return bool(self._meta.get("full_precision"))
+
+    def _save_meta(self):
+        tmp_path = self.path / "meta.json.tmp"
+        tmp_path.write_text(json.dumps(self._meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path / "meta.json")
+
+    def _reload_meta(self):
+        path = self.path / "meta.json"
+        stat = path.stat()
+        self._meta = json.loads(path.read_text(encoding="utf-8"))
+        self._meta_stat = (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh_meta(self):
+        """meta.json 被其他进程改写（如首次写入确定维度）后重新读取"""
+        stat = (self.path / "meta.json").stat()
+        if (stat.st_mtime_ns, stat.st_size) != self._meta_stat:
+            self._reload_meta()
+
+    def modify(self, name: Optional[str] = None, metadata: Optional[dict] = None):
+        if name is not None and name != self.name:
+            raise ValueError("NumPy 索引不支持重命名集合")
+        if metadata is not None:
+            with self._lock:
+                self._reload_meta()
+                self._meta["metadata"] = dict(metadata)
+                self._save_meta()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    # ---------- 内存映射 ----------
+
+    def _map(self, filename: str, dtype: np.dtype, width: int = 0) -> np.ndarray:
+        """只读映射（文件大小变化时重新映射）"""
+        path = self.path / filename
+        size = path.stat().st_size if path.exists() else 0
+        row_bytes = dtype.itemsize * (width or 1)
+        rows = size // row_bytes
+        cached = self._mapped.get(filename)
+        if cached and cached[0] == rows:
+            return cached[1]
+        if rows == 0:
+            array = np.empty((0, width) if width else (0,), dtype=dtype)
+        else:
+            shape = (rows, width) if width else (rows,)
+            array = np.memmap(path, dtype=dtype, mode="r", shape=shape)
+        self._mapped[filename] = (rows, array)
+        return array
+
+    def _vectors(self) -> np.ndarray:
+        if not self.dim:
+            return np.empty((0, 0), dtype=self.dtype)
+        return self._map("vectors.bin", self.dtype, self.dim)
+
+    def _slots(self) -> np.ndarray:
+        return self._map("slots.bin", _SLOT_DTYPE)
+
+    def _scales(self) -> Optional[np.ndarray]:
+        return self._map("scales.bin", _SCALE_DTYPE) if self.quantized else None
+
+    def _full_vectors(self) -> Optional[np.ndarray]:
+        if not self.full_precision or not self.dim:
+            return None
+        return self._map("vectors_full.bin", _FULL_DTYPE, self.dim)
+
+    def _dense(self, vectors: np.ndarray, scales: Optional[np.ndarray], index) -> np.ndarray:
+        """取出若干行并还原为 float32"""
+        block = np.asarray(vectors[index], dtype=np.float32)
+        if scales is not None:
+            block *= np.asarray(scales[index])[:, np.newaxis]
+        return block
+
+    # ---------- 写入 ----------
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[dict]] = None,
+    ):
+        """新增或覆盖（已存在的 ID 原槽位覆盖写，新 ID 追加到末尾）；documents 不存储，内容在 SQLite"""
+        if not ids:
+            return
+        vectors = _normalize(embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+        sqlite_ids = [_parse_id(chroma_id) for chroma_id in ids]
+
+        with self._lock:
+            # BEGIN IMMEDIATE 同时是跨进程写锁：槽位分配与文件写入串行化
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reload_meta()
+                if not self.dim:
+                    self._meta["dim"] = int(vectors.shape[1])
+                    self._save_meta()
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"向量维度不一致: {vectors.shape[1]} != {self.dim}")
+
+                existing = dict(self._select_slots(sqlite_ids))
+                next_slot = (self.path / "slots.bin").stat().st_size // _SLOT_DTYPE.itemsize \
+                    if (self.path / "slots.bin").exists() else 0
+                slots = []
+                for sqlite_id in sqlite_ids:
+                    slot = existing.get(sqlite_id)
+                    if slot is None:
+                        slot = existing[sqlite_id] = next_slot
+                        next_slot += 1
+                    slots.append(slot)
+
+                encoded, scales = _encode(vectors, self.dtype)
+                _write_slots(self.path / "vectors.bin", slots, encoded)
+                if scales is not None:
+                    _write_slots(self.path / "scales.bin", slots, scales)
+                if self.full_precision:
+                    _write_slots(self.path / "vectors_full.bin", slots, vectors.astype(_FULL_DTYPE))
+                _write_slots(self.path / "slots.bin", slots, np.array(sqlite_ids, dtype=_SLOT_DTYPE))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rows (sqlite_id, slot, keyword, content_hash) VALUES (?, ?, ?, ?)",
+                    [
+                        (sqlite_id, slot, metadata.get("keyword"), metadata.get("content_hash"))
+                        for sqlite_id, slot, metadata in zip(sqlite_ids, slots, metadatas)
+                    ],
+                )
+                self._update_ivf(slots, vectors, next_slot)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: Sequence[str]):
+        """删除（槽位标记为 -1，空间在重建时回收）"""
+        if not ids:
+            return
+        sqlite_ids = [_parse_id(chroma_id) for chroma_id in ids]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                slots = [slot for _, slot in self._select_slots(sqlite_ids)]
+                _write_slots(self.path / "slots.bin", slots, np.full(len(slots), -1, dtype=_SLOT_DTYPE))
+                self._conn.executemany(
+                    "DELETE FROM rows WHERE sqlite_id = ?", [(sqlite_id,) for sqlite_id in sqlite_ids]
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _select_slots(self, sqlite_ids: Sequence[int]) -> list:
+        result = []
+        for i in range(0, len(sqlite_ids), 500):
+            chunk = list(sqlite_ids[i : i + 500])
+            placeholders = ",".join("?" * len(chunk))
+            result.extend(self._conn.execute(
+                f"SELECT sqlite_id, slot FROM rows WHERE sqlite_id IN ({placeholders})", chunk
+            ).fetchall())
+        return result
+
+    # ---------- IVF ----------
+
+    def _ivf_enabled(self) -> bool:
+        return NUMPY_INDEX_IVF_LISTS > 0
+
+    def _load_ivf(self):
+        path = self.path / "ivf.npz"
+        if not path.exists():
+            self._ivf_cache = None
+            return None
+        mtime = path.stat().st_mtime_ns
+        if self._ivf_cache is None or self._ivf_cache[0] != mtime:
+            with np.load(path) as data:
+                self._ivf_cache = (mtime, data["centroids"], int(data["trained_size"]))
+        return self._ivf_cache
+
+    def _update_ivf(self, slots: List[int], vectors: np.ndarray, size: int):
+        """新向量归入最近分区；数据量达到阈值或翻倍时重新训练"""
+        if not self._ivf_enabled():
+            return
+        ivf = self._load_ivf()
+        if ivf is None:
+            if size >= NUMPY_INDEX_IVF_MIN_SIZE:
+                self._train_ivf(size)
+            return
+        _, centroids, trained_size = ivf
+        if size >= 2 * trained_size:
+            self._train_ivf(size)
+            return
+        assign = np.argmax(vectors @ centroids.T, axis=1).astype(_ASSIGN_DTYPE)
+        _write_slots(self.path / "ivf_assign.bin", slots, assign)
+
+    def _train_ivf(self, size: int):
+        """球面 k-means：在采样上训练聚类中心，再给全部槽位分配分区"""
+        self._mapped.clear()
+        vectors = self._vectors()[:size]
+        scales = self._scales()
+        lists = min(NUMPY_INDEX_IVF_LISTS, size)
+        rng = np.random.default_rng(0)
+        sample_size = min(size, lists * _IVF_SAMPLES_PER_LIST)
+        sample = self._dense(vectors, scales, np.sort(rng.choice(size, sample_size, replace=False)))
+        centroids = sample[rng.choice(sample_size, lists, replace=False)]
+        for _ in range(_IVF_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(lists):
+                members = sample[labels == list_id]
+                if len(members):
+                    centroids[list_id] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        assign = np.empty(size, dtype=_ASSIGN_DTYPE)
+        for start in range(0, size, _SCORE_BLOCK_ROWS):
+            block = self._dense(vectors, scales, slice(start, min(start + _SCORE_BLOCK_ROWS, size)))
+            assign[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        _write_slots(self.path / "ivf_assign.bin", range(size), assign)
+        tmp_path = self.path / "ivf.tmp.npz"
+        np.savez(tmp_path, centroids=centroids, trained_size=np.int64(size))
+        os.replace(tmp_path, self.path / "ivf.npz")
+
+    def _candidates(self, query: np.ndarray, size: int) -> Optional[np.ndarray]:
+        """IVF 探测的候选槽位（未启用 / 未训练时返回 None，表示全量扫描）"""
+        if not self._ivf_enabled():
+            return None
+        ivf = self._load_ivf()
+        if ivf is None:
+            return None
+        _, centroids, _ = ivf
+        probe = min(NUMPY_INDEX_IVF_PROBE, len(centroids))
+        lists = np.argpartition(-(centroids @ query), probe - 1)[:probe]
+        assign = self._map("ivf_assign.bin", _ASSIGN_DTYPE)[:size]
+        candidates = np.flatnonzero(np.isin(assign, lists))
+        # 训练后才追加、尚未分配分区的尾部槽位一并扫描
+        if len(assign) < size:
+            candidates = np.concatenate([candidates, np.arange(len(assign), size)])
+        return candidates
+
+    # ---------- 查询 ----------
+
+    def _scores(
+        self,
+        vectors: np.ndarray,
+        scales: Optional[np.ndarray],
+        query: np.ndarray,
+        candidates: Optional[np.ndarray],
+    ) -> np.ndarray:
+        """低精度向量与查询的点积（int8 先按整数点积，再乘每行缩放系数）"""
+        if candidates is not None:
+            scores = np.asarray(vectors[candidates], dtype=np.float32) @ query
+            return scores * scales[candidates] if scales is not None else scores
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), _SCORE_BLOCK_ROWS):
+            block = vectors[start : start + _SCORE_BLOCK_ROWS]
+            scores[start : start + len(block)] = np.asarray(block, dtype=np.float32) @ query
+        if scales is not None:
+            scores *= scales
+        return scores
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        include: Sequence[str] = ("metadatas", "distances"),
+        **_,
+    ) -> dict:
+        """
+        top-k 检索
+
+        distances 与 Chroma 默认的 l2 空间一致：归一化向量的平方欧氏距离 = 2 - 2 * 余弦相似度
+
+        低精度存储且保存了原始向量时，先取 n_results × NUMPY_INDEX_RESCORE 个候选，
+        再读取这些行的 float32 原始向量重新打分排序（distances 也按原始精度计算）。
+        """
+        result = {"ids": [], "metadatas": [], "distances": []}
+        with self._lock:
+            self._refresh_meta()
+            vectors = self._vectors()
+            slots = self._slots()
+            scales = self._scales()
+            full = self._full_vectors() if NUMPY_INDEX_RESCORE > 0 else None
+            # 其他进程写入中途时各文件长度可能不一致，只取都已写完的槽位
+            size = min(len(array) for array in (vectors, slots, scales, full) if array is not None)
+            vectors, slots = vectors[:size], slots[:size]
+            if scales is not None:
+                scales = scales[:size]
+            if full is not None:
+                full = full[:size]
+            for query in _normalize(query_embeddings):
+                candidates = self._candidates(query, size)
+                scores = self._scores(vectors, scales, query, candidates)
+                positions = candidates if candidates is not None else np.arange(size)
+                scores[slots[positions] < 0] = -np.inf
+
+                valid = int(np.count_nonzero(np.isfinite(scores)))
+                k = min(n_results, valid)
+                if k <= 0:
+                    result["ids"].append([])
+                    result["metadatas"].append([])
+                    result["distances"].append([])
+                    continue
+                if full is not None:
+                    shortlist = min(valid, n_results * NUMPY_INDEX_RESCORE)
+                    top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+                    # 按槽位顺序读取原始向量，减少随机读
+                    top = top[np.argsort(positions[top])]
+                    scores[top] = np.asarray(full[positions[top]], dtype=np.float32) @ query
+                    top = top[np.argpartition(-scores[top], k - 1)[:k]]
+                else:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                sqlite_ids = [int(slots[positions[i]]) for i in top]
+                metadata = self._metadatas(sqlite_ids)
+                result["ids"].append([f"idx_{sqlite_id}" for sqlite_id in sqlite_ids])
+                result["metadatas"].append([metadata.get(sqlite_id, {"sqlite_id": sqlite_id}) for sqlite_id in sqlite_ids])
+                result["distances"].append([float(2 - 2 * scores[i]) for i in top])
+        return result
+
+    def _metadatas(self, sqlite_ids: Sequence[int]) -> Dict[int, dict]:
+        placeholders = ",".join("?" * len(sqlite_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT sqlite_id, keyword, content_hash FROM rows WHERE sqlite_id IN ({placeholders})",
+                list(sqlite_ids),
+            ).fetchall()
+        return {
+            sqlite_id: {"sqlite_id": sqlite_id, "keyword": keyword, "content_hash": content_hash}
+            for sqlite_id, keyword, content_hash in rows
+        }
+
+    def get(self, include: Sequence[str] = ("metadatas",), limit: Optional[int] = None, offset: int = 0, **_) -> dict:
+        """按槽位顺序分页列出（用于重建时的比对）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sqlite_id, keyword, content_hash FROM rows ORDER BY slot LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        return {
+            "ids": [f"idx_{sqlite_id}" for sqlite_id, _, _ in rows],
+            "metadatas": [
+                {"sqlite_id": sqlite_id, "keyword": keyword, "content_hash": content_hash}
+                for sqlite_id, keyword, content_hash in rows
+            ],
+        }
+
+    def close(self):
+        with self._lock:
+            self._mapped.clear()
+            self._conn.close()
+
+
+class NumpyIndexClient:
+    """NumPy 索引的“客户端”：一个目录下按集合名分子目录（接口与 chromadb 客户端对齐）"""
+
+    def __init__(
+        self,
+        path: Path = NUMPY_INDEX_PATH,
+        dtype: str = NUMPY_INDEX_DTYPE,
+        full_precision: Optional[bool] = None,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype).name
+        if self.dtype not in _SUPPORTED_DTYPES:
+            raise ValueError(f"NumPy 索引只支持 {' / '.join(_SUPPORTED_DTYPES)} 存储: {dtype}")
+        # 新建集合时是否另存原始向量（默认：低精度存储且启用重排时保存）
+        if full_precision is None:
+            full_precision = self.dtype != "float32" and NUMPY_INDEX_RESCORE > 0
+        self.full_precision = full_precision
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def get_collection(self, name: str, embedding_function=None) -> NumpyCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                if not (self.path / name / "meta.json").exists():
+                    raise ValueError(f"集合不存在: {name}")
+                collection = self._collections[name] = NumpyCollection(self.path / name)
+            return collection
+
+    def create_collection(self, name: str, embedding_function=None, metadata: Optional[dict] = None) -> NumpyCollection:
+        directory = self.path / name
+        if (directory / "meta.json").exists():
+            raise ValueError(f"集合已存在: {name}")
+        directory.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "dim": None,
+            "dtype": self.dtype,
+            "full_precision": self.full_precision,
+            "metadata": dict(metadata or {}),
+        }
+        (directory / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        return self.get_collection(name)
+
+    def list_collections(self) -> List[NumpyCollection]:
+        return [
+            self.get_collection(directory.name)
+            for directory in sorted(self.path.iterdir())
+            if (directory / "meta.json").exists()
+        ]
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            collection = self._collections.pop(name, None)
+        if collection is not None:
+            collection.close()
+        shutil.rmtree(self.path / name, ignore_errors=True)
+
+
+_clients: Dict[Path, NumpyIndexClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_numpy_client(path: Path = NUMPY_INDEX_PATH) -> NumpyIndexClient:
+    """进程内共享的客户端（同一集合只打开一次，写入后其他使用方立即可见）"""
+    key = Path(path).resolve()
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = NumpyIndexClient(key)
+        return client
@@ -0,0 +1,34 @@
+"""进程内限流器：线程安全的令牌桶，用于控制并发 API 调用的速率"""
+import threading
+import time
+
+
+class RateLimiter:
+    """令牌桶限流器（rate_per_minute <= 0 表示不限流）"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+
+    def acquire(self) -> float:
+        """阻塞直到拿到一个令牌，返回等待秒数"""
+        if self.rate_per_second <= 0:
+            return 0.0
+
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    wait = now - start
+                    self.total_wait += wait
+                    return wait
+                sleep = (1.0 - self._tokens) / self.rate_per_second
+            time.sleep(sleep)
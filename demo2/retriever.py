@@ -1,67 +1,236 @@
-"""向量检索器：通过向量索引查找，再从 SQLite 取完整内容"""
-import chromadb
-from chromadb.config import Settings
+"""向量检索器：通过向量索引查找，再从 SQLite 取完整内容（支持关键词快速路径与全文 + 向量混合检索）"""
+import threading
+from collections import OrderedDict
+from typing import List, Optional
 
-from config import CHROMADB_PATH, COLLECTION_NAME
-from embedding_client import ZhipuAIEmbedding
+from config import QUERY_EMBEDDING_CACHE_SIZE, RETRIEVAL_CACHE_SIZE, RETRIEVAL_MODE, RRF_K
+from embedding_client import create_embedding_function
 from knowledge_db import KnowledgeDB
+from vector_collection import create_client, get_active_collection_name
+
+_MATCH_LABELS = {
+    "exact": "关键词精确",
+    "prefix": "关键词前缀",
+    "fulltext": "全文",
+    "vector": "向量",
+    "hybrid": "混合",
+}
+
+
+class _LRUCache:
+    """线程安全的 LRU 缓存（maxsize <= 0 表示关闭）"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
 
 
 class KnowledgeRetriever:
     """向量检索器（索引层 + 数据层）"""
 
     def __init__(self):
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(CHROMADB_PATH),
-            settings=Settings(anonymized_telemetry=False),
-        )
-        self.embedding_function = ZhipuAIEmbedding()
+        self.chroma_client = create_client()
+        self.embedding_function = create_embedding_function()
+        self.collection_name = get_active_collection_name()
         self.collection = self.chroma_client.get_collection(
-            name=COLLECTION_NAME,
+            name=self.collection_name,
             embedding_function=self.embedding_function,
         )
         self.knowledge_db = KnowledgeDB()
+        # 查询向量与文本一一对应，不随索引变化；检索结果按 index_generation 失效
+        self._embedding_cache = _LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+        self._result_cache = _LRUCache(RETRIEVAL_CACHE_SIZE)
         print(f"[OK] 检索器初始化成功")
 
-    def retrieve(self, keyword: str, n_results: int = 5, min_similarity: float = 0.3) -> list:
+    def _refresh_collection(self):
+        """重建完成后生效集合会切换，检索时跟随切换（不需要重启进程）"""
+        name = get_active_collection_name()
+        if name != self.collection_name:
+            self.collection = self.chroma_client.get_collection(
+                name=name,
+                embedding_function=self.embedding_function,
+            )
+            self.collection_name = name
+
+    def retrieve(
+        self,
+        keyword: str,
+        n_results: int = 5,
+        min_similarity: float = 0.3,
+        mode: Optional[str] = None,
+    ) -> list:
         """
         检索相关知识，返回结构化数据
 
+        mode:
+            - vector: 只做向量检索
+            - hybrid: 关键词精确 / 前缀命中足够时直接返回（不调用 Embedding API）；
+              否则用倒数排名融合（RRF）合并关键词命中、BM25 全文检索与向量检索
+            默认取 RETRIEVAL_MODE
+
+        min_similarity 只过滤纯向量命中；字面命中（精确 / 前缀 / 全文）本身就是强相关信号，予以保留。
+
         Returns:
-            [{"keyword": str, "content": str, "similarity": float, "sqlite_id": int}, ...]
+            [{"keyword": str, "content": str, "similarity": float | None, "sqlite_id": int,
+              "match": "exact" | "prefix" | "fulltext" | "vector" | "hybrid", "score": float}, ...]
         """
-        query_embedding = self.embedding_function.embed_query(keyword)
-        results = self.collection.query(query_embeddings=[query_embedding], n_results=n_results)
+        mode = mode or RETRIEVAL_MODE
+        # 版本号未变（期间没有新增 / 修改 / 同步）时直接复用上次结果
+        # 旧版本号的条目不会再被命中，由 LRU 自然淘汰
+        key = (keyword, n_results, min_similarity, mode, self.knowledge_db.get_index_generation())
+        cached = self._result_cache.get(key)
+        if cached is not None:
+            return [dict(item) for item in cached]
+
+        items = self._retrieve(keyword, n_results, min_similarity, mode)
+        self._result_cache.put(key, [dict(item) for item in items])
+        return items
+
+    def _retrieve(self, keyword: str, n_results: int, min_similarity: float, mode: str) -> list:
+        if mode == "vector":
+            return self._to_items(self._vector_hits(keyword, n_results, min_similarity), n_results)
+
+        # 1. 快速路径：关键词已存在时本地直接作答
+        lexical = self.knowledge_db.find_keyword(keyword, limit=n_results)
+        if len(lexical) >= n_results:
+            return self._fuse([[(row["id"], row["match"], None) for row in lexical]], n_results, records=lexical)
+
+        # 2. 混合检索
+        fulltext = self.knowledge_db.search_fulltext(keyword, limit=n_results)
+        try:
+            vector = self._vector_hits(keyword, n_results, min_similarity)
+        except Exception as e:
+            # 向量检索不可用（如网络异常）时退化为纯本地检索
+            if not lexical and not fulltext:
+                raise
+            print(f"[WARN] 向量检索失败，仅使用本地全文检索: {e}")
+            vector = []
+
+        ranked_lists = [
+            [(row["id"], row["match"], None) for row in lexical],
+            [(row["id"], "fulltext", None) for row in fulltext],
+            [(hit["sqlite_id"], "vector", hit["similarity"]) for hit in vector],
+        ]
+        return self._fuse(ranked_lists, n_results, records=lexical + fulltext)
+
+    def _vector_hits(self, keyword: str, n_results: int, min_similarity: float) -> list:
+        """向量检索：[{"sqlite_id", "keyword", "similarity"}, ...]（相似度从高到低）"""
+        self._refresh_collection()
+        query_embedding = self._embed_query(keyword)
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            include=["metadatas", "distances"],
+        )
 
         if not results["ids"][0]:
             return []
 
-        items = []
-        for doc, metadata, distance in zip(
-            results["documents"][0],
-            results["metadatas"][0],
-            results["distances"][0],
-        ):
+        hits = []
+        for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
             similarity = 1 - distance
-            if similarity < min_similarity:
+            if similarity < min_similarity or not metadata.get("sqlite_id"):
                 continue
+            hits.append({
+                "sqlite_id": metadata["sqlite_id"],
+                "keyword": metadata.get("keyword", ""),
+                "similarity": similarity,
+            })
+        return hits
+
+    def _embed_query(self, keyword: str) -> List[float]:
+        """查询向量（内存 LRU -> 持久化向量缓存 -> API）"""
+        vector = self._embedding_cache.get(keyword)
+        if vector is None:
+            vector = self.embedding_function.embed_query(keyword)
+            self._embedding_cache.put(keyword, vector)
+        return vector
+
+    def cache_stats(self) -> dict:
+        """检索器内存缓存命中统计"""
+        return {
+            "embedding_hits": self._embedding_cache.hits,
+            "embedding_misses": self._embedding_cache.misses,
+            "result_hits": self._result_cache.hits,
+            "result_misses": self._result_cache.misses,
+        }
 
-            sqlite_id = metadata.get("sqlite_id")
-            matched_keyword = metadata.get("keyword", "")
+    def _to_items(self, hits: list, n_results: int) -> list:
+        """纯向量结果：一次查询取回全部命中记录的内容"""
+        ranked = [[(hit["sqlite_id"], "vector", hit["similarity"]) for hit in hits]]
+        items = self._fuse(ranked, n_results, records=[])
+        keywords = {hit["sqlite_id"]: hit["keyword"] for hit in hits}
+        for item in items:
+            item["keyword"] = item["keyword"] or keywords.get(item["sqlite_id"], "")
+        return items
+
+    def _fuse(self, ranked_lists: list, n_results: int, records: list) -> list:
+        """
+        倒数排名融合：score = Σ 1 / (RRF_K + rank)
+
+        Args:
+            ranked_lists: 每个来源的 [(sqlite_id, match, similarity), ...]，按相关度排序
+            records: 已带 keyword / content 的记录（来自本地检索），其余记录一次查询补齐
+        """
+        scores, matches, similarities = {}, {}, {}
+        for ranked in ranked_lists:
+            for rank, (sqlite_id, match, similarity) in enumerate(ranked, 1):
+                scores[sqlite_id] = scores.get(sqlite_id, 0.0) + 1.0 / (RRF_K + rank)
+                matches.setdefault(sqlite_id, set()).add(match)
+                if similarity is not None:
+                    similarities[sqlite_id] = similarity
+        # 精确命中始终排在最前
+        top = sorted(scores, key=lambda i: ("exact" in matches[i], scores[i]), reverse=True)[:n_results]
 
-            content = ""
-            if sqlite_id:
-                record = self.knowledge_db.get_by_id(sqlite_id)
-                if record:
-                    content = record["content"]
+        known = {record["id"]: record for record in records}
+        missing = [sqlite_id for sqlite_id in top if sqlite_id not in known]
+        if missing:
+            known.update(
+                (record["id"], record)
+                for record in self.knowledge_db.get_by_ids(missing, columns=("keyword", "content"))
+            )
 
+        items = []
+        for sqlite_id in top:
+            record = known.get(sqlite_id)
+            found = matches[sqlite_id]
+            if len(found) > 1:
+                match = "exact" if "exact" in found else "hybrid"
+            else:
+                match = next(iter(found))
             items.append({
-                "keyword": matched_keyword,
-                "content": content,
-                "similarity": similarity,
+                "keyword": record["keyword"] if record else "",
+                "content": record["content"] if record else "",
+                "similarity": similarities.get(sqlite_id, 1.0 if "exact" in found else None),
                 "sqlite_id": sqlite_id,
+                "match": match,
+                "score": scores[sqlite_id],
             })
-
         return items
 
     def retrieve_knowledge(self, keyword: str, n_results: int = 5) -> str:
@@ -75,8 +244,12 @@ class KnowledgeRetriever:
 
         lines = [f"检索到 {len(items)} 条相关知识：\n"]
         for i, item in enumerate(items, 1):
-            print(f"  [{i}] 关键词={item['keyword']} 相似度={item['similarity']:.2%}")
-            lines.append(f"**[{i}] {item['keyword']}** (相似度: {item['similarity']:.2%})")
+            if item["similarity"] is None:
+                relevance = f"匹配: {_MATCH_LABELS[item['match']]}"
+            else:
+                relevance = f"相似度: {item['similarity']:.2%}，匹配: {_MATCH_LABELS[item['match']]}"
+            print(f"  [{i}] 关键词={item['keyword']} {relevance}")
+            lines.append(f"**[{i}] {item['keyword']}** ({relevance})")
             lines.append(f"{item['content']}\n")
 
         return "\n".join(lines)
@@ -0,0 +1,142 @@
+"""联网搜索缓存：按 (模型 + 规范化查询) 缓存搜索结果与提取出的知识条目，命中时跳过搜索与提取两次 LLM 调用"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+
+from config import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_HOURS
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    key BLOB PRIMARY KEY,
+    query TEXT NOT NULL,
+    model TEXT NOT NULL,
+    web_results TEXT NOT NULL,
+    items TEXT,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询：全半角统一（NFKC）、小写、合并空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query).lower()).strip()
+
+
+def _cache_key(model: str, query: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{normalize_query(query)}".encode("utf-8")).digest()
+
+
+class SearchCache:
+    """SQLite 搜索缓存（线程安全，超过有效期的条目视为未命中，超过容量时淘汰最久未使用的）"""
+
+    def __init__(
+        self,
+        path=SEARCH_CACHE_PATH,
+        ttl_hours: float = SEARCH_CACHE_TTL_HOURS,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_CREATE_TABLE_SQL)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache(accessed_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model: str, query: str) -> Optional[dict]:
+        """
+        查询未过期的缓存
+
+        Returns:
+            {"web_results", "items", "age"}，items 为 None 表示只缓存了搜索结果（提取未完成）；未命中返回 None
+        """
+        key = _cache_key(model, query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT web_results, items, created_at FROM search_cache WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key))
+
+        web_results, items, created_at = row
+        return {
+            "web_results": web_results,
+            "items": json.loads(items) if items is not None else None,
+            "age": now - created_at,
+        }
+
+    def put(self, model: str, query: str, web_results: str, items: Optional[List[dict]] = None):
+        """写入搜索结果（items 可稍后用 put_items 补上），并清理过期 / 超量的条目"""
+        now = time.time()
+        row = (
+            _cache_key(model, query),
+            normalize_query(query),
+            model,
+            web_results,
+            json.dumps(items, ensure_ascii=False) if items is not None else None,
+            now,
+            now,
+        )
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO search_cache "
+                    "(key, query, model, web_results, items, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                self._evict(now)
+
+    def put_items(self, model: str, query: str, items: List[dict]):
+        """为已缓存的搜索结果补上提取出的知识条目"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE search_cache SET items = ? WHERE key = ?",
+                    (json.dumps(items, ensure_ascii=False), _cache_key(model, query)),
+                )
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM search_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE key IN "
+                "(SELECT key FROM search_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "entries": self.count(),
+        }
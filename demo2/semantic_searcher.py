@@ -1,74 +1,177 @@
 """语义扩展检索器：联网搜索 + AI提取 + 向量扩展 + 自动同步"""
+import time
 from typing import Optional
 
+from config import EXTRACT_STREAMING, SEARCH_MODE
+from ingest_pipeline import IngestPipeline, get_ingest_pipeline
 from knowledge_db import KnowledgeDB
 from retriever import KnowledgeRetriever
 from sync_to_vector import sync_to_vector
-from web_searcher import extract_knowledge_items, web_search
+from sync_worker import VectorSyncWorker
+from web_searcher import search_knowledge, search_knowledge_many
 
 
 class SemanticSearcher:
     """语义扩展检索器"""
 
-    def __init__(self, retriever: Optional[KnowledgeRetriever] = None):
+    def __init__(
+        self,
+        retriever: Optional[KnowledgeRetriever] = None,
+        sync_worker: Optional[VectorSyncWorker] = None,
+    ):
         self.retriever = retriever
+        self.sync_worker = sync_worker
         self.knowledge_db = KnowledgeDB()
 
-    def search(self, keyword: str, n_expand: int = 3, min_similarity: float = 0.3) -> dict:
+    def search(
+        self,
+        keyword: str,
+        n_expand: int = 3,
+        min_similarity: float = 0.3,
+        refresh: bool = False,
+        mode: Optional[str] = None,
+    ) -> dict:
         """
         语义扩展搜索
 
         流程：
         1. 向量库查找相关关键词（相似度 > min_similarity 才算有效扩展）
-        2. 用原始关键词 + 扩展关键词联网搜索
-        3. AI 提取知识条目，分条存入 SQLite
-        4. 自动同步到向量库
+        2. 用原始关键词 + 扩展关键词联网搜索（同一查询命中搜索缓存时跳过搜索与提取，refresh=True 强制刷新）
+           - fanout：每个词单独搜索并提取，并发执行后合并，耗时约等于最慢的一次搜索
+           - combined：拼成一个查询只搜索一次
+        3. AI 提取知识条目，去重后分条存入 SQLite
+        4. 同步到向量库（有后台同步线程时只提交 ID，不等待向量化）
+
+        流式模式（EXTRACT_STREAMING）下 3-4 合并为流水线：提取结果边生成边解析，
+        每条经 保存 -> 向量化 -> 写索引 处理，不必等完整响应与整批保存。
         """
         expanded_keywords = []
 
         # 1. 向量扩展（只取相似度足够高的）
         if self.retriever:
             try:
-                items = self.retriever.retrieve(keyword, n_results=n_expand, min_similarity=min_similarity)
-                expanded_keywords = [item["keyword"] for item in items if item["keyword"]]
+                # 只用向量检索：关键词快速路径 / 全文命中不受 min_similarity 约束，且多半就是查询词本身
+                items = self.retriever.retrieve(
+                    keyword, n_results=n_expand, min_similarity=min_similarity, mode="vector"
+                )
+                expanded_keywords = list(dict.fromkeys(
+                    item["keyword"] for item in items if item["keyword"] and item["keyword"] != keyword
+                ))
                 if expanded_keywords:
                     print(f"[EXPAND] 扩展关键词: {', '.join(expanded_keywords)}")
             except Exception as e:
                 print(f"[WARN] 向量检索失败: {e}")
 
-        # 2. 联网搜索（原始关键词 + 有效扩展）
+        # 2-3. 联网搜索（原始关键词 + 有效扩展）并由 AI 提取知识条目；流式模式下每条提取出来就进入入库管道
         search_terms = [keyword] + expanded_keywords[:3]
-        search_query = " ".join(search_terms)
-        print(f"[SEARCH] 联网搜索: {search_query}")
-        web_results = web_search(search_query)
-
-        # 3. AI 提取知识条目
-        print("[EXTRACT] AI 提取知识条目...")
-        items = extract_knowledge_items(web_results)
+        ingest = self._ingest_pipeline() if EXTRACT_STREAMING else None
+        # 共享管道中用本次检索独有的 tag 区分条目
+        tag = object()
+        if ingest is not None:
+            ingest.track(tag)
+        on_item = (lambda item: ingest.put(item, tag=tag)) if ingest is not None else None
+        try:
+            if (mode or SEARCH_MODE) == "fanout" and len(search_terms) > 1:
+                web_results, items, term_latency, cached = self._search_fanout(search_terms, refresh, on_item)
+            else:
+                search_query = " ".join(search_terms)
+                print(f"[SEARCH] 联网搜索: {search_query}")
+                searched = search_knowledge(search_query, refresh=refresh, on_item=on_item)
+                web_results, items, cached = searched["web_results"], searched["items"], searched["cached"]
+                term_latency = {}
+                if cached:
+                    print(f"[CACHE] 命中搜索缓存（{searched['age'] / 60:.0f} 分钟前），跳过搜索与提取")
+        finally:
+            stats = ingest.flush(tag) if ingest is not None else None
         print(f"[OK] 提取到 {len(items)} 条知识")
 
-        # 4. 分条存入 SQLite
-        saved_ids = []
-        for item in items:
-            saved_id = self.knowledge_db.save(
-                keyword=item["keyword"],
-                content=item["content"],
-            )
-            saved_ids.append(saved_id)
-            print(f"  - [{saved_id}] {item['keyword']}")
-
-        # 5. 自动同步到向量库
-        print("[SYNC] 同步到向量库...")
-        sync_to_vector()
+        # 4-5. 去重入库并同步到向量库
+        if stats is not None:
+            saved_count, skipped_count = self._report_ingest(stats)
+        else:
+            saved_count, skipped_count = self._save_and_sync(items)
 
         return {
             "keyword": keyword,
             "expanded_keywords": expanded_keywords,
             "web_results": web_results,
-            "saved_count": len(saved_ids),
+            "cached": cached,
+            "term_latency": term_latency,
+            "saved_count": saved_count,
+            "skipped_count": skipped_count,
             "items": items,
         }
 
+    def _ingest_pipeline(self) -> IngestPipeline:
+        """进程内共享的入库管道；有检索器时复用它的向量化函数与集合"""
+        if self.retriever is not None:
+            return get_ingest_pipeline(self.retriever.embedding_function, self.retriever.collection)
+        return get_ingest_pipeline()
+
+    def _save_and_sync(self, items: list) -> tuple:
+        """去重后批量存入 SQLite（单个事务），再同步到向量库；完全重复 / 近似重复的内容不入库、不向量化"""
+        result = self.knowledge_db.save_deduplicated(
+            [{"keyword": item["keyword"], "content": item["content"]} for item in items]
+        )
+        saved_ids = result["ids"]
+        for saved_id, item in zip(saved_ids, result["items"]):
+            print(f"  - [{saved_id}] {item['keyword']}")
+        self._report_skipped(result["exact"], result["near"])
+
+        # 有后台同步线程时只提交 ID，不等待向量化
+        if saved_ids and self.sync_worker is not None:
+            self.sync_worker.submit(saved_ids)
+            print(f"[SYNC] 已提交 {len(saved_ids)} 条到后台同步")
+        elif saved_ids:
+            print("[SYNC] 同步到向量库...")
+            sync_to_vector()
+        return len(saved_ids), result["exact"] + result["near"]
+
+    def _report_ingest(self, stats: dict) -> tuple:
+        """流式入库管道已完成保存与索引，输出结果；未能写入索引的记录交给后台同步重试"""
+        for saved_id, item_keyword in stats["saved"]:
+            print(f"  - [{saved_id}] {item_keyword}")
+        self._report_skipped(stats["exact"], stats["near"])
+        if stats["first_indexed"] is not None:
+            print(
+                f"[STREAM] 已索引 {stats['indexed']} 条，首条入索引 {stats['first_indexed']:.1f}s，"
+                f"总耗时 {stats['elapsed']:.1f}s"
+            )
+        if stats["unindexed"] and self.sync_worker is not None:
+            self.sync_worker.submit(stats["unindexed"])
+            print(f"[SYNC] {len(stats['unindexed'])} 条未写入索引，已提交到后台同步")
+        elif stats["unindexed"]:
+            print(f"[WARN] {len(stats['unindexed'])} 条未写入索引，执行 sync 时补上")
+        return len(stats["saved"]), stats["exact"] + stats["near"]
+
+    @staticmethod
+    def _report_skipped(exact: int, near: int):
+        if exact or near:
+            print(f"[INFO] 跳过重复 {exact + near} 条（完全相同 {exact}，近似 {near}）")
+
+    def _search_fanout(self, search_terms: list, refresh: bool, on_item=None) -> tuple:
+        """每个词并发搜索 + 提取，合并结果（重复条目在入库去重时过滤）"""
+        print(f"[SEARCH] 并发联网搜索 {len(search_terms)} 个词: {', '.join(search_terms)}")
+        start = time.monotonic()
+        results = search_knowledge_many(search_terms, refresh=refresh, on_item=on_item)
+
+        sections, items, term_latency = [], [], {}
+        for result in results:
+            term_latency[result["query"]] = result["elapsed"]
+            if result["error"] is not None:
+                print(f"  - {result['query']}: 失败 {result['error']}")
+                continue
+            note = "，缓存" if result["cached"] else ""
+            print(f"  - {result['query']}: {result['elapsed']:.1f}s{note}，{len(result['items'])} 条")
+            sections.append(f"### {result['query']}\n\n{result['web_results']}")
+            items.extend(result["items"])
+        print(f"[SEARCH] 并发搜索完成，总耗时 {time.monotonic() - start:.1f}s")
+        cached = all(result["cached"] for result in results if result["error"] is None)
+        return "\n\n".join(sections), items, term_latency, cached
+
 
-def create_semantic_searcher(retriever: Optional[KnowledgeRetriever] = None) -> SemanticSearcher:
-    return SemanticSearcher(retriever)
+def create_semantic_searcher(
+    retriever: Optional[KnowledgeRetriever] = None,
+    sync_worker: Optional[VectorSyncWorker] = None,
+) -> SemanticSearcher:
+    return SemanticSearcher(retriever, sync_worker)
@@ -1,64 +1,163 @@
 """同步脚本：将 SQLite 中的 keyword 向量化存入 Chromadb（索引层）"""
 import sys
+import time
+from typing import List, Optional
 
 if sys.platform == "win32":
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
 
-import chromadb
-from chromadb.config import Settings
+from config import EMBEDDING_MAX_BATCH_SIZE, SYNC_PAGE_SIZE
+from embedding_client import create_embedding_function
+from embedding_pipeline import EmbeddingPipeline
+from knowledge_db import KnowledgeDB, document_hash, index_document
+from vector_collection import open_collection, write_active
+
+# 单次 collection.upsert 写入的最大条数
+_ADD_CHUNK_SIZE = 500
+
+
+def index_rows(collection, pipeline: EmbeddingPipeline, rows: List[dict], verbose: bool = True) -> List[dict]:
+    """
+    向量化并写入向量库（keyword + content 一起向量化，预先算好向量后直接写入）
+
+    已索引文本指纹未变的行（如改了又改回）不重新向量化，直接确认版本。
+
+    Args:
+        rows: [{"id", "keyword", "content", "version", "content_hash"}, ...]
+
+    Returns:
+        成功索引的 [{"id", "version", "content_hash"}, ...]（向量化失败的行不包含在内），交给 mark_indexed
+    """
+    indexed, ready = embed_rows(pipeline, rows)
+    if verbose and ready:
+        print(f"[INFO] 向量化完成: {len(ready)} 条，{pipeline.api_batches} 个 API 批次，并发 {pipeline.concurrency}")
+    for i in range(0, len(ready), _ADD_CHUNK_SIZE):
+        indexed.extend(upsert_rows(collection, ready[i : i + _ADD_CHUNK_SIZE]))
+        if verbose:
+            print(f"[INFO] 同步进度: {len(indexed)}/{len(rows)}")
+    return indexed
+
+
+def embed_rows(pipeline: EmbeddingPipeline, rows: List[dict]) -> tuple:
+    """
+    向量化阶段：只向量化索引文本有变化的行
+
+    Returns:
+        (无需重新索引的 [{"id", "version", "content_hash"}, ...],
+         待写入的 [(行, 索引文本, 索引条目, 向量), ...]，向量化失败的行不包含在内)
+    """
+    unchanged, changed = [], []
+    for item in rows:
+        document = index_document(item["keyword"], item["content"])
+        entry = {"id": item["id"], "version": item.get("version", 1), "content_hash": document_hash(document)}
+        if entry["content_hash"] == item.get("content_hash"):
+            unchanged.append(entry)
+        else:
+            changed.append((item, document, entry))
+    if not changed:
+        return unchanged, []
+
+    embeddings = pipeline.embed([document for _, document, _ in changed])
+    ready = [(item, doc, entry, emb) for (item, doc, entry), emb in zip(changed, embeddings) if emb is not None]
+    return unchanged, ready
+
+
+def upsert_rows(collection, ready: List[tuple]) -> List[dict]:
+    """写入阶段：把 embed_rows 的结果 upsert 到向量库，返回写入的索引条目"""
+    # upsert：新增与修改同一条路径，后台同步与手动同步处理到同一行时也不会冲突
+    collection.upsert(
+        ids=[f"idx_{item['id']}" for item, _, _, _ in ready],
+        embeddings=[emb for _, _, _, emb in ready],
+        documents=[doc for _, doc, _, _ in ready],
+        metadatas=[
+            {"sqlite_id": item["id"], "keyword": item["keyword"], "content_hash": entry["content_hash"]}
+            for item, _, entry, _ in ready
+        ],
+    )
+    return [entry for _, _, entry, _ in ready]
+
+
+def sync_deletions(collection, embedding_function, knowledge_db: KnowledgeDB, page_size: int = SYNC_PAGE_SIZE) -> int:
+    """按墓碑删除向量库中已删除记录的索引，返回处理条数（重建期间墓碑保留，按 id 分页避免重复处理）"""
+    removed, last_id = 0, 0
+    while True:
+        ids = knowledge_db.get_tombstones(limit=page_size, after_id=last_id)
+        if not ids:
+            return removed
+
+        def clear(_):
+            knowledge_db.clear_tombstones(ids)
+            knowledge_db.bump_index_generation()
+
+        # 不存在的 ID 会被 Chroma 忽略，未索引过的记录也可以安全删除
+        collection = write_active(
+            collection,
+            embedding_function,
+            lambda target: target.delete(ids=[f"idx_{record_id}" for record_id in ids]),
+            clear,
+        )
+        removed += len(ids)
+        last_id = ids[-1]
 
-from config import CHROMADB_PATH, COLLECTION_NAME
-from embedding_client import ZhipuAIEmbedding
-from knowledge_db import KnowledgeDB
 
+def sync_to_vector(batch_size: Optional[int] = None, page_size: int = SYNC_PAGE_SIZE) -> int:
+    """
+    增量同步：新增 / 修改的记录 upsert 到 Chromadb，已删除的记录移除索引
 
-def sync_to_vector(batch_size: int = 10) -> int:
-    """将 SQLite 的 keyword 向量化存入 Chromadb（只存索引，不存内容）"""
+    只扫描待同步行与墓碑，开销与变更量成正比，与语料总量无关。
+    """
     knowledge_db = KnowledgeDB()
-    unsynced = knowledge_db.get_unsynced(limit=100)
+    total = knowledge_db.count_unsynced()
+    tombstones = knowledge_db.count_tombstones()
 
-    if not unsynced:
+    if not total and not tombstones:
         return 0
 
-    print(f"[INFO] 发现 {len(unsynced)} 条未同步数据")
+    print(f"[INFO] 发现 {total} 条待同步数据，{tombstones} 条待删除索引")
+    start = time.monotonic()
 
-    # 确保目录存在
-    CHROMADB_PATH.mkdir(parents=True, exist_ok=True)
+    embedding_function = create_embedding_function()
+    collection = open_collection(embedding_function)
+    pipeline = EmbeddingPipeline(embedding_function, max_batch_size=batch_size or EMBEDDING_MAX_BATCH_SIZE)
 
-    client = chromadb.PersistentClient(
-        path=str(CHROMADB_PATH),
-        settings=Settings(anonymized_telemetry=False),
-    )
-    embedding_function = ZhipuAIEmbedding()
-
-    try:
-        collection = client.get_collection(name=COLLECTION_NAME, embedding_function=embedding_function)
-    except Exception:
-        collection = client.create_collection(
-            name=COLLECTION_NAME,
-            embedding_function=embedding_function,
-            metadata={"description": "知识库索引"},
-        )
-        print(f"[INFO] 创建新集合: {COLLECTION_NAME}")
+    synced, processed = 0, 0
+    for page in knowledge_db.iter_unsynced(page_size=page_size):
+        indexed = []
 
-    synced_ids = []
-    for i in range(0, len(unsynced), batch_size):
-        batch = unsynced[i : i + batch_size]
+        def commit(entries: List[dict]):
+            indexed.extend(entries)
+            knowledge_db.mark_indexed(entries)
+            if entries:
+                knowledge_db.bump_index_generation()
 
-        # keyword + content 一起向量化
-        collection.add(
-            ids=[f"idx_{item['id']}" for item in batch],
-            documents=[f"{item['keyword']}: {item['content']}" for item in batch],
-            metadatas=[{"sqlite_id": item["id"], "keyword": item["keyword"]} for item in batch],
+        collection = write_active(
+            collection, embedding_function, lambda target: index_rows(target, pipeline, page, verbose=False), commit
+        )
+        synced += len(indexed)
+        processed += len(page)
+        elapsed = time.monotonic() - start
+        # 同步期间新写入的行也会被扫到，进度分母取较大值
+        print(
+            f"[INFO] 同步进度: {processed}/{max(total, processed)}，"
+            f"{synced / elapsed if elapsed else 0:.1f} 条/秒"
         )
 
-        synced_ids.extend(item["id"] for item in batch)
-        print(f"[INFO] 同步进度: {min(i + batch_size, len(unsynced))}/{len(unsynced)}")
-
-    knowledge_db.mark_synced(synced_ids)
-    print(f"[OK] 同步完成，共 {len(synced_ids)} 条")
-    return len(synced_ids)
+    # 删除放在最后：同步期间被删除的行也能在本轮清理掉
+    removed = sync_deletions(collection, embedding_function, knowledge_db, page_size=page_size)
+    if removed:
+        print(f"[INFO] 已删除 {removed} 条索引")
+
+    if pipeline.failed:
+        print(f"[WARN] {pipeline.failed} 条向量化失败，下次同步时重试")
+    stats = embedding_function.cache_stats()
+    print(f"[INFO] 向量缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}，API 调用 {stats['api_calls']} 次")
+    elapsed = time.monotonic() - start
+    print(
+        f"[OK] 同步完成，共 {synced} 条，耗时 {elapsed:.1f}s，"
+        f"{synced / elapsed if elapsed else 0:.1f} 条/秒，{pipeline.api_batches} 个 API 批次"
+    )
+    return synced
 
 
 if __name__ == "__main__":
@@ -0,0 +1,203 @@
+"""后台向量同步：搜索请求只负责写 SQLite，向量化与写入向量库由后台线程批量完成"""
+import atexit
+import queue
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from config import SYNC_DEBOUNCE_SECONDS, SYNC_FLUSH_TIMEOUT, SYNC_MAX_PENDING
+from knowledge_db import KnowledgeDB
+
+# 队列中的停止信号
+_STOP = object()
+
+
+class VectorSyncWorker:
+    """
+    后台向量同步线程
+
+    - submit() 只把新入库的 ID 放进进程内队列，立即返回
+    - 后台线程按防抖窗口攒批，复用同一个 Chroma 客户端 / 集合与向量化管道
+    - flush() 等待已提交的 ID 全部处理完；stop() 在退出时刷盘并停止线程
+    """
+
+    def __init__(
+        self,
+        debounce_seconds: float = SYNC_DEBOUNCE_SECONDS,
+        max_pending: int = SYNC_MAX_PENDING,
+    ):
+        self.debounce_seconds = debounce_seconds
+        self.max_pending = max(1, max_pending)
+        self.knowledge_db = KnowledgeDB()
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # 长连接资源在后台线程首次同步时创建
+        self._collection = None
+        self._pipeline = None
+        self.synced = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+
+    def start(self) -> "VectorSyncWorker":
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="vector-sync", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+        return self
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def pending(self) -> int:
+        """排队中（尚未处理）的 ID 数"""
+        return self._queue.qsize()
+
+    def submit(self, ids: Iterable[int]):
+        """提交待同步的 SQLite ID（不阻塞）"""
+        if not self.running:
+            self.start()
+        for record_id in ids:
+            self._queue.put(record_id)
+
+    def flush(self, timeout: Optional[float] = SYNC_FLUSH_TIMEOUT) -> bool:
+        """等待已提交的 ID 全部处理完，超时返回 False"""
+        if not self.running:
+            return self._queue.unfinished_tasks == 0
+        done = threading.Event()
+
+        def wait():
+            self._queue.join()
+            done.set()
+
+        threading.Thread(target=wait, daemon=True).start()
+        return done.wait(timeout)
+
+    def stop(self, flush: bool = True, timeout: Optional[float] = SYNC_FLUSH_TIMEOUT) -> bool:
+        """停止后台线程（默认先把队列中的 ID 同步完），返回是否在超时前处理完"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return True
+            atexit.unregister(self.stop)
+            if not flush:
+                self._drain()
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "synced": self.synced,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_error": self.last_error,
+        }
+
+    def _drain(self):
+        """丢弃队列中尚未处理的 ID（它们仍是未同步状态，下次 sync 会补上）"""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._queue.task_done()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+
+            # 防抖：窗口内陆续到达的 ID 合并成一批
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.debounce_seconds
+            while len(batch) < self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._sync(list(dict.fromkeys(batch)))
+            except Exception as e:
+                # 失败的行保持未同步状态，手动 sync 时会重试
+                self.failed += len(batch)
+                self.last_error = str(e)
+                print(f"[WARN] 后台同步失败（{len(batch)} 条）: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if stop:
+                self._queue.task_done()
+                return
+
+    def _ensure_resources(self):
+        from vector_collection import get_active_collection_name, open_collection
+
+        if self._pipeline is None:
+            from embedding_client import create_embedding_function
+            from embedding_pipeline import EmbeddingPipeline
+
+            self._pipeline = EmbeddingPipeline(create_embedding_function())
+        # 重建完成后生效集合会切换，跟随切换到新集合
+        if self._collection is None or self._collection.name != get_active_collection_name():
+            self._collection = open_collection(self._pipeline.embedding_function)
+
+    def _sync(self, ids: List[int]):
+        from sync_to_vector import index_rows
+        from vector_collection import write_active
+
+        rows = self.knowledge_db.get_by_ids(
+            ids, columns=("keyword", "content", "version", "content_hash", "synced_to_vector")
+        )
+        rows = [row for row in rows if not row["synced_to_vector"]]
+        if not rows:
+            return
+        self._ensure_resources()
+        failed_before = self._pipeline.failed
+        indexed = []
+
+        def commit(entries: List[dict]):
+            indexed.extend(entries)
+            self.knowledge_db.mark_indexed(entries)
+            if entries:
+                self.knowledge_db.bump_index_generation()
+
+        self._collection = write_active(
+            self._collection,
+            self._pipeline.embedding_function,
+            lambda target: index_rows(target, self._pipeline, rows, verbose=False),
+            commit,
+        )
+        self.synced += len(indexed)
+        self.failed += self._pipeline.failed - failed_before
+        self.batches += 1
+
+
+_worker: Optional[VectorSyncWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_sync_worker() -> VectorSyncWorker:
+    """进程内共享的后台同步线程（首次调用时启动）"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = VectorSyncWorker().start()
+        return _worker
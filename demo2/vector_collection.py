@@ -0,0 +1,88 @@
+"""向量集合管理：当前生效集合的指针与集合的打开 / 创建（按 VECTOR_BACKEND 选择 Chroma 或 NumPy 索引）"""
+import os
+from typing import Callable, TypeVar
+
+from config import ACTIVE_COLLECTION_FILE, CHROMADB_PATH, COLLECTION_NAME, NUMPY_INDEX_PATH, VECTOR_BACKEND
+
+
+def get_active_collection_name() -> str:
+    """当前生效的集合名（未重建过时为 COLLECTION_NAME）"""
+    try:
+        name = ACTIVE_COLLECTION_FILE.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return COLLECTION_NAME
+    return name or COLLECTION_NAME
+
+
+def set_active_collection_name(name: str):
+    """原子切换生效集合（写临时文件后 os.replace，读方不会读到半个文件）"""
+    ACTIVE_COLLECTION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = ACTIVE_COLLECTION_FILE.with_name(ACTIVE_COLLECTION_FILE.name + ".tmp")
+    tmp_path.write_text(name, encoding="utf-8")
+    os.replace(tmp_path, ACTIVE_COLLECTION_FILE)
+
+
+def index_exists() -> bool:
+    """索引目录中是否已有数据（不打开客户端，启动时用于判断能否加载检索器）"""
+    if VECTOR_BACKEND == "numpy":
+        return (NUMPY_INDEX_PATH / get_active_collection_name() / "meta.json").exists()
+    return CHROMADB_PATH.exists() and any(CHROMADB_PATH.iterdir())
+
+
+def create_client():
+    """打开索引后端的客户端（两种后端提供相同的集合接口）"""
+    if VECTOR_BACKEND == "numpy":
+        from numpy_index import get_numpy_client
+        return get_numpy_client()
+    if VECTOR_BACKEND != "chroma":
+        raise ValueError(f"未知的向量索引后端: {VECTOR_BACKEND}（可选 chroma / numpy）")
+
+    import chromadb
+    from chromadb.config import Settings
+
+    # 确保目录存在
+    CHROMADB_PATH.mkdir(parents=True, exist_ok=True)
+    return chromadb.PersistentClient(
+        path=str(CHROMADB_PATH),
+        settings=Settings(anonymized_telemetry=False),
+    )
+
+
+def get_or_create_collection(client, embedding_function, name: str = None):
+    """获取索引集合（默认为当前生效集合），不存在时创建"""
+    name = name or get_active_collection_name()
+    try:
+        return client.get_collection(name=name, embedding_function=embedding_function)
+    except Exception:
+        collection = client.create_collection(
+            name=name,
+            embedding_function=embedding_function,
+            metadata={"description": "知识库索引"},
+        )
+        print(f"[INFO] 创建新集合: {name}")
+        return collection
+
+
+def open_collection(embedding_function):
+    """打开（必要时创建）当前生效的向量集合"""
+    return get_or_create_collection(create_client(), embedding_function)
+
+
+T = TypeVar("T")
+
+
+def write_active(collection, embedding_function, write: Callable[[object], T], commit: Callable[[T], None]):
+    """
+    写入生效集合：write(集合) 后执行 commit(写入结果)（如标记已同步），再确认生效集合没有在此期间切换
+
+    重建在写入期间完成切换时，旧集合上的写入对检索不再可见，对新集合再执行一次 write。
+    commit 先于确认执行：确认时尚未切换的写入，由重建切换后的追平覆盖。
+
+    Returns:
+        最后写入的集合（调用方用它替换缓存的集合对象）
+    """
+    commit(write(collection))
+    while collection.name != get_active_collection_name():
+        collection = open_collection(embedding_function)
+        write(collection)
+    return collection
@@ -1,12 +1,31 @@
 """联网搜索模块：调用智谱AI联网搜索API + AI提取关键词"""
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Sequence
 
 from zai import ZhipuAiClient
 
-from config import WEB_SEARCH_ENABLED, WEB_SEARCH_ENGINE, WEB_SEARCH_MODEL, ZHIPUAI_API_KEY
+from config import (
+    SEARCH_CACHE_ENABLED,
+    SEARCH_CONCURRENCY,
+    SEARCH_RPM,
+    WEB_SEARCH_ENABLED,
+    WEB_SEARCH_ENGINE,
+    WEB_SEARCH_MODEL,
+    ZHIPUAI_API_KEY,
+)
+from json_stream import JsonArrayStream
+from rate_limiter import RateLimiter
+from search_cache import SearchCache, normalize_query
 
 _client = None
+_search_cache = None
+# 提取失败时把整段搜索结果作为一条返回所用的关键词
+_FALLBACK_KEYWORD = "搜索结果"
+# 搜索与提取共用的限流器（并发搜索时控制整体请求速率；每个词一次搜索 + 一次提取，突发量按两倍并发）
+_limiter = RateLimiter(SEARCH_RPM, burst=2 * SEARCH_CONCURRENCY)
 
 
 def _get_client() -> ZhipuAiClient:
@@ -18,6 +37,14 @@ def _get_client() -> ZhipuAiClient:
     return _client
 
 
+def get_search_cache() -> Optional[SearchCache]:
+    """共享的搜索缓存（未启用时为 None）"""
+    global _search_cache
+    if _search_cache is None and SEARCH_CACHE_ENABLED:
+        _search_cache = SearchCache()
+    return _search_cache
+
+
 def web_search(query: str) -> str:
     """调用智谱AI联网搜索"""
     if not WEB_SEARCH_ENABLED:
@@ -38,6 +65,7 @@ def web_search(query: str) -> str:
     ]
 
     client = _get_client()
+    _limiter.acquire()
     response = client.chat.completions.create(
         model=WEB_SEARCH_MODEL,
         messages=[{"role": "user", "content": query}],
@@ -52,14 +80,8 @@ def web_search(query: str) -> str:
     return content
 
 
-def extract_knowledge_items(search_result: str) -> list:
-    """
-    用 AI 从搜索结果中提取结构化知识条目
-
-    Returns:
-        [{"keyword": "核心关键词", "content": "完整内容"}, ...]
-    """
-    prompt = f"""请从以下搜索结果中提取知识条目。
+def _extract_prompt(search_result: str) -> str:
+    return f"""请从以下搜索结果中提取知识条目。
 
 要求：
 1. 每个独立的知识点作为一条
@@ -74,7 +96,27 @@ def extract_knowledge_items(search_result: str) -> list:
 
 只输出 JSON，不要其他内容："""
 
+
+def _fallback_item(search_result: str) -> dict:
+    return {"keyword": _FALLBACK_KEYWORD, "content": search_result}
+
+
+def _is_fallback(items: List[dict], search_result: str) -> bool:
+    """是否只是提取失败时的整体兜底条目"""
+    return items == [_fallback_item(search_result)]
+
+
+def extract_knowledge_items(search_result: str) -> list:
+    """
+    用 AI 从搜索结果中提取结构化知识条目
+
+    Returns:
+        [{"keyword": "核心关键词", "content": "完整内容"}, ...]
+    """
+    prompt = _extract_prompt(search_result)
+
     client = _get_client()
+    _limiter.acquire()
     response = client.chat.completions.create(
         model=WEB_SEARCH_MODEL,
         messages=[{"role": "user", "content": prompt}],
@@ -83,7 +125,7 @@ def extract_knowledge_items(search_result: str) -> list:
 
     content = response.choices[0].message.content
     if not content:
-        return [{"keyword": "搜索结果", "content": search_result}]
+        return [_fallback_item(search_result)]
 
     # 解析 JSON
     try:
@@ -102,4 +144,119 @@ def extract_knowledge_items(search_result: str) -> list:
         pass
 
     # 解析失败，返回整体
-    return [{"keyword": "搜索结果", "content": search_result}]
+    return [_fallback_item(search_result)]
+
+
+def stream_knowledge_items(search_result: str) -> Iterator[dict]:
+    """
+    流式提取知识条目：边接收模型输出边解析，每条闭合后立即产出（不等待完整响应）
+
+    没有解析出任何有效条目时，整体作为一条返回（与 extract_knowledge_items 一致）。
+    """
+    client = _get_client()
+    _limiter.acquire()
+    response = client.chat.completions.create(
+        model=WEB_SEARCH_MODEL,
+        messages=[{"role": "user", "content": _extract_prompt(search_result)}],
+        max_tokens=2048,
+        stream=True,
+    )
+
+    parser = JsonArrayStream()
+    produced = 0
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if not text:
+            continue
+        for item in parser.feed(text):
+            if isinstance(item, dict) and item.get("keyword") and item.get("content"):
+                produced += 1
+                yield item
+        if parser.done:
+            break
+
+    if not produced:
+        yield _fallback_item(search_result)
+
+
+def search_knowledge(query: str, refresh: bool = False, on_item: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    联网搜索 + 提取知识条目（带缓存）
+
+    同一查询在有效期内命中缓存时不调用搜索与提取；refresh=True 时忽略缓存重新搜索并覆盖。
+    传入 on_item 时流式提取，每解析出一条立即回调（命中缓存时对缓存的条目逐条回调）。
+
+    Returns:
+        {"web_results": 搜索结果, "items": 知识条目, "cached": 是否命中缓存, "age": 缓存条目已存在的秒数}
+    """
+    cache = get_search_cache()
+    cached = cache.get(WEB_SEARCH_MODEL, query) if cache is not None and not refresh else None
+    if cached is not None and cached["items"] is not None:
+        if on_item is not None:
+            for item in cached["items"]:
+                on_item(item)
+        return {**cached, "cached": True}
+
+    if cached is not None:
+        # 只缓存了搜索结果（上次提取中断），补做提取
+        web_results = cached["web_results"]
+    else:
+        web_results = web_search(query)
+        if cache is not None:
+            cache.put(WEB_SEARCH_MODEL, query, web_results)
+
+    if on_item is None:
+        items = extract_knowledge_items(web_results)
+    else:
+        items = []
+        for item in stream_knowledge_items(web_results):
+            on_item(item)
+            items.append(item)
+    # 提取失败的兜底条目不缓存：条目留空，下次命中时复用搜索结果、重新提取
+    if cache is not None and not _is_fallback(items, web_results):
+        cache.put_items(WEB_SEARCH_MODEL, query, items)
+    return {"web_results": web_results, "items": items, "cached": False, "age": 0.0}
+
+
+def search_knowledge_many(
+    queries: Sequence[str],
+    refresh: bool = False,
+    concurrency: int = SEARCH_CONCURRENCY,
+    on_item: Optional[Callable[[dict], None]] = None,
+) -> List[dict]:
+    """
+    多个查询并发执行 search_knowledge（每个查询的搜索与提取在同一个线程中串行，查询之间并行）
+
+    规范化后相同的查询只搜索一次；单个查询失败不影响其他查询，全部失败时抛出第一个错误。
+    on_item 会被多个线程同时调用，需要线程安全（如 queue.Queue.put）。
+
+    Returns:
+        按输入顺序（去重后）的 [{"query", "web_results", "items", "cached", "age", "elapsed", "error"}, ...]，
+        失败的查询 web_results 为空、items 为 []，error 为异常
+    """
+    unique, seen = [], set()
+    for query in queries:
+        if normalize_query(query) not in seen:
+            seen.add(normalize_query(query))
+            unique.append(query)
+
+    def run(query: str) -> dict:
+        start = time.monotonic()
+        try:
+            result = search_knowledge(query, refresh=refresh, on_item=on_item)
+            result["error"] = None
+        except Exception as e:
+            result = {"web_results": "", "items": [], "cached": False, "age": 0.0, "error": e}
+        result["query"] = query
+        result["elapsed"] = time.monotonic() - start
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(unique)))) as executor:
+        results = list(executor.map(run, unique))
+
+    errors = [result["error"] for result in results if result["error"] is not None]
+    if results and len(errors) == len(results):
+        raise errors[0]
+    return results